@@ -4,6 +4,11 @@ class Extractor:
     self.subfields = subfields
     self.include_subfield = include_subfield
   
+  @property
+  def needs_replies(self):
+    # the reviews and comments of a paper are in its details, which are only fetched when asked for
+    return 'details' in self.fields or 'details' in self.subfields
+
   def __call__(self, paper):
     return self.extract(paper)
 
@@ -0,0 +1,140 @@
+import os
+import sys
+from bisect import bisect_right
+
+# the keyword matching of the arXiv search in src/, so OpenReview and arXiv papers are matched the same way
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from keyword_matcher import create_keyword_pattern, create_keyword_matcher, fold_case
+
+
+def field_text(paper, field):
+  # API v1 notes hold plain values in content, API v2 notes hold {'value': ...}; list fields like keywords are joined by newlines, which are word boundaries
+  value = paper.content.get(field)
+  if isinstance(value, dict):
+    value = value.get('value')
+  if value is None:
+    return ''
+  if isinstance(value, (list, tuple)):
+    return '\n'.join(str(item) for item in value)
+  return str(value)
+
+
+def _field_filter(field):
+  def field_filter(paper, keywords):
+    # the keyword that occurs first in the field, or None
+    match = create_keyword_pattern(keywords).search(field_text(paper, field))
+    if match is None:
+      return None
+    folded = fold_case(match.group(1))
+    return next(keyword for keyword in keywords if fold_case(keyword)==folded)
+  field_filter.__name__ = f'{field}_filter'
+  field_filter.field = field
+  return field_filter
+
+
+# the built in filters, registered with Scraper.add_filter(title_filter) etc. without extra arguments
+# a custom filter is any function filter_(paper, keywords, *args, **kwargs) returning the matched keyword or None
+# the filter type in paper.content['match'] is the function name for both, e.g. {'title_filter': 'auroc'}
+title_filter = _field_filter('title')
+abstract_filter = _field_filter('abstract')
+keywords_filter = _field_filter('keywords')
+
+
+def check_filter_arguments(filter_, args, kwargs):
+  # the built in filters take no extra arguments, so they would be silently ignored by the compiled path
+  if getattr(filter_, 'field', None) is not None and (args or kwargs):
+    raise TypeError(f'{filter_.__name__} takes no extra arguments, it matches the keywords like create_keyword_pattern, got {args} {kwargs}')
+
+
+class CompiledFilters:
+  """
+  The keywords and the registered filters compiled once into one multi-pattern matcher.
+
+  Matches follow create_keyword_pattern: case-insensitive, with a non-word character or the start/end
+  of the text on both sides. With engine='regex' the field of a built in filter is searched with the
+  create_keyword_pattern regex of all keywords, compiled once; with engine='aho_corasick' the field of a
+  whole batch of papers is searched in a single Aho-Corasick pass, which pays off for long keyword lists.
+  Custom filters are called per paper. The first registered filter that matches wins, with the keyword
+  that occurs first in its field, like satisfies_any_filters.
+  """
+  def __init__(self, keywords, filters, engine='regex'):
+    self.keywords = list(keywords)
+    self.filters = list(filters)
+    for filter_, args, kwargs in self.filters:
+      check_filter_arguments(filter_, args, kwargs)
+    # one keyword set per keyword, so a match tells which keyword it was; keywords that fold to the same text report the first of them
+    keyword_sets = {}
+    for keyword in self.keywords:
+      keyword_sets.setdefault(fold_case(keyword), [keyword])
+    self._original = {folded:keywords_[0] for folded, keywords_ in keyword_sets.items()}
+    self._rank = {folded:rank for rank, folded in enumerate(keyword_sets)}
+    self.matcher = create_keyword_matcher(keyword_sets, engine=engine) if keyword_sets else None
+    self.pattern = create_keyword_pattern(self.keywords) if keyword_sets and engine=='regex' else None
+
+  def _first_matches(self, texts):
+    # the first keyword of every text
+    first = [None]*len(texts)
+    if self.matcher is None or not texts:
+      return first
+    if self.pattern is not None:
+      # the regex engine, the create_keyword_pattern regex of all keywords on each text
+      for index, text in enumerate(texts):
+        match = self.pattern.search(text)
+        if match is not None:
+          first[index] = self._original[fold_case(match.group(1))]
+      return first
+    # one Aho-Corasick pass over the texts joined by newlines
+    starts = []
+    position = 0
+    for text in texts:
+      starts.append(position)
+      position += len(text) + 1
+    first_start = [None]*len(texts)
+    for start, _, names in self.matcher.iter_matches('\n'.join(texts)):
+      index = bisect_right(starts, start) - 1
+      name = min(names, key=self._rank.get)
+      # at the same start the regex alternation takes the keyword listed first
+      if first_start[index] is None or (start, self._rank[name]) < (first_start[index], self._rank[first[index]]):
+        first_start[index] = start
+        first[index] = name
+    return [None if name is None else self._original[name] for name in first]
+
+  def match_papers(self, papers):
+    """
+    Evaluate the filters on a batch of papers, e.g. all papers of a venue.
+
+    Returns a list with (matched keyword, filter type, satisfies) per paper, (None, None, False) if no filter matches.
+    """
+    papers = list(papers)
+    results = [(None, None, False)]*len(papers)
+    # every filter only sees the papers no earlier filter matched
+    remaining = list(range(len(papers)))
+    for filter_, args, kwargs in self.filters:
+      if not remaining:
+        break
+      field = getattr(filter_, 'field', None)
+      if field is not None:
+        keywords = self._first_matches([field_text(papers[index], field) for index in remaining])
+      else:
+        keywords = [filter_(papers[index], self.keywords, *args, **kwargs) for index in remaining]
+      filter_type = filter_.__name__
+      unmatched = []
+      for index, keyword in zip(remaining, keywords):
+        if keyword is not None:
+          results[index] = (keyword, filter_type, True)
+        else:
+          unmatched.append(index)
+      remaining = unmatched
+    return results
+
+  def match(self, paper):
+    return self.match_papers([paper])[0]
+
+
+def compile_filters(keywords, filters, engine='regex'):
+  return CompiledFilters(keywords, filters, engine)
+
+
+def satisfies_any_filters(paper, keywords, filters):
+  # single paper version, compile_filters once and use match_papers for many papers
+  return compile_filters(keywords, filters).match(paper)
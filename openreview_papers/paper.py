@@ -1,22 +1,56 @@
-def get_grouped_venue_papers(client, grouped_venue, only_accepted):
-  papers = {}
-  for venue in grouped_venue:
-    papers[venue] = []
-    if only_accepted:
-      submissions = client.get_all_notes(content={'venueid': venue}, details='directReplies')
-    else:
-      single_blind_submissions = client.get_all_notes(invitation=f'{venue}/-/Submission', details='directReplies')
-      double_blind_submissions = client.get_all_notes(invitation=f'{venue}/-/Blind_Submission', details='directReplies')
-      submissions = single_blind_submissions + double_blind_submissions
-    papers[venue]+=submissions
-
-    print(venue)
-    print(f'Number of papers: {len(submissions)}')
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import save_notes, load_notes
+
+
+def fetch_venue_notes(client, venue, only_accepted, details=None):
+  if only_accepted:
+    return client.get_all_notes(content={'venueid': venue}, details=details)
+  single_blind_submissions = client.get_all_notes(invitation=f'{venue}/-/Submission', details=details)
+  double_blind_submissions = client.get_all_notes(invitation=f'{venue}/-/Blind_Submission', details=details)
+  return single_blind_submissions + double_blind_submissions
+
+
+def venue_cache_path(cache_folder, venue, only_accepted, details):
+  # one JSONL file per venue, fetch mode and details, e.g. ICLR.cc_2023_Conference__accepted__directReplies.jsonl
+  mode = 'accepted' if only_accepted else 'submissions'
+  return os.path.join(cache_folder, f"{venue.replace('/', '_')}__{mode}__{details or 'none'}.jsonl")
+
+
+def get_venue_papers(client, venue, only_accepted, details=None, cache_folder=None):
+  # notes fetched with replies also serve a request without them
+  if cache_folder is not None:
+    for cached_details in dict.fromkeys([details, 'directReplies'] if details is None else [details]):
+      fpath = venue_cache_path(cache_folder, venue, only_accepted, cached_details)
+      if os.path.exists(fpath):
+        return load_notes(fpath)
+  submissions = fetch_venue_notes(client, venue, only_accepted, details)
+  if cache_folder is not None:
+    os.makedirs(cache_folder, exist_ok=True)
+    save_notes(submissions, venue_cache_path(cache_folder, venue, only_accepted, details))
+  return submissions
+
+
+def get_grouped_venue_papers(client, grouped_venue, only_accepted, details='directReplies', max_workers=4, cache_folder=None):
+  # details='directReplies' also fetches the reviews and comments of every paper, pass None when only the paper itself is needed
+  papers = {venue:[] for venue in grouped_venue}
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    futures = {executor.submit(get_venue_papers, client, venue, only_accepted, details, cache_folder):venue for venue in grouped_venue}
+    for future in as_completed(futures):
+      venue = futures[future]
+      submissions = future.result()
+      papers[venue]+=submissions
+
+      print(venue)
+      print(f'Number of papers: {len(submissions)}')
   return papers
 
 
-def get_papers(client, grouped_venues, only_accepted):
+def get_papers(client, grouped_venues, only_accepted, details='directReplies', max_workers=4, cache_folder=None):
+  # all venues of all groups share one pool of max_workers fetches
+  venues = [venue for grouped_venue in grouped_venues.values() for venue in grouped_venue]
+  venue_papers = get_grouped_venue_papers(client, venues, only_accepted, details, max_workers, cache_folder)
   papers = {}
   for group, grouped_venue in grouped_venues.items():
-    papers[group] = get_grouped_venue_papers(client, grouped_venue, only_accepted)
-  return papers
\ No newline at end of file
+    papers[group] = {venue:venue_papers[venue] for venue in grouped_venue}
+  return papers
@@ -1,11 +1,11 @@
 from utils import get_client, to_csv, papers_to_list
 from venue import get_venues, group_venues
 from paper import get_papers
-from filters import satisfies_any_filters
+from filters import compile_filters, check_filter_arguments
 
 
 class Scraper:
-  def __init__(self, conferences, years, keywords, extractor, fpath, selector=None, fns=[], groups=['conference'], only_accepted=True):
+  def __init__(self, conferences, years, keywords, extractor, fpath, selector=None, fns=[], groups=['conference'], only_accepted=True, fetch_replies=None, max_workers=4, cache_folder=None):
     # fns is a list of functions that can be specified by the user each taking in a single paper object as a parameter and returning the modified paper
     self.confs = conferences
     self.years = years
@@ -16,6 +16,13 @@ class Scraper:
     self.groups = groups
     self.only_accepted = only_accepted
     self.selector = selector
+    # fetch_replies=None fetches the replies (details['directReplies']) when the extractor needs them or any fns are given, since fns may read them
+    # pass fetch_replies=False to skip them for fns that don't, which makes fetching much cheaper
+    if fetch_replies is None:
+      fetch_replies = extractor.needs_replies or len(fns)>0
+    self.fetch_replies = fetch_replies
+    self.max_workers = max_workers
+    self.cache_folder = cache_folder # fetched notes are cached here per venue, so a re-run doesn't fetch them again
     self.filters = []
     self.client = get_client()
     self.papers = None # this'll contain all the papers returned from apply_on_papers
@@ -27,7 +34,8 @@ class Scraper:
     print("Getting venues...")
     venues = get_venues(self.client, self.confs, self.years)
     print("Getting papers...\n")
-    papers = get_papers(self.client, group_venues(venues, self.groups), self.only_accepted)
+    details = 'directReplies' if self.fetch_replies else None
+    papers = get_papers(self.client, group_venues(venues, self.groups), self.only_accepted, details, self.max_workers, self.cache_folder)
     self.papers = papers
     print("\nFiltering papers...")
     papers = self.apply_on_papers(papers)
@@ -40,6 +48,8 @@ class Scraper:
     print(f"Saved at {self.fpath}")
   
   def apply_on_papers(self, papers):
+    # the keywords and filters are compiled once, then every venue is matched in one batch
+    compiled_filters = compile_filters(self.keywords, self.filters)
     modified_papers = {}
     for group, grouped_venues in papers.items():
       modified_papers[group] = {}
@@ -47,9 +57,9 @@ class Scraper:
         modified_papers[group][venue] = []
         venue_split = venue.split('/')
         venue_name, venue_year, venue_type = venue_split[0], venue_split[1], venue_split[2]
-        for paper in venue_papers:
-          # FILTERS
-          satisfying_keyword, satisfying_filter_type, satisfies = satisfies_any_filters(paper, self.keywords, self.filters)
+        # FILTERS
+        venue_matches = compiled_filters.match_papers(venue_papers)
+        for paper, (satisfying_keyword, satisfying_filter_type, satisfies) in zip(venue_papers, venue_matches):
           if satisfies:
             # creating a new field(key) in content attr which is a dict
             paper.content['match'] = {satisfying_filter_type: satisfying_keyword}
@@ -67,4 +77,5 @@ class Scraper:
     return modified_papers
 
   def add_filter(self, filter_, *args, **kwargs):
+    check_filter_arguments(filter_, args, kwargs)
     self.filters.append((filter_, args, kwargs))
\ No newline at end of file
@@ -1,10 +1,16 @@
 import openreview
-import csv
-from config import EMAIL, PASSWORD
-import dill
+import json
+import os
+import sys
+
+# the output sink of the scrapers in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from output_sink import OutputSink
 
 
 def get_client():
+  # imported here so the note cache and the fetch helpers work without credentials, e.g. in tests
+  from config import EMAIL, PASSWORD
   return openreview.Client(baseurl='https://api.openreview.net', username=EMAIL, password=PASSWORD)
 
 
@@ -18,27 +24,62 @@ def papers_to_list(papers):
 
 
 def to_csv(papers_list, fpath):
-  def write_csv():
-    with open(fpath, 'a+') as fp:
-      fp.seek(0, 0) # seek to beginning of file and then read
-      previous_contents = fp.read()
-      writer = csv.DictWriter(fp, fieldnames=field_names)
-      if previous_contents.strip()=='':
-        writer.writeheader()
-      writer.writerows(papers_list)
+  # appends through the shared output sink, the header is only written to a new or empty file
   if len(papers_list)>0:
     field_names = list(papers_list[0].keys()) # choose one of the papers, get all the keys as they'll be same for rest of them
-    write_csv()
+    with OutputSink(fpath, columns=field_names, sink_format='csv', append=True) as sink:
+      for paper in papers_list:
+        sink.write(paper)
+
+
+def note_to_dict(note):
+  # Note.to_json leaves out details, which hold the directReplies
+  note_dict = note.to_json()
+  note_dict['details'] = getattr(note, 'details', None)
+  return note_dict
+
+
+def note_from_dict(note_dict):
+  return openreview.Note.from_json(note_dict)
+
+
+def save_notes(notes, fpath):
+  # written to a temporary file first so an interrupted save never leaves a partial file behind
+  with open(fpath + '.tmp', 'w', encoding='utf-8') as fp:
+    for note in notes:
+      fp.write(json.dumps(note_to_dict(note), ensure_ascii=False) + '\n')
+  os.replace(fpath + '.tmp', fpath)
+
+
+def load_notes(fpath):
+  with open(fpath, encoding='utf-8') as fp:
+    return [note_from_dict(json.loads(line)) for line in fp if line.strip()]
 
 
 def save_papers(papers, fpath):
-  with open(fpath, 'wb') as fp:
-    dill.dump(papers, fp)
-    print(f'Papers saved at: {fpath}')
+  # one JSONL line per paper with its group and venue, papers are Note objects or extracted dicts
+  with open(fpath + '.tmp', 'w', encoding='utf-8') as fp:
+    for group, grouped_venues in papers.items():
+      for venue, venue_papers in grouped_venues.items():
+        for paper in venue_papers:
+          record = {'group':group, 'venue':venue}
+          if isinstance(paper, dict):
+            record['paper'] = paper
+          else:
+            record['note'] = note_to_dict(paper)
+          fp.write(json.dumps(record, ensure_ascii=False) + '\n')
+  os.replace(fpath + '.tmp', fpath)
+  print(f'Papers saved at: {fpath}')
 
 
 def load_papers(fpath):
-  with open(fpath, 'rb') as fp:
-    papers = dill.load(fp)
+  papers = {}
+  with open(fpath, encoding='utf-8') as fp:
+    for line in fp:
+      if not line.strip():
+        continue
+      record = json.loads(line)
+      paper = record['paper'] if 'paper' in record else note_from_dict(record['note'])
+      papers.setdefault(record['group'], {}).setdefault(record['venue'], []).append(paper)
   print(f'Papers loaded from: {fpath}')
-  return papers
\ No newline at end of file
+  return papers
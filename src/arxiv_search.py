@@ -5,13 +5,14 @@ import pandas as pd
 from collections import defaultdict
 from multiprocessing import Pool, cpu_count
 from functools import partial
-
-def create_keyword_pattern(keywords):
-    """
-    Create a regex pattern for keyword matching.
-    """
-    pattern = r'(?:(?<=\W)|(?<=^))(' + '|'.join(map(re.escape, keywords)) + r')(?=\W|$)'
-    return re.compile(pattern, re.IGNORECASE)
+from shard_writer import ShardWriter, text_hash, shard_path_for, load_shards, manifest_total_texts, pattern_set_hash, scan_to_shards
+from file_ranges import DEFAULT_CHUNK_BYTES, is_jsonl_file, is_compressed, split_file_ranges, iter_range_lines
+from keyword_matcher import create_keyword_pattern, create_keyword_matcher
+from latex_cleaning import remove_latex_commands_fused, normalize_whitespace
+from jsonl_decoding import JsonlDecoder, DecodeErrorLog, MalformedLineError
+from bytes_prefilter import keyword_anchor_terms, create_bytes_prefilter, count_range_lines, iter_candidate_lines
+from pattern_sets import SPAN_COLUMNS, find_match_spans, PatternSets, is_keyword_set
+from output_sink import write_table, sink_format_for
 
 def remove_latex_commands(s):
     """
@@ -34,62 +35,234 @@ def remove_latex_commands(s):
     s = re.sub(r'(?<=\W)\\|\\(?=\W)', '', s)
     return s.strip()
 
-def process_file(file_path, auroc_pattern, auprc_pattern, metadata_keys, remove_latex):
+def search_keywords(text, auroc_pattern, auprc_pattern, matcher=None):
+    """
+    Check a text for AUROC and AUPRC keywords, returning (contains_auroc, contains_auprc).
+
+    If a keyword matcher over the 'auroc' and 'auprc' keyword sets is given, it checks both sets
+    in one pass and the two patterns are not used.
+    """
+    if matcher is not None:
+        matched_sets = matcher.match(text)
+        return 'auroc' in matched_sets, 'auprc' in matched_sets
+    return auroc_pattern.search(text) is not None, auprc_pattern.search(text) is not None
+
+def process_file(file_path, auroc_pattern, auprc_pattern, metadata_keys, remove_latex, shard_folder_path=None, batch_size=1000, shard_format="jsonl", start=0, end=None, matcher=None, latex_cleaner="regex", match_first=False, json_backend=None, error_log_path=None, prefilter=None, pattern_sets=None, capture_spans=False):
     """
     Process a single JSONL file to search for texts mentioning either AUROC or AUPRC, or both.
+
+    latex_cleaner='fused' uses remove_latex_commands_fused, which gives the same output as
+    remove_latex_commands in one regex pass. With match_first=True the keywords are first searched
+    in the raw text with its newlines and tabs replaced by spaces, as the cleaners do first, so a
+    keyword split across lines such as 'average\nprecision' is still a candidate. Only candidate
+    texts are cleaned and searched again. This still misses keywords that only appear once LaTeX
+    removal splices two pieces of text together, e.g. 'AU$x$C', so it is not fully equivalent to
+    cleaning every text.
+
+    A compiled bytes prefilter (see bytes_prefilter.create_bytes_prefilter) restricts decoding to
+    the lines where it matches the raw bytes. All lines still count towards total_texts. Like
+    match_first, it runs before LaTeX removal and misses keywords that removal splices together,
+    e.g. 'AU$x$C', so it is not fully equivalent to a full scan when remove_latex is True.
     """
+    clean_latex = remove_latex_commands_fused if latex_cleaner == "fused" else remove_latex_commands
+    decoder = JsonlDecoder(metadata_keys, backend=json_backend)
+    error_log = DecodeErrorLog(f"{file_path} (bytes {start}-{end})", error_log_path)
     output_data = []
     total_texts = 0
+    writer = None
+    if shard_folder_path is not None:
+        writer = ShardWriter(shard_path_for(shard_folder_path, file_path, shard_format, start), batch_size=batch_size, shard_format=shard_format)
 
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
+    pattern_groups = pattern_sets.pattern_groups if pattern_sets is not None else [[auroc_pattern], [auprc_pattern]]
+    lines_read = 0
+    # Compressed files cannot be memory-mapped, their lines are prefiltered one by one instead
+    mapped = prefilter is not None and not is_compressed(file_path)
+    if mapped:
+        # Lines without a candidate term are only counted, never decoded
+        total_texts = count_range_lines(file_path, start, end)
+        lines = iter_candidate_lines(file_path, prefilter, start, end)
+    else:
+        lines = iter_range_lines(file_path, start, end, binary=True)
+
+    for line in lines:
+        lines_read += 1
+        if not mapped:
             total_texts += 1
-            try:
-                entry = json.loads(line)
-                text = entry['text']
-                if remove_latex:
-                    text = remove_latex_commands(text)
-                meta_data = entry.get('meta', {})
-
-                contains_auroc = auroc_pattern.search(text) is not None
-                contains_auprc = auprc_pattern.search(text) is not None
-
-                if contains_auroc or contains_auprc:
-                    row_data = {key: meta_data.get(key, None) for key in metadata_keys}
-                    row_data['text'] = text
+            if prefilter is not None and prefilter.search(line) is None:
+                continue
+        try:
+            text, meta_data = decoder.decode(line)
+            if remove_latex and match_first:
+                raw_text = normalize_whitespace(text)
+                if not (pattern_sets.any_match(raw_text) if pattern_sets is not None else any(search_keywords(raw_text, auroc_pattern, auprc_pattern, matcher))):
+                    continue
+            if remove_latex:
+                text = clean_latex(text)
+
+            if pattern_sets is not None:
+                hits = pattern_sets.count_hits(text)
+                keep = pattern_sets.keeps(hits)
+            else:
+                contains_auroc, contains_auprc = search_keywords(text, auroc_pattern, auprc_pattern, matcher)
+                keep = contains_auroc or contains_auprc
+
+            if keep:
+                row_data = {key: meta_data.get(key, None) for key in metadata_keys}
+                row_data['text'] = text
+                if pattern_sets is not None:
+                    row_data.update(pattern_sets.row_columns(hits))
+                else:
                     row_data['contains_auroc'] = contains_auroc
                     row_data['contains_auprc'] = contains_auprc
+                if capture_spans:
+                    row_data.update(zip(SPAN_COLUMNS, find_match_spans(text, pattern_groups)))
 
+                if writer is not None:
+                    row_data['text_id'] = text_hash(text)
+                    writer.write(row_data)
+                else:
                     output_data.append(row_data)
 
-            except json.JSONDecodeError as e:
-                print(f"Error loading line in {file_path}: {line}. Error: {e}")
+        except MalformedLineError as e:
+            error_log.record(f"candidate line {lines_read}" if mapped else f"line {lines_read}", line, e)
+
+    error_log.close()
+    if writer is not None:
+        writer.close()
+        shard_entry = {
+            'source': file_path,
+            'start': start,
+            'end': end,
+            'shard': os.path.relpath(writer.shard_path, os.path.dirname(shard_folder_path)),
+            'rows': writer.rows_written,
+            'total_texts': total_texts,
+            'malformed_lines': error_log.count,
+        }
+        return [shard_entry], total_texts
 
     return output_data, total_texts
 
-def jsonl_folder_filtering(input_folder_path, auroc_search_terms, auprc_search_terms, metadata_keys=[], output_folder_path=None, remove_latex=True, save_file=True, filename="filtered_data.json", total_texts_filename="total_texts.txt"):
+def process_range(file_range, **kwargs):
+    """
+    Process one line-aligned byte range of a JSONL file, returning the range together with its results.
+    """
+    file_path, start, end = file_range
+    return file_range, process_file(file_path, start=start, end=end, **kwargs)
+
+def jsonl_folder_filtering(input_folder_path, auroc_search_terms, auprc_search_terms, metadata_keys=[], output_folder_path=None, remove_latex=True, save_file=True, filename="filtered_data.csv", total_texts_filename="total_texts.txt", streaming=False, batch_size=1000, shard_format="jsonl", num_processes=None, chunk_bytes=DEFAULT_CHUNK_BYTES, matching_engine="regex", latex_cleaner="regex", match_first=False, json_backend=None, error_log_path=None, prefilter=False, prefilter_terms=None, prefilter_word_boundaries=True, resume=False, pattern_sets=None, keep="any", capture_spans=False):
     """
     Filter and process all JSONL files in a folder for AUROC and AUPRC related texts.
+    Shards compressed with gzip (.jsonl.gz) or zstd (.jsonl.zst) are decompressed on the fly,
+    one worker per compressed file.
+
+    With streaming=True every worker writes its matches straight to a shard in
+    output_folder_path/shards in batches of batch_size rows, text_id is a content hash,
+    and only the manifest of shards is returned. Use shard_writer.load_shards to read them back.
+
+    matching_engine='aho_corasick' finds both keyword lists in a single pass instead of two regex searches,
+    with the same word-boundary semantics as create_keyword_pattern.
+
+    latex_cleaner='fused' and match_first=True speed up LaTeX removal, see process_file.
+
+    json_backend picks the JSON decoder ('json', 'orjson' or 'msgspec'), by default the fastest installed.
+    Malformed lines are counted and a few samples per file range are appended to error_log_path,
+    or printed if it is None.
+
+    With prefilter=True each file is memory-mapped and only lines where a prefilter term occurs in the
+    raw bytes are decoded and processed. prefilter_terms defaults to one anchor word per keyword, and
+    prefilter_word_boundaries=False lets the terms match inside words. The prefilter runs on the raw
+    text, so with remove_latex=True it misses keywords that LaTeX removal splices together, see
+    process_file. bytes_prefilter.prefilter_differential_check compares a prefiltered scan with a full scan.
+
+    With resume=True results go through the shards in output_folder_path as well, and the manifest records
+    each range's file size, modification time and a hash of the keywords and settings. A rerun then only
+    scans new or changed files and ranges that did not finish, and merges them with the cached shards.
+    total_texts is rebuilt from the manifest.
+
+    The result is written to filename as CSV, JSONL or Parquet, picked by its extension.
+
+    pattern_sets runs several studies in one pass. It maps set names to keyword lists or lists of compiled
+    regexes, and replaces auroc_search_terms and auprc_search_terms, which can then be None. Every kept
+    document gets a contains_<name> flag and a <name>_hits match count per set. keep decides which
+    documents are kept: 'any' set matches, 'all' sets match, or any of a list of set names matches.
+
+    With capture_spans=True every kept document also gets the character offsets and pattern ids of all
+    its matches in the match_starts, match_ends and match_pattern_ids list columns. The pattern id is 0 for
+    AUROC and 1 for AUPRC, or the index of the pattern set. claim_search_v3.extract_context_windows_df
+    builds its windows from these columns without searching the texts again.
     """
-    auroc_pattern = create_keyword_pattern(auroc_search_terms)
-    auprc_pattern = create_keyword_pattern(auprc_search_terms)
+    # Fail on an unknown output format before the scan, not after it
+    if save_file:
+        sink_format_for(filename)
+    study_sets = None
+    auroc_pattern = auprc_pattern = matcher = None
+    if pattern_sets is not None:
+        study_sets = PatternSets(pattern_sets, keep=keep, matching_engine=matching_engine)
+        keyword_lists = list(pattern_sets.values())
+    else:
+        auroc_pattern = create_keyword_pattern(auroc_search_terms)
+        auprc_pattern = create_keyword_pattern(auprc_search_terms)
+        if matching_engine != "regex":
+            matcher = create_keyword_matcher({'auroc': auroc_search_terms, 'auprc': auprc_search_terms}, engine=matching_engine)
+        keyword_lists = [auroc_search_terms, auprc_search_terms]
+    bytes_prefilter = None
+    if prefilter:
+        if prefilter_terms is None:
+            if not all(is_keyword_set(keywords) for keywords in keyword_lists):
+                raise ValueError("The prefilter needs prefilter_terms when a pattern set holds regexes.")
+            prefilter_terms = keyword_anchor_terms([keyword for keywords in keyword_lists for keyword in keywords])
+        bytes_prefilter = create_bytes_prefilter(prefilter_terms, word_boundaries=prefilter_word_boundaries)
+
+    file_paths = [os.path.join(input_folder_path, file_name) for file_name in os.listdir(input_folder_path) if is_jsonl_file(file_name)]
+
+    if num_processes is None:
+        num_processes = cpu_count()
+
+    # Large files are split into line-aligned byte ranges so they are spread over all workers
+    file_ranges = [file_range for file_path in file_paths for file_range in split_file_ranges(file_path, chunk_bytes)]
+    keyword_columns = study_sets.columns if study_sets is not None else ['contains_auroc', 'contains_auprc']
+    if capture_spans:
+        keyword_columns = keyword_columns + SPAN_COLUMNS
 
-    file_paths = [os.path.join(input_folder_path, file_name) for file_name in os.listdir(input_folder_path) if file_name.endswith(".jsonl")]
+    if streaming or resume:
+        if output_folder_path is None:
+            raise ValueError("Streaming and resumable scans require an output_folder_path to write the shards to.")
+        shard_folder_path = os.path.join(output_folder_path, "shards")
+        os.makedirs(shard_folder_path, exist_ok=True)
 
-    process_partial = partial(process_file, auroc_pattern=auroc_pattern, auprc_pattern=auprc_pattern, metadata_keys=metadata_keys, remove_latex=remove_latex)
-    with Pool(cpu_count()) as p:
-        results = p.map(process_partial, file_paths)
+        # Only the small manifest entries come back from the workers
+        process_partial = partial(process_range, auroc_pattern=auroc_pattern, auprc_pattern=auprc_pattern, metadata_keys=metadata_keys, remove_latex=remove_latex, matcher=matcher, latex_cleaner=latex_cleaner, match_first=match_first, json_backend=json_backend, error_log_path=error_log_path, prefilter=bytes_prefilter, pattern_sets=study_sets, capture_spans=capture_spans, shard_folder_path=shard_folder_path, batch_size=batch_size, shard_format=shard_format)
+        if study_sets is not None:
+            patterns = study_sets.settings()
+        else:
+            patterns = {'auroc_search_terms': list(auroc_search_terms), 'auprc_search_terms': list(auprc_search_terms)}
+        # match_first and the prefilter can drop texts a full scan keeps (see process_file), so they are part of the hash
+        prefilter_settings = [sorted(set(prefilter_terms)), prefilter_word_boundaries] if prefilter else None
+        pattern_hash = pattern_set_hash(**patterns, metadata_keys=list(metadata_keys), remove_latex=remove_latex, shard_format=shard_format, capture_spans=capture_spans, match_first=match_first and remove_latex, prefilter=prefilter_settings)
+        manifest = scan_to_shards(process_partial, file_ranges, output_folder_path, pattern_hash, num_processes, resume=resume)
+        total_texts = manifest_total_texts(output_folder_path)
+        if streaming:
+            with open(os.path.join(output_folder_path, total_texts_filename), 'w') as f:
+                f.write(str(total_texts))
+            return manifest
+        # The content hash the shards store as text_id is left out, the usual factorized id is assigned below
+        df_output = load_shards(output_folder_path, columns=['text'] + metadata_keys + keyword_columns)
+    else:
+        process_partial = partial(process_range, auroc_pattern=auroc_pattern, auprc_pattern=auprc_pattern, metadata_keys=metadata_keys, remove_latex=remove_latex, matcher=matcher, latex_cleaner=latex_cleaner, match_first=match_first, json_backend=json_backend, error_log_path=error_log_path, prefilter=bytes_prefilter, pattern_sets=study_sets, capture_spans=capture_spans)
+        with Pool(num_processes) as p:
+            results_by_range = dict(p.imap_unordered(process_partial, file_ranges))
+        # Restore the file and range order so text_id assignment is deterministic
+        results = [results_by_range[file_range] for file_range in file_ranges]
 
-    output_data = [item for sublist, _ in results for item in sublist]
-    total_texts = sum(total for _, total in results)
+        output_data = [item for sublist, _ in results for item in sublist]
+        total_texts = sum(total for _, total in results)
 
-    df_output = pd.DataFrame(output_data)
+        df_output = pd.DataFrame(output_data, columns=['text'] + metadata_keys + keyword_columns)
 
     # Assigning a unique text_id for each unique text
     df_output['text_id'] = pd.factorize(df_output['text'])[0]
     
     # Specifying the column order
-    keyword_columns = ['contains_auroc', 'contains_auprc']
     column_order = ['text', 'text_id'] + metadata_keys + keyword_columns
     df_output = df_output[column_order]
 
@@ -100,7 +273,7 @@ def jsonl_folder_filtering(input_folder_path, auroc_search_terms, auprc_search_t
         with open(os.path.join(output_folder_path, total_texts_filename), 'w') as f:
             f.write(str(total_texts))
 
-        df_output.to_csv(os.path.join(output_folder_path, filename), index=False)
+        write_table(df_output, os.path.join(output_folder_path, filename))
     elif save_file:
         print("Warning: Output folder path is not provided. The DataFrame is not saved to a file.")
 
@@ -5,6 +5,13 @@ import pandas as pd
 from collections import defaultdict
 from multiprocessing import Pool, cpu_count
 from functools import partial
+from shard_writer import ShardWriter, text_hash, shard_path_for, load_shards, manifest_total_texts, pattern_set_hash, scan_to_shards
+from file_ranges import DEFAULT_CHUNK_BYTES, is_jsonl_file, is_compressed, split_file_ranges, iter_range_lines
+from latex_cleaning import remove_latex_commands_fused, normalize_whitespace
+from jsonl_decoding import JsonlDecoder, DecodeErrorLog, MalformedLineError
+from bytes_prefilter import create_bytes_prefilter, count_range_lines, iter_candidate_lines
+from pattern_sets import SPAN_COLUMNS, find_match_spans, PatternSets
+from output_sink import write_table, sink_format_for
 
 def remove_latex_commands(s):
     if s is None:
@@ -20,52 +27,158 @@ def remove_latex_commands(s):
     s = re.sub(r'(?<=\W)\\|\\(?=\W)', '', s)
     return s.strip()
 
-def process_file(file_path, auroc_regex, auprc_regex, metadata_keys, remove_latex):
+def process_file(file_path, auroc_regex, auprc_regex, metadata_keys, remove_latex, shard_folder_path=None, batch_size=1000, shard_format="jsonl", start=0, end=None, latex_cleaner="regex", match_first=False, json_backend=None, error_log_path=None, prefilter=None, pattern_sets=None, capture_spans=False):
+    clean_latex = remove_latex_commands_fused if latex_cleaner == "fused" else remove_latex_commands
+    decoder = JsonlDecoder(metadata_keys, backend=json_backend)
+    error_log = DecodeErrorLog(f"{file_path} (bytes {start}-{end})", error_log_path)
     output_data = []
     total_texts = 0
+    writer = None
+    if shard_folder_path is not None:
+        writer = ShardWriter(shard_path_for(shard_folder_path, file_path, shard_format, start), batch_size=batch_size, shard_format=shard_format)
 
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
+    pattern_groups = pattern_sets.pattern_groups if pattern_sets is not None else [[auroc_regex], [auprc_regex]]
+    lines_read = 0
+    # Compressed files cannot be memory-mapped, their lines are prefiltered one by one instead
+    mapped = prefilter is not None and not is_compressed(file_path)
+    if mapped:
+        # Lines without a candidate term are only counted, never decoded
+        total_texts = count_range_lines(file_path, start, end)
+        lines = iter_candidate_lines(file_path, prefilter, start, end)
+    else:
+        lines = iter_range_lines(file_path, start, end, binary=True)
+
+    for line in lines:
+        lines_read += 1
+        if not mapped:
             total_texts += 1
-            try:
-                entry = json.loads(line)
-                text = entry['text']
-                if remove_latex:
-                    text = remove_latex_commands(text)
-                meta_data = entry.get('meta', {})
+            if prefilter is not None and prefilter.search(line) is None:
+                continue
+        try:
+            text, meta_data = decoder.decode(line)
+            # Only texts where the regexes already match the raw text are cleaned and checked again.
+            # Newlines and tabs are replaced first, like the cleaners do, so keywords split across
+            # lines still match. Keywords that only appear once LaTeX is removed, e.g. 'AU$x$C', are missed.
+            if remove_latex and match_first:
+                raw_text = normalize_whitespace(text)
+                if not (pattern_sets.any_match(raw_text) if pattern_sets is not None else auroc_regex.search(raw_text) is not None or auprc_regex.search(raw_text) is not None):
+                    continue
+            if remove_latex:
+                text = clean_latex(text)
 
+            if pattern_sets is not None:
+                hits = pattern_sets.count_hits(text)
+                keep = pattern_sets.keeps(hits)
+            else:
                 contains_auroc = auroc_regex.search(text) is not None
                 contains_auprc = auprc_regex.search(text) is not None
+                keep = contains_auroc or contains_auprc
 
-                if contains_auroc or contains_auprc:
-                    row_data = {key: meta_data.get(key, None) for key in metadata_keys}
-                    row_data['text'] = text
+            if keep:
+                row_data = {key: meta_data.get(key, None) for key in metadata_keys}
+                row_data['text'] = text
+                if pattern_sets is not None:
+                    row_data.update(pattern_sets.row_columns(hits))
+                else:
                     row_data['contains_auroc'] = contains_auroc
                     row_data['contains_auprc'] = contains_auprc
+                if capture_spans:
+                    row_data.update(zip(SPAN_COLUMNS, find_match_spans(text, pattern_groups)))
 
+                if writer is not None:
+                    row_data['text_id'] = text_hash(text)
+                    writer.write(row_data)
+                else:
                     output_data.append(row_data)
 
-            except json.JSONDecodeError as e:
-                print(f"Error loading line in {file_path}: {line}. Error: {e}")
+        except MalformedLineError as e:
+            error_log.record(f"candidate line {lines_read}" if mapped else f"line {lines_read}", line, e)
+
+    error_log.close()
+    if writer is not None:
+        writer.close()
+        shard_entry = {
+            'source': file_path,
+            'start': start,
+            'end': end,
+            'shard': os.path.relpath(writer.shard_path, os.path.dirname(shard_folder_path)),
+            'rows': writer.rows_written,
+            'total_texts': total_texts,
+            'malformed_lines': error_log.count,
+        }
+        return [shard_entry], total_texts
 
     return output_data, total_texts
 
-def jsonl_folder_filtering(input_folder_path, auroc_regex, auprc_regex, metadata_keys=[], output_folder_path=None, remove_latex=True, save_file=True, filename="filtered_data.json", total_texts_filename="total_texts.txt"):
-    file_paths = [os.path.join(input_folder_path, file_name) for file_name in os.listdir(input_folder_path) if file_name.endswith(".jsonl")]
+def process_range(file_range, **kwargs):
+    """
+    Process one line-aligned byte range of a JSONL file, returning the range together with its results.
+    """
+    file_path, start, end = file_range
+    return file_range, process_file(file_path, start=start, end=end, **kwargs)
+
+def jsonl_folder_filtering(input_folder_path, auroc_regex, auprc_regex, metadata_keys=[], output_folder_path=None, remove_latex=True, save_file=True, filename="filtered_data.csv", total_texts_filename="total_texts.txt", streaming=False, batch_size=1000, shard_format="jsonl", num_processes=None, chunk_bytes=DEFAULT_CHUNK_BYTES, latex_cleaner="regex", match_first=False, json_backend=None, error_log_path=None, prefilter=False, prefilter_terms=None, prefilter_word_boundaries=True, resume=False, pattern_sets=None, keep="any", capture_spans=False):
+    # Fail on an unknown output format before the scan, not after it
+    if save_file:
+        sink_format_for(filename)
+    # Named pattern sets (see arxiv_search.jsonl_folder_filtering) replace the two regexes
+    study_sets = PatternSets(pattern_sets, keep=keep) if pattern_sets is not None else None
+    file_paths = [os.path.join(input_folder_path, file_name) for file_name in os.listdir(input_folder_path) if is_jsonl_file(file_name)]
+
+    if num_processes is None:
+        num_processes = cpu_count()
+
+    # The prefilter terms must cover every regex match. For the AUROC_REGEXES and AUPRC_REGEXES of search_v4.ipynb
+    # that is ['auc', 'roc', 'prc', 'apr', 'area', 'receiver', 'sensitivity', 'positive', 'tpr', 'precision'] with
+    # prefilter_word_boundaries=False, since e.g. 'AUROC' and 'AUPRC' only contain 'roc' and 'prc' inside a longer word.
+    # Check new terms with bytes_prefilter.prefilter_differential_check on a sample first. Matches that only appear
+    # once LaTeX removal splices text together, e.g. 'AU$x$C', are missed by any raw-bytes prefilter
+    bytes_prefilter = None
+    if prefilter:
+        if not prefilter_terms:
+            raise ValueError("The prefilter needs prefilter_terms that every regex match contains.")
+        bytes_prefilter = create_bytes_prefilter(prefilter_terms, word_boundaries=prefilter_word_boundaries)
+
+    # Large files are split into line-aligned byte ranges so they are spread over all workers
+    file_ranges = [file_range for file_path in file_paths for file_range in split_file_ranges(file_path, chunk_bytes)]
+    keyword_columns = study_sets.columns if study_sets is not None else ['contains_auroc', 'contains_auprc']
+    if capture_spans:
+        keyword_columns = keyword_columns + SPAN_COLUMNS
 
-    # Set the number of processes to 6 explicitly
-    num_processes = 6
+    if streaming or resume:
+        if output_folder_path is None:
+            raise ValueError("Streaming and resumable scans require an output_folder_path to write the shards to.")
+        shard_folder_path = os.path.join(output_folder_path, "shards")
+        os.makedirs(shard_folder_path, exist_ok=True)
 
-    process_partial = partial(process_file, auroc_regex=auroc_regex, auprc_regex=auprc_regex, metadata_keys=metadata_keys, remove_latex=remove_latex)
-    with Pool(num_processes) as p:
-        results = p.map(process_partial, file_paths)
+        process_partial = partial(process_range, auroc_regex=auroc_regex, auprc_regex=auprc_regex, metadata_keys=metadata_keys, remove_latex=remove_latex, latex_cleaner=latex_cleaner, match_first=match_first, json_backend=json_backend, error_log_path=error_log_path, prefilter=bytes_prefilter, pattern_sets=study_sets, capture_spans=capture_spans, shard_folder_path=shard_folder_path, batch_size=batch_size, shard_format=shard_format)
+        if study_sets is not None:
+            patterns = study_sets.settings()
+        else:
+            patterns = {'auroc_regex': (auroc_regex.pattern, auroc_regex.flags), 'auprc_regex': (auprc_regex.pattern, auprc_regex.flags)}
+        # match_first and the prefilter can drop texts a full scan keeps (see process_file), so they are part of the hash
+        prefilter_settings = [sorted(set(prefilter_terms)), prefilter_word_boundaries] if prefilter else None
+        pattern_hash = pattern_set_hash(**patterns, metadata_keys=list(metadata_keys), remove_latex=remove_latex, shard_format=shard_format, capture_spans=capture_spans, match_first=match_first and remove_latex, prefilter=prefilter_settings)
+        manifest = scan_to_shards(process_partial, file_ranges, output_folder_path, pattern_hash, num_processes, resume=resume)
+        total_texts = manifest_total_texts(output_folder_path)
+        if streaming:
+            with open(os.path.join(output_folder_path, total_texts_filename), 'w') as f:
+                f.write(str(total_texts))
+            return manifest
+        # The content hash the shards store as text_id is left out, the usual factorized id is assigned below
+        df_output = load_shards(output_folder_path, columns=['text'] + metadata_keys + keyword_columns)
+    else:
+        process_partial = partial(process_range, auroc_regex=auroc_regex, auprc_regex=auprc_regex, metadata_keys=metadata_keys, remove_latex=remove_latex, latex_cleaner=latex_cleaner, match_first=match_first, json_backend=json_backend, error_log_path=error_log_path, prefilter=bytes_prefilter, pattern_sets=study_sets, capture_spans=capture_spans)
+        with Pool(num_processes) as p:
+            results_by_range = dict(p.imap_unordered(process_partial, file_ranges))
+        # Restore the file and range order so text_id assignment is deterministic
+        results = [results_by_range[file_range] for file_range in file_ranges]
 
-    output_data = [item for sublist, _ in results for item in sublist]
-    total_texts = sum(total for _, total in results)
+        output_data = [item for sublist, _ in results for item in sublist]
+        total_texts = sum(total for _, total in results)
 
-    df_output = pd.DataFrame(output_data)
+        df_output = pd.DataFrame(output_data, columns=['text'] + metadata_keys + keyword_columns)
     df_output['text_id'] = pd.factorize(df_output['text'])[0]
-    keyword_columns = ['contains_auroc', 'contains_auprc']
     column_order = ['text', 'text_id'] + metadata_keys + keyword_columns
     df_output = df_output[column_order]
 
@@ -74,7 +187,7 @@ def jsonl_folder_filtering(input_folder_path, auroc_regex, auprc_regex, metadata
             os.makedirs(output_folder_path)
         with open(os.path.join(output_folder_path, total_texts_filename), 'w') as f:
             f.write(str(total_texts))
-        df_output.to_csv(os.path.join(output_folder_path, filename), index=False)
+        write_table(df_output, os.path.join(output_folder_path, filename))
     elif save_file:
         print("Warning: Output folder path is not provided. The DataFrame is not saved to a file.")
 
@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from file_ranges import iter_range_lines, zstandard
+
+def _synthetic_jsonl_lines(num_docs, words_per_doc, seed=0):
+    # A local generator, so the benchmark neither depends on nor resets the global random state
+    rng = random.Random(seed)
+    vocabulary = ["model", "data", "AUC", "ROC", "precision", "recall", "\\textbf{x}", "$y$", "we", "show", "the", "results"]
+    for index in range(num_docs):
+        text = ' '.join(rng.choice(vocabulary) for _ in range(words_per_doc))
+        yield (json.dumps({"text": text, "meta": {"arxiv_id": str(index)}}) + '\n').encode('utf-8')
+
+def benchmark_compressed_throughput(num_docs=2000, words_per_doc=5000, seed=0):
+    """
+    Compare the throughput of plain, gzip- and zstd-compressed JSONL shards holding the same synthetic data,
+    both for reading the lines and for a full arxiv_search.process_file scan with LaTeX removal.
+
+    Parameters:
+        num_docs (int): The number of synthetic documents.
+        words_per_doc (int): The number of words per document.
+        seed (int): The random seed for the synthetic data.
+
+    Returns:
+        Dict[str, dict]: Per format the file size in MB, the read time in seconds, the read
+        throughput in MB of uncompressed JSONL per second, the same for the scan, and the number
+        of texts the scan kept.
+    """
+    from arxiv_search import process_file
+    from keyword_matcher import create_keyword_pattern
+
+    auroc_pattern = create_keyword_pattern(["AUC", "ROC"])
+    auprc_pattern = create_keyword_pattern(["precision", "recall"])
+    folder_path = tempfile.mkdtemp()
+    try:
+        plain_path = os.path.join(folder_path, "shard.jsonl")
+        with open(plain_path, 'wb') as file:
+            file.writelines(_synthetic_jsonl_lines(num_docs, words_per_doc, seed))
+        file_paths = {"jsonl": plain_path}
+
+        with open(plain_path, 'rb') as source, gzip.open(plain_path + ".gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+        file_paths["jsonl.gz"] = plain_path + ".gz"
+
+        if zstandard is not None:
+            with open(plain_path, 'rb') as source, open(plain_path + ".zst", 'wb') as target:
+                zstandard.ZstdCompressor().copy_stream(source, target)
+            file_paths["jsonl.zst"] = plain_path + ".zst"
+
+        uncompressed_mb = os.path.getsize(plain_path) / 1e6
+        results = {}
+        for file_format, file_path in file_paths.items():
+            start_time = time.perf_counter()
+            num_lines = sum(1 for _ in iter_range_lines(file_path, binary=True))
+            seconds = time.perf_counter() - start_time
+            if num_lines != num_docs:
+                raise RuntimeError(f"Read {num_lines} lines from the {file_format} shard, expected {num_docs}.")
+
+            start_time = time.perf_counter()
+            output_data, total_texts = process_file(file_path, auroc_pattern, auprc_pattern, [], remove_latex=True)
+            scan_seconds = time.perf_counter() - start_time
+            if total_texts != num_docs:
+                raise RuntimeError(f"Scanned {total_texts} texts from the {file_format} shard, expected {num_docs}.")
+            results[file_format] = {
+                'size_mb': os.path.getsize(file_path) / 1e6,
+                'seconds': seconds,
+                'mb_per_second': uncompressed_mb / seconds,
+                'scan_seconds': scan_seconds,
+                'scan_mb_per_second': uncompressed_mb / scan_seconds,
+                'matches': len(output_data),
+            }
+        if len({result['matches'] for result in results.values()}) > 1:
+            raise RuntimeError(f"The formats kept different numbers of texts: {({file_format: result['matches'] for file_format, result in results.items()})}.")
+        return results
+    finally:
+        shutil.rmtree(folder_path)
+
+def _reference_context_windows(text, compiled_regexes, window_size):
+    # The original get_context_windows, which splits the text again for every merged match
+    all_matches = []
+    for compiled_regex in compiled_regexes:
+        all_matches.extend(list(compiled_regex.finditer(text)))
+    all_matches.sort(key=lambda match: match.start())
+
+    merged_matches = []
+    i = 0
+    while i < len(all_matches):
+        start_pos = all_matches[i].start()
+        end_pos = all_matches[i].end()
+        while i + 1 < len(all_matches) and all_matches[i + 1].start() - end_pos <= window_size * 2 * len(' '):
+            i += 1
+            end_pos = all_matches[i].end()
+        merged_matches.append((start_pos, end_pos))
+        i += 1
+
+    context_windows = []
+    for start_pos, end_pos in merged_matches:
+        words = text.split()
+        start_word_pos = len(text[:start_pos].split()) - 1
+        end_word_pos = len(text[:end_pos].split())
+        context_windows.append(' '.join(words[max(0, start_word_pos - window_size):min(len(words), end_word_pos + window_size)]))
+    return context_windows
+
+def _synthetic_paper(words_per_doc, matches_per_doc, rng):
+    vocabulary = ["model", "data", "we", "show", "the", "results", "AUC-ROC", "precision-recall", "\u00a0", "\n\n", "(AUC)", "é"]
+    words = [rng.choice(vocabulary[:6]) for _ in range(words_per_doc)]
+    for _ in range(matches_per_doc):
+        words[rng.randrange(words_per_doc)] = rng.choice(vocabulary[6:])
+    separators = [rng.choice([' ', ' ', ' ', '  ', '\n', '\t', '\u2003']) for _ in range(words_per_doc)]
+    return ''.join(word + separator for word, separator in zip(words, separators))
+
+def benchmark_context_windows(num_docs=20, words_per_doc=20000, matches_per_doc=300, window_sizes=(5, 50, 500), seed=0):
+    """
+    Compare claim_search_v3.get_context_windows with the original implementation on synthetic papers,
+    checking that both return the same windows.
+
+    Parameters:
+        num_docs (int): The number of synthetic papers.
+        words_per_doc (int): The number of words per paper.
+        matches_per_doc (int): The number of keyword occurrences per paper.
+        window_sizes (Tuple[int]): The window sizes to test.
+        seed (int): The random seed for the synthetic papers.
+
+    Returns:
+        Dict[int, dict]: Per window size the seconds taken by both implementations, the speedup
+        and the number of papers where the windows differ.
+    """
+    from claim_search_v3 import get_context_windows
+
+    rng = random.Random(seed)
+    texts = [_synthetic_paper(words_per_doc, matches_per_doc, rng) for _ in range(num_docs)]
+    compiled_regexes = [re.compile(r"(?i)\bAUC?\-?\(?ROC\)?\b|\bAUC\b"), re.compile(r"(?i)\bprecision[\s-]?recall\b")]
+
+    results = {}
+    for window_size in window_sizes:
+        start_time = time.perf_counter()
+        expected = [_reference_context_windows(text, compiled_regexes, window_size) for text in texts]
+        reference_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        found = [get_context_windows(text, compiled_regexes, window_size) for text in texts]
+        seconds = time.perf_counter() - start_time
+
+        results[window_size] = {
+            'reference_seconds': reference_seconds,
+            'seconds': seconds,
+            'speedup': reference_seconds / seconds,
+            'mismatches': sum(1 for a, b in zip(expected, found) if a != b),
+        }
+    return results
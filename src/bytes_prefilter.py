@@ -0,0 +1,128 @@
+import mmap
+import os
+import re
+from collections import Counter
+
+# Count newlines in pieces so a large byte range is never copied into memory at once
+_COUNT_CHUNK_BYTES = 64 * 1024 * 1024
+
+def keyword_anchor_terms(keywords):
+    """
+    Pick one anchor word per keyword, the longest run of word characters in it.
+
+    A text can only contain a keyword if it contains each of its words, so the anchors are a safe
+    prefilter for the keyword list on the raw text. With LaTeX removal they can still miss a keyword
+    that only appears once removal splices two pieces of text together, e.g. 'AU$x$C', which is
+    cleaned to 'AUC', like match_first in arxiv_search.process_file.
+
+    Parameters:
+        keywords (List[str]): The keywords, e.g. auroc_search_terms.
+
+    Returns:
+        List[str]: The distinct anchor words.
+    """
+    anchors = set()
+    for keyword in keywords:
+        words = re.findall(r'\w+', keyword)
+        if not words:
+            raise ValueError(f"Keyword '{keyword}' has no word characters to prefilter on.")
+        anchors.add(max(words, key=len).lower())
+    return sorted(anchors)
+
+def create_bytes_prefilter(terms, word_boundaries=True):
+    """
+    Compile a case-insensitive bytes regex that finds candidate terms in raw JSONL lines.
+
+    With word_boundaries=True a term must not be surrounded by ASCII word characters. A JSON escape
+    such as \\n or \\u2014 directly before the term also counts as a boundary, because the decoded
+    text has a separator there, and so does a LaTeX escape such as \\1, which the LaTeX cleaner removes.
+
+    Parameters:
+        terms (List[str]): The candidate terms, e.g. ['auc', 'roc', 'precision'].
+        word_boundaries (bool): Whether terms must appear as whole words.
+
+    Returns:
+        re.Pattern: The compiled bytes pattern.
+    """
+    alternation = b'|'.join(re.escape(term.encode('utf-8')) for term in sorted(set(terms), key=len, reverse=True))
+    pattern = b'(?:' + alternation + b')'
+    if word_boundaries:
+        pattern = rb'(?:(?<![A-Za-z0-9_])|(?<=\\[nrtbf"/\\])|(?<=\\u[0-9a-fA-F]{4})|(?<=\\\\.))' + pattern + rb'(?![A-Za-z0-9_])'
+    return re.compile(pattern, re.IGNORECASE)
+
+def count_range_lines(file_path, start=0, end=None):
+    """
+    Count the lines that start inside the byte range [start, end) of a line-aligned range,
+    the same number iter_range_lines would yield.
+    """
+    file_size = os.path.getsize(file_path)
+    if end is None:
+        end = file_size
+    if end <= start:
+        return 0
+    count = 0
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for chunk_start in range(start, end, _COUNT_CHUNK_BYTES):
+                count += buffer[chunk_start:min(end, chunk_start + _COUNT_CHUNK_BYTES)].count(b'\n')
+            # A last line without a trailing newline
+            if buffer[end - 1:end] != b'\n':
+                count += 1
+    return count
+
+def iter_candidate_lines(file_path, prefilter, start=0, end=None):
+    """
+    Memory-map a JSONL file and yield only the raw lines in [start, end) where the prefilter matches.
+
+    Parameters:
+        file_path (str): The JSONL file to scan.
+        prefilter (re.Pattern): A compiled bytes pattern, see create_bytes_prefilter.
+        start (int): The byte offset of the first line, must be the start of a line.
+        end (int): The byte offset where the range ends, or None for the end of the file.
+    """
+    file_size = os.path.getsize(file_path)
+    if end is None:
+        end = file_size
+    if end <= start:
+        return
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            position = start
+            while position < end:
+                # Bounded at end, so a range never scans the lines of the next one
+                match = prefilter.search(buffer, position, end)
+                if match is None:
+                    break
+                newline = buffer.rfind(b'\n', position, match.start())
+                line_start = position if newline == -1 else newline + 1
+                if line_start >= end:
+                    break
+                line_end = buffer.find(b'\n', match.end())
+                line_end = file_size if line_end == -1 else line_end + 1
+                yield buffer[line_start:line_end]
+                position = line_end
+
+def prefilter_differential_check(folder_filtering, input_folder_path, *args, **kwargs):
+    """
+    Run a folder scan with and without the bytes prefilter and compare the results.
+
+    An empty result means the prefilter terms cover every match of the scan's keywords or regexes
+    on this corpus. Run it on a sample of the corpus before trusting a new list of prefilter_terms.
+
+    Parameters:
+        folder_filtering (Callable): jsonl_folder_filtering of arxiv_search or arxiv_search_regex.
+        input_folder_path (str): The folder of JSONL files to scan.
+        *args, **kwargs: The keywords or regexes and settings of the scan, including prefilter_terms.
+
+    Returns:
+        Tuple[List[tuple], List[tuple]]: The rows only the full scan found, and the rows only the
+        prefiltered scan found, as tuples of the row values without text_id.
+    """
+    kwargs = {**kwargs, 'save_file': False, 'streaming': False, 'resume': False}
+    results = []
+    for prefilter in (False, True):
+        df = folder_filtering(input_folder_path, *args, prefilter=prefilter, **kwargs)
+        rows = df.drop(columns=['text_id']).astype(str).itertuples(index=False, name=None)
+        results.append(Counter(rows))
+    full, prefiltered = results
+    return sorted((full - prefiltered).elements()), sorted((prefiltered - full).elements())
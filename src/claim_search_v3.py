@@ -1,14 +1,32 @@
 import json
-from openai import OpenAI
+import os
 import time
-from tqdm import tqdm
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
 import re
+from bisect import bisect_left
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import time
+from functools import partial
+from multiprocessing import Pool, cpu_count
+from shard_writer import ShardWriter
+from llm_dispatch import dispatch_context_windows
+from llm_cache import cached_responses
+from llm_batch import write_batch_requests, ingest_batch_results
+from llm_journal import ResponseJournal, pending_windows, merge_journal
+from prescreen import response_labels
+from near_duplicates import add_near_duplicate_clusters
+from llm_packing import approximate_token_count, pack_context_windows, packed_system_prompt, packing_report, unpack_responses
+
+# Only the model calls need openai, the context window functions work without it
+try:
+    import openai
+except ImportError:
+    openai = None
 
-def get_context_windows(text, compiled_regexes, window_size):
+# A word as str.split() sees it, a run of non-whitespace characters
+_WORD = re.compile(r'\S+')
+
+def get_context_windows(text, compiled_regexes, window_size, merge_by_words=False):
     """
     Extract context windows around matches found by any of the compiled regexes in the text,
     ensuring that overlapping windows are merged into one.
@@ -17,12 +35,18 @@ def get_context_windows(text, compiled_regexes, window_size):
         text (str): The text to search through.
         compiled_regexes (List[re.Pattern]): A list of compiled regex objects used to find matches.
         window_size (int): The number of words around the match to include in the context window.
+        merge_by_words (bool): Merge by word distance, see get_context_windows_from_spans.
         
     Returns:
         List[str]: A list of context windows around the matches.
     """
-    context_windows = []
-    
+    match_starts, match_ends = _find_matches(text, compiled_regexes)
+    return get_context_windows_from_spans(text, match_starts, match_ends, window_size, merge_by_words)
+
+def _find_matches(text, compiled_regexes):
+    """
+    Return the start and end offsets of the matches of all compiled regexes, sorted by start.
+    """
     # Combine matches from all compiled regexes
     all_matches = []
     for compiled_regex in compiled_regexes:
@@ -30,35 +54,91 @@ def get_context_windows(text, compiled_regexes, window_size):
     
     # Sort matches by their start position
     all_matches.sort(key=lambda match: match.start())
+    return [match.start() for match in all_matches], [match.end() for match in all_matches]
+
+def _context_window_word_ranges(word_starts, match_starts, match_ends, window_size, merge_by_words):
+    """
+    Merge the matches and return the (first word, end word) range of every context window.
+    """
+    def words_before(position):
+        # The number of words in text[:position].split()
+        return bisect_left(word_starts, position)
 
     # Merge overlapping or adjacent matches
     merged_matches = []
     i = 0
-    while i < len(all_matches):
-        current_match = all_matches[i]
-        start_pos = current_match.start()
-        end_pos = current_match.end()
+    while i < len(match_starts):
+        start_pos = match_starts[i]
+        end_pos = match_ends[i]
 
-        while i + 1 < len(all_matches) and all_matches[i + 1].start() - end_pos <= window_size * 2 * len(' '):  # Estimate space size
+        while i + 1 < len(match_starts):
+            if merge_by_words:
+                gap = words_before(match_starts[i + 1]) - 1 - words_before(end_pos)
+            else:
+                gap = match_starts[i + 1] - end_pos
+            if gap > window_size * 2 * len(' '):  # Estimate space size
+                break
             i += 1
-            end_pos = all_matches[i].end()
+            end_pos = match_ends[i]
 
         merged_matches.append((start_pos, end_pos))
         i += 1
 
-    # Extract context windows for merged matches
+    word_ranges = []
     for start_pos, end_pos in merged_matches:
-        words = text.split()
-        start_word_pos = len(text[:start_pos].split()) - 1
-        end_word_pos = len(text[:end_pos].split())
-        context_words = words[max(0, start_word_pos - window_size):min(len(words), end_word_pos + window_size)]
-        context_str = ' '.join(context_words)
-        context_windows.append(context_str)
+        start_word_pos = words_before(start_pos) - 1
+        end_word_pos = words_before(end_pos)
+        word_ranges.append((max(0, start_word_pos - window_size), min(len(word_starts), end_word_pos + window_size)))
+    return word_ranges
 
-    return context_windows
+def get_context_windows_from_spans(text, match_starts, match_ends, window_size, merge_by_words=False):
+    """
+    Extract context windows around matches whose character spans are already known, e.g. the
+    match_starts and match_ends columns written by jsonl_folder_filtering(capture_spans=True).
+
+    The text is split into words once, and the word positions of the matches are found by binary
+    search over the word offsets, so long texts with many matches take linear time.
+    
+    Parameters:
+        text (str): The text the spans refer to.
+        match_starts (List[int]): The start offsets of the matches, sorted.
+        match_ends (List[int]): The end offsets of the matches.
+        window_size (int): The number of words around the match to include in the context window.
+        merge_by_words (bool): Merge matches whose windows overlap in words, instead of matches less
+            than 2 * window_size characters apart.
+        
+    Returns:
+        List[str]: A list of context windows around the matches.
+    """
+    words = text.split()
+    word_starts = [match.start() for match in _WORD.finditer(text)]
+    word_ranges = _context_window_word_ranges(word_starts, match_starts, match_ends, window_size, merge_by_words)
+    return [' '.join(words[first:last]) for first, last in word_ranges]
+
+def get_context_window_spans(text, match_starts, match_ends, window_size, merge_by_words=False):
+    """
+    Like get_context_windows_from_spans, but return the (start, end) character span of every window
+    in the text instead of its words. materialize_context_window turns a span back into the window.
+    """
+    word_spans = [match.span() for match in _WORD.finditer(text)]
+    word_starts = [start for start, _ in word_spans]
+    word_ranges = _context_window_word_ranges(word_starts, match_starts, match_ends, window_size, merge_by_words)
+    return [(word_spans[first][0], word_spans[last - 1][1]) if last > first else (0, 0) for first, last in word_ranges]
+
+def materialize_context_window(text, start_char, end_char):
+    """
+    Build the context window string for a character span from get_context_window_spans.
+    """
+    return ' '.join(text[start_char:end_char].split())
+
+def _as_offsets(value):
+    """
+    Read a span column value, which is a list, or its JSON text once the table went through a CSV file.
+    """
+    return json.loads(value) if isinstance(value, str) else list(value)
 
 
-def extract_context_windows_df(df, text_column, compiled_regexes, window_size):
+def extract_context_windows_df(df, text_column, compiled_regexes, window_size, merge_by_words=False):
     """
     Extract context windows for each text in the specified column of a DataFrame,
     and return a new DataFrame with each context window as a row, along with the original metadata.
@@ -66,8 +146,10 @@ def extract_context_windows_df(df, text_column, compiled_regexes, window_size):
     Parameters:
         df (pd.DataFrame): The original DataFrame.
         text_column (str): The name of the column containing text to search through.
-        compiled_regexes (List[re.Pattern]): A list of compiled regex objects used to find matches.
+        compiled_regexes (List[re.Pattern]): A list of compiled regex objects used to find matches,
+            or None to use the match_starts and match_ends columns captured during filtering.
         window_size (int): The number of words around the match to include in the context window.
+        merge_by_words (bool): Merge by word distance, see get_context_windows_from_spans.
         
     Returns:
         pd.DataFrame: A new DataFrame where each row is a context window, with original metadata.
@@ -77,7 +159,10 @@ def extract_context_windows_df(df, text_column, compiled_regexes, window_size):
     # Iterate over each row in the DataFrame
     for index, row in df.iterrows():
         text = row[text_column]
-        context_windows = get_context_windows(text, compiled_regexes, window_size)
+        if compiled_regexes is None:
+            context_windows = get_context_windows_from_spans(text, _as_offsets(row['match_starts']), _as_offsets(row['match_ends']), window_size, merge_by_words)
+        else:
+            context_windows = get_context_windows(text, compiled_regexes, window_size, merge_by_words)
         
         # For each context window, create a new row with the same metadata
         for window in context_windows:
@@ -90,8 +175,121 @@ def extract_context_windows_df(df, text_column, compiled_regexes, window_size):
 
     return context_df
 
-def process_with_gpt_with_retries(context_window, model, system_prompt, openai_api_key, max_retries=5):
-    client = OpenAI(api_key=openai_api_key)
+WINDOW_TABLE_COLUMNS = ['text_id', 'window_id', 'start_char', 'end_char']
+
+# The texts and match spans the window workers read. Forked workers inherit them instead of
+# receiving a copy with every task.
+_window_source = None
+
+def _init_window_worker(source):
+    global _window_source
+    _window_source = source
+
+def _window_rows(row_range, window_size, merge_by_words):
+    """
+    Compute the window table rows for the papers in row_range of the worker's window source.
+    """
+    rows = []
+    for index in range(*row_range):
+        text = _window_source['texts'][index]
+        if _window_source['compiled_regexes'] is not None:
+            match_starts, match_ends = _find_matches(text, _window_source['compiled_regexes'])
+        else:
+            match_starts = _as_offsets(_window_source['match_starts'][index])
+            match_ends = _as_offsets(_window_source['match_ends'][index])
+        spans = get_context_window_spans(text, match_starts, match_ends, window_size, merge_by_words)
+        rows.extend(
+            {'text_id': _window_source['text_ids'][index], 'window_id': window_id, 'start_char': start_char, 'end_char': end_char}
+            for window_id, (start_char, end_char) in enumerate(spans)
+        )
+    return rows
+
+def build_context_window_table(df, output_path, text_column='text', compiled_regexes=None, window_size=500, merge_by_words=False, num_processes=None, chunk_size=200, batch_size=10000, shard_format="jsonl"):
+    """
+    Build a normalized table of context windows, one row per window with its text_id and character span.
+
+    Unlike extract_context_windows_df no metadata or window text is copied into the rows. The metadata
+    stays in df once per paper, and materialize_context_windows builds the window texts only for the
+    windows that are sent to the model. Papers are split into chunks that a process pool works on, and
+    the rows are streamed to output_path in batches, in the order of df. Rows with a text_id that
+    already occurred are skipped, since their windows would be the same.
+
+    Parameters:
+        df (pd.DataFrame): The filtered papers, with a text_id column.
+        output_path (str): The .jsonl or .parquet file to write the window table to.
+        text_column (str): The name of the column containing the texts.
+        compiled_regexes (List[re.Pattern]): The regexes to find matches with, or None to use the
+            match_starts and match_ends columns captured during filtering.
+        window_size (int): The number of words around the match to include in the context window.
+        merge_by_words (bool): Merge by word distance, see get_context_windows_from_spans.
+        num_processes (int): The number of worker processes, defaults to the number of cores.
+        chunk_size (int): The number of papers per task.
+        batch_size (int): The number of rows written at a time.
+        shard_format (str): 'jsonl' or 'parquet'.
+
+    Returns:
+        int: The number of windows written.
+    """
+    if num_processes is None:
+        num_processes = cpu_count()
+    papers = df.drop_duplicates('text_id')
+    source = {
+        'text_ids': papers['text_id'].tolist(),
+        'texts': papers[text_column].tolist(),
+        'compiled_regexes': compiled_regexes,
+        'match_starts': papers['match_starts'].tolist() if compiled_regexes is None else None,
+        'match_ends': papers['match_ends'].tolist() if compiled_regexes is None else None,
+    }
+    row_ranges = [(start, min(start + chunk_size, len(papers))) for start in range(0, len(papers), chunk_size)]
+
+    num_windows = 0
+    window_partial = partial(_window_rows, window_size=window_size, merge_by_words=merge_by_words)
+    with ShardWriter(output_path, batch_size=batch_size, shard_format=shard_format) as writer:
+        with Pool(num_processes, initializer=_init_window_worker, initargs=(source,)) as p:
+            for rows in p.imap(window_partial, row_ranges):
+                for row in rows:
+                    writer.write(row)
+                num_windows += len(rows)
+    return num_windows
+
+def load_context_window_table(path):
+    """
+    Load a window table written by build_context_window_table.
+    """
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=WINDOW_TABLE_COLUMNS)
+    return pd.read_json(path, lines=True, dtype=False)
+
+def materialize_context_windows(window_table, df, text_column='text'):
+    """
+    Add the window text as a context_window column to (a slice of) a window table.
+
+    Parameters:
+        window_table (pd.DataFrame): Rows of the window table, e.g. the first 2000 to send to the model.
+        df (pd.DataFrame): The filtered papers the table was built from.
+        text_column (str): The name of the column containing the texts.
+
+    Returns:
+        pd.DataFrame: A copy of window_table with the context_window column, ready for process_all_context_windows.
+    """
+    texts = df.drop_duplicates('text_id').set_index('text_id')[text_column]
+    windows = window_table.copy()
+    windows['context_window'] = [
+        materialize_context_window(texts[text_id], start_char, end_char)
+        for text_id, start_char, end_char in zip(windows['text_id'], windows['start_char'], windows['end_char'])
+    ]
+    return windows
+
+def _openai_client(openai_api_key):
+    if openai is None:
+        raise ImportError("Sending context windows to the model requires the openai package.")
+    return openai.OpenAI(api_key=openai_api_key)
+
+def process_with_gpt_with_retries(context_window, model, system_prompt, openai_api_key, max_retries=5, client=None):
+    if client is None:
+        client = _openai_client(openai_api_key)
     retry_delay = 0.5  # Reduced initial delay in seconds for retries
     max_retry_delay = 16  # Maximum delay, to avoid long waits
     for attempt in range(max_retries):
@@ -117,31 +315,241 @@ def process_with_gpt_with_retries(context_window, model, system_prompt, openai_a
             retry_delay = min(retry_delay * 2, max_retry_delay)  # Exponential backoff with max limit
     return "Error: Max retries exceeded."
 
-def process_all_context_windows(new_df, model, system_prompt, openai_api_key, texts_before_pause=1000, pause_duration=5, max_workers= 1):
-    responses = {}
+def process_all_context_windows(new_df, model, system_prompt, openai_api_key, texts_before_pause=1000, pause_duration=5, max_workers= 1, cache_path=None, journal_path=None):
+    if cache_path is not None:
+        # Identical windows are sent once, and windows answered in an earlier run are not sent at all
+        def send(context_windows):
+            distinct_df = pd.DataFrame({'context_window': context_windows})
+            return process_all_context_windows(distinct_df, model, system_prompt, openai_api_key, texts_before_pause, pause_duration, max_workers, journal_path=journal_path)['gpt_response'].tolist()
+        responses, _ = cached_responses(new_df['context_window'].tolist(), model, system_prompt, send, cache_path)
+        new_df['gpt_response'] = responses
+        return new_df
+
+    if journal_path is not None:
+        # Every finished window is appended to the journal, and windows finished in an earlier run are skipped
+        window_hashes, pending_df, pending_hashes = pending_windows(new_df, journal_path, model, system_prompt)
+        print(f"Journal: {len(pending_df)} distinct context windows left to send for {len(new_df)} rows")
+    else:
+        pending_df = new_df
+        pending_hashes = [None] * len(new_df)
+
+    responses = [None] * len(pending_df)
     processed_texts = 0
+    # One client, and with it one connection pool, is shared by all threads
+    client = _openai_client(openai_api_key)
+    journal = ResponseJournal(journal_path, model, system_prompt) if journal_path is not None else None
     with ThreadPoolExecutor(max_workers=max_workers) as executor:  # Adjust max_workers based on your environment
-        future_to_idx = {executor.submit(process_with_gpt_with_retries, row['context_window'], model, system_prompt, openai_api_key): idx for idx, row in new_df.iterrows()}
-
-        for future in as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                response = future.result()
-            except Exception as exc:
-                print(f'Context window at index {idx} generated an exception: {exc}')
-                response = "Error: Exception in processing"
-            
-            responses[idx] = response
-            processed_texts += 1
-
-            # Indicator for how many texts have been processed
-            if processed_texts % texts_before_pause == 0:
-                print(f"Processed {processed_texts}/{len(new_df)} texts; pausing for {pause_duration} seconds...")
-                time.sleep(pause_duration)
-    
-    # Update the DataFrame with the responses using .loc
-    for idx, response in responses.items():
-        if idx in new_df.index:
-            new_df.loc[idx, 'gpt_response'] = response
+        future_to_idx = {executor.submit(process_with_gpt_with_retries, context_window, model, system_prompt, openai_api_key, client=client): (position, idx, window_hash) for position, (idx, context_window, window_hash) in enumerate(zip(pending_df.index, pending_df['context_window'], pending_hashes))}
+
+        try:
+            for future in as_completed(future_to_idx):
+                position, idx, window_hash = future_to_idx[future]
+                try:
+                    response = future.result()
+                except Exception as exc:
+                    print(f'Context window at index {idx} generated an exception: {exc}')
+                    response = "Error: Exception in processing"
+
+                if journal is not None:
+                    journal.append(window_hash, response, idx)
+                else:
+                    responses[position] = response
+                processed_texts += 1
+
+                # Indicator for how many texts have been processed
+                if processed_texts % texts_before_pause == 0:
+                    print(f"Processed {processed_texts}/{len(pending_df)} texts; pausing for {pause_duration} seconds...")
+                    time.sleep(pause_duration)
+        except KeyboardInterrupt:
+            # Windows that have not started are dropped, the finished ones are already in the journal
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            if journal is not None:
+                journal.close()
+
+    if journal_path is not None:
+        return merge_journal(new_df, window_hashes, journal_path, model, system_prompt)
+
+    # Update the DataFrame with the responses in one step
+    new_df['gpt_response'] = responses
+    return new_df
+
+def process_all_context_windows_async(new_df, model, system_prompt, openai_api_key, cache_path=None, **dispatcher_kwargs):
+    """
+    Like process_all_context_windows, but send the context windows through an asyncio LLMDispatcher
+    (see llm_dispatch.py) with one shared client, a bounded number of requests in flight and
+    requests-per-minute and tokens-per-minute budgets instead of fixed pauses.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        model (str): The model name.
+        system_prompt (str): The system prompt.
+        openai_api_key (str): The API key.
+        cache_path (str): An SQLite response cache (see llm_cache.py). Identical windows are then sent
+            once, and windows already answered in an earlier run are not sent at all.
+        **dispatcher_kwargs: LLMDispatcher settings, e.g. max_in_flight=32, requests_per_minute=3500 or tokens_per_minute=90000.
+
+    Returns:
+        pd.DataFrame: new_df with the responses in a gpt_response column.
+    """
+    def send(context_windows):
+        responses, stats = dispatch_context_windows(context_windows, model, system_prompt, openai_api_key, **dispatcher_kwargs)
+        print(f"Sent {stats['requests']} requests for {len(context_windows)} context windows, {stats['rate_limited']} rate limited, {stats['failed']} failed")
+        return responses
+
+    if cache_path is not None:
+        responses, _ = cached_responses(new_df['context_window'].tolist(), model, system_prompt, send, cache_path)
+    else:
+        responses = send(new_df['context_window'].tolist())
+    new_df['gpt_response'] = responses
+    return new_df
+
+def write_context_window_batch(new_df, model, system_prompt, batch_folder_path, **batch_kwargs):
+    """
+    Write the context windows as OpenAI Batch API request files instead of sending them (see llm_batch.py).
+    Upload the files as batches, download the output and error files, and read them back with
+    ingest_context_window_batch.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        model (str): The model name.
+        system_prompt (str): The system prompt.
+        batch_folder_path (str): The folder to write the request files to.
+        **batch_kwargs: Further write_batch_requests settings, e.g. max_requests, max_bytes or temperature=0.
+
+    Returns:
+        List[str]: The paths of the request files.
+    """
+    return write_batch_requests(new_df['context_window'], model, system_prompt, batch_folder_path, **batch_kwargs)
+
+def ingest_context_window_batch(new_df, result_paths):
+    """
+    Merge downloaded Batch API output and error files into new_df as a gpt_response column,
+    matching each window to its result by custom_id.
+    """
+    return ingest_batch_results(new_df, result_paths)
+
+def process_all_context_windows_packed(new_df, model, system_prompt, openai_api_key, max_request_tokens=3000, max_windows_per_request=20, group_column='text_id', token_counter=None, cache_path=None, **dispatcher_kwargs):
+    """
+    Like process_all_context_windows_async, but pack the short windows of each paper into one request
+    and split windows that are too long (see llm_packing.py). The model answers every window of a
+    request in one JSON object, and the answers are mapped back to the windows.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        model (str): The model name.
+        system_prompt (str): The system prompt for a single window.
+        openai_api_key (str): The API key.
+        max_request_tokens (int): The maximum number of tokens in the user message of a request.
+        max_windows_per_request (int): The maximum number of windows in a request.
+        group_column (str): The column identifying the paper of a window, windows are only packed within a paper.
+        token_counter (Callable[[str], int]): Counts the tokens of a text, defaults to about 4 characters per token.
+        cache_path (str): An SQLite response cache for the packed requests (see llm_cache.py).
+        **dispatcher_kwargs: LLMDispatcher settings, e.g. max_in_flight=32 or tokens_per_minute=90000.
+
+    Returns:
+        pd.DataFrame: new_df with the responses in a gpt_response column.
+    """
+    if token_counter is None:
+        token_counter = approximate_token_count
+    requests, excerpts = pack_context_windows(new_df, max_request_tokens, max_windows_per_request, group_column, token_counter)
+    packing_report(new_df, requests, system_prompt, token_counter)
+    requests = process_all_context_windows_async(requests, model, packed_system_prompt(system_prompt), openai_api_key, cache_path=cache_path, **dispatcher_kwargs)
+    return unpack_responses(new_df, excerpts, requests['gpt_response'].tolist())
 
+def run_model_cascade(new_df, models, system_prompt, openai_api_key, prescreen=None, prescreen_threshold=0.05, negative_response="NONE", send=None, escalate=None, escalation_thresholds=None, **dispatcher_kwargs):
+    """
+    Classify context windows with a cascade: an optional local pre-screen (see prescreen.py), then
+    each model in turn. Windows scoring below prescreen_threshold are dropped before the first model.
+    After each model but the last, escalate decides which of the windows it saw go on to the next model.
+    By default these are the windows it labels positive (a response not starting with negative_response),
+    like the GPT-3.5 and GPT-4 Turbo rounds in the README.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        models (List[str]): The models of the cascade, cheapest first.
+        system_prompt (str): The system prompt.
+        openai_api_key (str): The API key.
+        prescreen (prescreen.PreScreenClassifier): A trained pre-screen, or None to send every window to the first model.
+        prescreen_threshold (float): The pre-screen probability a window needs to reach the first model,
+            e.g. from prescreen.threshold_for_recall on held-out labelled windows.
+        negative_response (str): The start of a response that means nothing was found.
+        send (Callable[[pd.DataFrame, str], List[str]]): Gets the responses of a model for a window table,
+            defaults to process_all_context_windows_async.
+        escalate (Callable[[pd.DataFrame, List[str]], Sequence[bool]]): Gets the windows a model saw and its
+            responses, and returns which windows go on to the next model. One predicate for every step or a
+            list with one per step (len(models) - 1), where None keeps the default rule.
+        escalation_thresholds (List[float]): The pre-screen score a window also needs to go on from each model
+            to the next, one per step. Requires a prescreen.
+        **dispatcher_kwargs: LLMDispatcher settings for the default send.
+
+    Returns:
+        pd.DataFrame: new_df with a <model>_response column per model, the pre-screen score, the last
+        stage each window reached in cascade_stage, and the final response in gpt_response.
+    """
+    steps = len(models) - 1
+    if escalate is None or callable(escalate):
+        escalate = [escalate] * steps
+    if len(escalate) != steps:
+        raise ValueError(f"escalate needs one predicate per step between models, {steps} for {len(models)} models.")
+    if escalation_thresholds is not None:
+        if prescreen is None:
+            raise ValueError("escalation_thresholds compare pre-screen scores and require a prescreen.")
+        if len(escalation_thresholds) != steps:
+            raise ValueError(f"escalation_thresholds needs one threshold per step between models, {steps} for {len(models)} models.")
+    if send is None:
+        def send(windows_df, model):
+            return process_all_context_windows_async(windows_df.copy(), model, system_prompt, openai_api_key, **dispatcher_kwargs)['gpt_response'].tolist()
+
+    active = np.ones(len(new_df), dtype=bool)
+    new_df['cascade_stage'] = 'prescreen' if prescreen is not None else models[0]
+    new_df['gpt_response'] = negative_response
+    if prescreen is not None:
+        new_df['prescreen_score'] = prescreen.predict_proba(new_df['context_window'])
+        active = new_df['prescreen_score'].to_numpy() >= prescreen_threshold
+        print(f"Pre-screen: {len(new_df) - active.sum()} of {len(new_df)} windows dropped before {models[0]}")
+
+    for tier, model in enumerate(models):
+        column = f"{model}_response"
+        new_df[column] = None
+        if not active.any():
+            continue
+        windows_df = new_df[active]
+        responses = send(windows_df, model)
+        new_df.loc[active, column] = responses
+        new_df.loc[active, 'gpt_response'] = responses
+        new_df.loc[active, 'cascade_stage'] = model
+        print(f"{model}: {active.sum()} windows sent")
+        if tier < steps:
+            if escalate[tier] is None:
+                passed = response_labels(list(responses), negative_response) == 1
+            else:
+                passed = np.asarray(escalate[tier](windows_df, list(responses)), dtype=bool)
+            escalated = np.zeros(len(new_df), dtype=bool)
+            escalated[active] = passed
+            if escalation_thresholds is not None:
+                escalated &= new_df['prescreen_score'].to_numpy() >= escalation_thresholds[tier]
+            active = escalated
+    return new_df
+
+def process_near_duplicate_windows(new_df, process, threshold=0.8, **cluster_kwargs):
+    """
+    Send only one representative of each cluster of near-duplicate context windows to the model, and
+    give every window of a cluster its representative's response (see near_duplicates.py).
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        process (Callable[[pd.DataFrame], pd.DataFrame]): Adds a gpt_response column to a window table, e.g.
+            lambda df: process_all_context_windows_async(df, model, system_prompt, openai_api_key).
+        threshold (float): The Jaccard similarity from which windows count as near duplicates.
+        **cluster_kwargs: Further add_near_duplicate_clusters settings, e.g. num_perm, shingle_size or num_processes.
+
+    Returns:
+        pd.DataFrame: new_df with window_cluster_id, is_representative and gpt_response columns.
+    """
+    new_df = add_near_duplicate_clusters(new_df, 'context_window', 'window_cluster_id', threshold, **cluster_kwargs)
+    representatives = process(new_df[new_df['is_representative']].copy())
+    responses = representatives.set_index('window_cluster_id')['gpt_response']
+    new_df['gpt_response'] = new_df['window_cluster_id'].map(responses)
     return new_df
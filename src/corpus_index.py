@@ -0,0 +1,409 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from multiprocessing import Pool, cpu_count
+from functools import partial
+from file_ranges import is_jsonl_file, is_compressed, split_file_ranges, iter_range_lines
+from jsonl_decoding import JsonlDecoder, DecodeErrorLog, MalformedLineError
+from pattern_sets import compile_pattern_set
+from latex_cleaning import remove_latex_commands_fused
+from keyword_matcher import fold_case
+from output_sink import write_table, sink_format_for
+from shard_writer import file_fingerprint
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+INDEX_MANIFEST_FILENAME = "index_manifest.json"
+# Index segments are built in memory, so ranges are kept smaller than for plain scanning
+DEFAULT_INDEX_CHUNK_BYTES = 64 * 1024 * 1024
+# Substring lookups for shorter pieces match most of the vocabulary, so they are not used to narrow candidates
+MIN_PARTIAL_TOKEN_LENGTH = 3
+
+_TOKEN = re.compile(r'\w+')
+_NON_WORD = re.compile(r'\W+')
+
+def _index_range(file_range, segment_name, index_folder_path, remove_latex, json_backend):
+    """
+    Build the token postings for one line-aligned byte range and write them as one index segment.
+    """
+    file_path, start, end = file_range
+    # Taken before reading, so a shard changed during the build is caught as stale by the next query
+    fingerprint = file_fingerprint(file_path)
+    decoder = JsonlDecoder([], backend=json_backend)
+    error_log = DecodeErrorLog(f"{file_path} (bytes {start}-{end})")
+    postings = defaultdict(list)
+    offsets = []
+    lengths = []
+    total_texts = 0
+    position = start
+
+    for line in iter_range_lines(file_path, start, end, binary=True):
+        line_offset = position
+        position += len(line)
+        total_texts += 1
+        try:
+            text, _ = decoder.decode(line)
+        except MalformedLineError as e:
+            error_log.record(f"line {total_texts}", line, e)
+            continue
+        if text is None:
+            continue
+        if remove_latex:
+            text = remove_latex_commands_fused(text)
+        doc_id = len(offsets)
+        offsets.append(line_offset)
+        lengths.append(len(line))
+        # Folded like re.IGNORECASE compares, so 'PRİORİTY' is indexed as the token 'priority'
+        for token in set(_TOKEN.findall(fold_case(text))):
+            postings[token].append(doc_id)
+    error_log.close()
+
+    vocabulary = sorted(postings)
+    postings_starts = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    postings_starts[1:] = np.cumsum([len(postings[token]) for token in vocabulary])
+    all_postings = np.fromiter((doc_id for token in vocabulary for doc_id in postings[token]), dtype=np.uint32, count=int(postings_starts[-1]))
+
+    segment_path = os.path.join(index_folder_path, segment_name)
+    os.makedirs(segment_path, exist_ok=True)
+    with open(os.path.join(segment_path, "vocabulary.json"), 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+    np.save(os.path.join(segment_path, "postings.npy"), all_postings)
+    np.save(os.path.join(segment_path, "postings_starts.npy"), postings_starts)
+    np.save(os.path.join(segment_path, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(segment_path, "lengths.npy"), np.array(lengths, dtype=np.int64))
+
+    return {
+        'segment': segment_name,
+        'source': file_path,
+        'start': start,
+        'end': end,
+        'docs': len(offsets),
+        'total_texts': total_texts,
+        **fingerprint,
+    }
+
+def build_corpus_index(input_folder_path, index_folder_path, remove_latex=True, num_processes=None, chunk_bytes=DEFAULT_INDEX_CHUNK_BYTES, json_backend=None):
+    """
+    Build a persistent token postings index over all JSONL shards in a folder.
+
+    Every document is LaTeX-cleaned like in jsonl_folder_filtering, split into lowercase word tokens,
+    and each token points to the documents containing it. Documents are stored as byte offsets back
+    into the shards, so query_corpus_index only has to read and verify the candidate documents. The
+    manifest records each shard's size and modification time, and queries reject the index once a
+    shard has changed, since its offsets would no longer point at the indexed documents.
+
+    Parameters:
+        input_folder_path (str): The folder with the .jsonl, .jsonl.gz or .jsonl.zst shards.
+        index_folder_path (str): The folder to write the index to.
+        remove_latex (bool): Whether to index the LaTeX-cleaned text. Queries must use the same setting.
+        num_processes (int): The number of worker processes, defaults to the number of cores.
+        chunk_bytes (int): The size of the byte ranges that become one index segment each.
+        json_backend (str): The JSON decoder backend, see jsonl_decoding.JsonlDecoder.
+
+    Returns:
+        pd.DataFrame: One row per index segment.
+    """
+    if num_processes is None:
+        num_processes = cpu_count()
+    os.makedirs(index_folder_path, exist_ok=True)
+
+    file_paths = [os.path.join(input_folder_path, file_name) for file_name in os.listdir(input_folder_path) if is_jsonl_file(file_name)]
+    file_ranges = [file_range for file_path in file_paths for file_range in split_file_ranges(file_path, chunk_bytes)]
+    segment_names = [f"segment_{index:05d}" for index in range(len(file_ranges))]
+
+    index_partial = partial(_index_range, index_folder_path=index_folder_path, remove_latex=remove_latex, json_backend=json_backend)
+    with Pool(num_processes) as p:
+        segments = p.starmap(index_partial, zip(file_ranges, segment_names))
+
+    manifest = {
+        'remove_latex': remove_latex,
+        'case_folding': 'fold_case',
+        'total_texts': sum(segment['total_texts'] for segment in segments),
+        'segments': segments,
+    }
+    with open(os.path.join(index_folder_path, INDEX_MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return pd.DataFrame(segments)
+
+def _is_boundary(op, av):
+    """
+    Check whether a zero-width regex item guarantees a non-word character (or the text edge) next to it.
+    """
+    if op == sre_constants.AT:
+        return av in (sre_constants.AT_BOUNDARY, sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING, sre_constants.AT_END, sre_constants.AT_END_STRING)
+    if op == sre_constants.ASSERT:
+        items = list(av[1])
+        if len(items) != 1:
+            return False
+        item_op, item_av = items[0]
+        if item_op == sre_constants.IN:
+            return list(item_av) == [(sre_constants.CATEGORY, sre_constants.CATEGORY_NOT_WORD)]
+        if item_op == sre_constants.BRANCH:
+            return all(len(branch) == 1 and _is_boundary_or_not_word(*list(branch)[0]) for branch in item_av[1])
+        return _is_boundary(item_op, item_av)
+    if op == sre_constants.BRANCH:
+        return all(len(branch) == 1 and _is_boundary(*list(branch)[0]) for branch in av[1])
+    return False
+
+def _is_boundary_or_not_word(op, av):
+    if op == sre_constants.IN:
+        return list(av) == [(sre_constants.CATEGORY, sre_constants.CATEGORY_NOT_WORD)]
+    return _is_boundary(op, av)
+
+def _is_zero_width(op):
+    return op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+
+def _literal_requirement(literal, left_bounded, right_bounded):
+    """
+    Turn a literal that must occur in the text into a plan over tokens.
+    """
+    pieces = _NON_WORD.split(fold_case(literal))
+    requirements = []
+    for index, piece in enumerate(pieces):
+        if not piece:
+            continue
+        starts_token = index > 0 or left_bounded
+        ends_token = index < len(pieces) - 1 or right_bounded
+        if starts_token and ends_token:
+            requirements.append(('token', 'exact', piece))
+        elif len(piece) >= MIN_PARTIAL_TOKEN_LENGTH:
+            mode = 'prefix' if starts_token else 'suffix' if ends_token else 'contains'
+            requirements.append(('token', mode, piece))
+    return ('and', requirements)
+
+def _sequence_requirement(items, left_bounded, right_bounded):
+    items = list(items)
+    requirements = []
+    run = []
+    run_left = left_bounded
+    next_left = left_bounded
+
+    def finish_run(run_right):
+        if run:
+            requirements.append(_literal_requirement(''.join(run), run_left, run_right))
+            run.clear()
+
+    for index, (op, av) in enumerate(items):
+        if op == sre_constants.LITERAL:
+            if not run:
+                run_left = next_left
+            run.append(chr(av))
+            next_left = False
+            continue
+        if _is_boundary(op, av):
+            finish_run(True)
+            next_left = True
+            continue
+        if _is_zero_width(op):
+            continue
+
+        # A literal run followed by an alternation is distributed over its branches, because the regex
+        # parser factors common prefixes out of alternations, e.g. 'AUC|AUROC' becomes 'AU(?:C|ROC)'
+        following_right = index == len(items) - 1 and right_bounded or index + 1 < len(items) and _is_boundary(*items[index + 1])
+        if op == sre_constants.BRANCH and run:
+            prefix = [(sre_constants.LITERAL, ord(ch)) for ch in run]
+            run.clear()
+            branches = [_sequence_requirement(prefix + list(branch), run_left, following_right) for branch in av[1]]
+            requirements.append(('or', branches))
+        else:
+            finish_run(False)
+            requirements.append(_item_requirement(op, av, next_left, following_right))
+        next_left = False
+
+    finish_run(right_bounded)
+    return ('and', requirements)
+
+def _item_requirement(op, av, left_bounded, right_bounded):
+    if op == sre_constants.SUBPATTERN:
+        return _sequence_requirement(av[-1], left_bounded, right_bounded)
+    if op == getattr(sre_constants, 'ATOMIC_GROUP', None):
+        return _sequence_requirement(av, left_bounded, right_bounded)
+    if op == sre_constants.BRANCH:
+        return ('or', [_sequence_requirement(branch, left_bounded, right_bounded) for branch in av[1]])
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, 'POSSESSIVE_REPEAT', None)):
+        min_count, max_count, body = av
+        if min_count == 0:
+            return ('all',)
+        if min_count == max_count == 1:
+            return _sequence_requirement(body, left_bounded, right_bounded)
+        return _sequence_requirement(body, False, False)
+    return ('all',)
+
+def regex_requirement(pattern):
+    """
+    Derive a plan of tokens that every text matched by a regex must contain.
+
+    Parameters:
+        pattern (re.Pattern): The compiled regex.
+
+    Returns:
+        tuple: A tree of ('and', [...]), ('or', [...]), ('token', mode, token) and ('all',) nodes,
+        where mode is 'exact', 'prefix', 'suffix' or 'contains' and ('all',) means no restriction.
+    """
+    return _sequence_requirement(sre_parse.parse(pattern.pattern, pattern.flags), False, False)
+
+class _Segment:
+    def __init__(self, index_folder_path, entry):
+        segment_path = os.path.join(index_folder_path, entry['segment'])
+        self.entry = entry
+        with open(os.path.join(segment_path, "vocabulary.json"), encoding='utf-8') as f:
+            self.vocabulary = json.load(f)
+        self.token_ids = {token: token_id for token_id, token in enumerate(self.vocabulary)}
+        self.postings = np.load(os.path.join(segment_path, "postings.npy"), mmap_mode='r')
+        self.postings_starts = np.load(os.path.join(segment_path, "postings_starts.npy"))
+        self.offsets = np.load(os.path.join(segment_path, "offsets.npy"))
+        self.lengths = np.load(os.path.join(segment_path, "lengths.npy"))
+
+    def _token_docs(self, token_id):
+        return np.asarray(self.postings[self.postings_starts[token_id]:self.postings_starts[token_id + 1]])
+
+    def _matching_token_ids(self, mode, token):
+        if mode == 'exact':
+            token_id = self.token_ids.get(token)
+            return [] if token_id is None else [token_id]
+        if mode == 'prefix':
+            return [token_id for token_id, candidate in enumerate(self.vocabulary) if candidate.startswith(token)]
+        if mode == 'suffix':
+            return [token_id for token_id, candidate in enumerate(self.vocabulary) if candidate.endswith(token)]
+        return [token_id for token_id, candidate in enumerate(self.vocabulary) if token in candidate]
+
+    def candidates(self, requirement):
+        """
+        Evaluate a requirement plan to a sorted array of document ids, or None for all documents.
+        """
+        kind = requirement[0]
+        if kind == 'all':
+            return None
+        if kind == 'token':
+            token_ids = self._matching_token_ids(requirement[1], requirement[2])
+            if not token_ids:
+                return np.array([], dtype=np.uint32)
+            return np.unique(np.concatenate([self._token_docs(token_id) for token_id in token_ids]))
+        children = [self.candidates(child) for child in requirement[1]]
+        if kind == 'and':
+            result = None
+            for child in children:
+                if child is not None:
+                    result = child if result is None else np.intersect1d(result, child, assume_unique=True)
+            return result
+        if any(child is None for child in children):
+            return None
+        return np.unique(np.concatenate(children)) if children else np.array([], dtype=np.uint32)
+
+def _iter_segment_lines(segment, doc_ids):
+    """
+    Yield the raw lines of the given documents of a segment, in document order.
+    """
+    file_path = segment.entry['source']
+    if not is_compressed(file_path):
+        with open(file_path, 'rb') as file:
+            for doc_id in doc_ids:
+                file.seek(segment.offsets[doc_id])
+                yield file.read(segment.lengths[doc_id])
+        return
+    # Compressed shards cannot seek, so they are streamed once and the wanted offsets picked out
+    wanted = iter(segment.offsets[doc_ids])
+    next_offset = next(wanted, None)
+    position = 0
+    for line in iter_range_lines(file_path, binary=True):
+        if next_offset is None:
+            break
+        if position == next_offset:
+            yield line
+            next_offset = next(wanted, None)
+        position += len(line)
+
+def query_corpus_index(index_folder_path, auroc_regex, auprc_regex, metadata_keys=[], output_folder_path=None, remove_latex=True, save_file=True, filename="filtered_data.csv", total_texts_filename="total_texts.txt", json_backend=None, error_log_path=None):
+    """
+    Answer a jsonl_folder_filtering query from a corpus index instead of rescanning every shard.
+
+    Candidate documents are looked up in the index and only those are read, LaTeX-cleaned and checked
+    with the regexes, so the result is the same DataFrame a full scan produces.
+
+    Parameters:
+        index_folder_path (str): The folder written by build_corpus_index.
+        auroc_regex: A compiled regex, a list of compiled regexes or a list of keywords for AUROC.
+        auprc_regex: The same for AUPRC.
+        metadata_keys (List[str]): The metadata keys to include as columns.
+        output_folder_path (str): The folder to save the result to.
+        remove_latex (bool): Must match the setting the index was built with.
+        save_file (bool): Whether to save the result and the total number of texts.
+        filename (str): The file name for the result, written as CSV, JSONL or Parquet by its extension.
+        total_texts_filename (str): The file name for the total number of texts.
+        json_backend (str): The JSON decoder backend, see jsonl_decoding.JsonlDecoder.
+        error_log_path (str): The file to append samples of malformed lines to, printed if None.
+
+    Returns:
+        pd.DataFrame: The matching texts, like jsonl_folder_filtering.
+
+    Raises:
+        ValueError: If a shard changed since the index was built, the index records no fingerprints,
+        or it was built before tokens were case-folded with keyword_matcher.fold_case.
+    """
+    # Fail on an unknown output format before the query, not after it
+    if save_file:
+        sink_format_for(filename)
+    with open(os.path.join(index_folder_path, INDEX_MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)
+    if manifest['remove_latex'] != remove_latex:
+        raise ValueError(f"The index was built with remove_latex={manifest['remove_latex']}, but the query uses remove_latex={remove_latex}.")
+    if manifest.get('case_folding') != 'fold_case':
+        raise ValueError("The index was built with str.lower tokens, which can miss case-insensitive matches, rebuild it with build_corpus_index.")
+    # Like the resumable scan manifest, a shard with another size or modification time is stale
+    for entry in manifest['segments']:
+        fingerprint = file_fingerprint(entry['source']) if os.path.exists(entry['source']) else None
+        if fingerprint is None or entry.get('size') != fingerprint['size'] or entry.get('mtime') != fingerprint['mtime']:
+            raise ValueError(f"{entry['source']} changed since the index was built, rebuild it with build_corpus_index.")
+
+    auroc_patterns = compile_pattern_set(auroc_regex)
+    auprc_patterns = compile_pattern_set(auprc_regex)
+    requirement = ('or', [regex_requirement(pattern) for pattern in auroc_patterns + auprc_patterns])
+    decoder = JsonlDecoder(metadata_keys, backend=json_backend)
+
+    output_data = []
+    for entry in manifest['segments']:
+        segment = _Segment(index_folder_path, entry)
+        doc_ids = segment.candidates(requirement)
+        if doc_ids is None:
+            doc_ids = np.arange(entry['docs'])
+        error_log = DecodeErrorLog(f"{entry['source']} (bytes {entry['start']}-{entry['end']})", error_log_path)
+        for doc_id, line in zip(doc_ids, _iter_segment_lines(segment, doc_ids)):
+            try:
+                text, meta_data = decoder.decode(line)
+            except MalformedLineError as e:
+                error_log.record(f"document {doc_id}", line, e)
+                continue
+            if remove_latex:
+                text = remove_latex_commands_fused(text)
+            contains_auroc = any(pattern.search(text) is not None for pattern in auroc_patterns)
+            contains_auprc = any(pattern.search(text) is not None for pattern in auprc_patterns)
+            if contains_auroc or contains_auprc:
+                row_data = {key: meta_data.get(key, None) for key in metadata_keys}
+                row_data['text'] = text
+                row_data['contains_auroc'] = contains_auroc
+                row_data['contains_auprc'] = contains_auprc
+                output_data.append(row_data)
+        error_log.close()
+
+    keyword_columns = ['contains_auroc', 'contains_auprc']
+    column_order = ['text', 'text_id'] + metadata_keys + keyword_columns
+    df_output = pd.DataFrame(output_data, columns=['text'] + metadata_keys + keyword_columns)
+    df_output['text_id'] = pd.factorize(df_output['text'])[0]
+    df_output = df_output[column_order]
+
+    if save_file and output_folder_path is not None:
+        os.makedirs(output_folder_path, exist_ok=True)
+        with open(os.path.join(output_folder_path, total_texts_filename), 'w') as f:
+            f.write(str(manifest['total_texts']))
+        write_table(df_output, os.path.join(output_folder_path, filename))
+    elif save_file:
+        print("Warning: Output folder path is not provided. The DataFrame is not saved to a file.")
+
+    return df_output
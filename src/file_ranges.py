@@ -0,0 +1,114 @@
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+# Compressed shards are read through a large buffer so decompression works on big blocks
+DEFAULT_READ_BUFFER_BYTES = 4 * 1024 * 1024
+JSONL_EXTENSIONS = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+
+def is_jsonl_file(file_name):
+    """
+    Check whether a file is a plain, gzip- or zstd-compressed JSONL shard.
+    """
+    return file_name.endswith(JSONL_EXTENSIONS)
+
+def is_compressed(file_path):
+    return file_path.endswith(COMPRESSED_EXTENSIONS)
+
+def strip_jsonl_extension(file_name):
+    """
+    Remove the .jsonl, .jsonl.gz or .jsonl.zst extension from a file name.
+    """
+    for extension in JSONL_EXTENSIONS:
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+    return file_name
+
+def open_shard(file_path, buffer_size=DEFAULT_READ_BUFFER_BYTES):
+    """
+    Open a JSONL shard for binary reading, decompressing gzip and zstd shards on the fly.
+
+    Parameters:
+        file_path (str): The shard to open.
+        buffer_size (int): The read buffer size in bytes.
+
+    Returns:
+        A binary file object that can be iterated line by line.
+    """
+    if file_path.endswith(".gz"):
+        return io.BufferedReader(gzip.GzipFile(fileobj=open(file_path, 'rb', buffering=buffer_size)), buffer_size=buffer_size)
+    if file_path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"Reading {file_path} requires the zstandard package.")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb', buffering=buffer_size), read_size=buffer_size, closefd=True)
+        return io.BufferedReader(reader, buffer_size=buffer_size)
+    return open(file_path, 'rb', buffering=buffer_size)
+
+def split_file_ranges(file_path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Split a JSONL file into line-aligned byte ranges of roughly chunk_bytes each.
+
+    Parameters:
+        file_path (str): The JSONL file to split.
+        chunk_bytes (int): The target size of each range in bytes, or None to keep the file whole.
+
+    Returns:
+        List[Tuple[str, int, int]]: (file_path, start, end) tuples. Every range starts at the
+        beginning of a line, and together the ranges cover the whole file exactly once.
+        A compressed file cannot be split and is returned as a single range (file_path, 0, None).
+    """
+    if is_compressed(file_path):
+        return [(file_path, 0, None)]
+    file_size = os.path.getsize(file_path)
+    if chunk_bytes is None:
+        return [(file_path, 0, file_size)]
+    boundaries = [0]
+    with open(file_path, 'rb') as file:
+        position = chunk_bytes
+        while position < file_size:
+            # Move to the start of the first line beginning at or after position
+            file.seek(position - 1)
+            file.readline()
+            position = file.tell()
+            if position >= file_size:
+                break
+            boundaries.append(position)
+            position += chunk_bytes
+    boundaries.append(file_size)
+    return [(file_path, start, end) for start, end in zip(boundaries, boundaries[1:])]
+
+def iter_range_lines(file_path, start=0, end=None, binary=False):
+    """
+    Yield the lines that start inside the byte range [start, end) of a file.
+
+    Parameters:
+        file_path (str): The JSONL file to read.
+        start (int): The byte offset of the first line, must be the start of a line.
+        end (int): The byte offset where the range ends, or None for the end of the file.
+        binary (bool): Yield raw bytes instead of lines decoded as UTF-8.
+
+    Compressed files are streamed from the start, so start must be 0 and end None for them.
+    """
+    if is_compressed(file_path):
+        if start != 0 or end is not None:
+            raise ValueError(f"Compressed file {file_path} can only be read as a whole.")
+        with open_shard(file_path) as file:
+            for line in file:
+                yield line if binary else line.decode('utf-8')
+        return
+
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        position = start
+        for line in file:
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            yield line if binary else line.decode('utf-8')
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from retry_after import retry_after_seconds
+
+# Statuses worth retrying: rate limits, timeouts and server errors
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+class HTTPCache:
+    """
+    An on-disk cache of GET responses for conditional requests. A response with an ETag or
+    Last-Modified header is stored as a body file and a small JSON file of its validators, and the
+    next request for the URL sends If-None-Match / If-Modified-Since, so an unchanged resource comes
+    back as an empty 304 and is read from disk.
+    """
+    def __init__(self, cache_folder_path):
+        self.cache_folder_path = cache_folder_path
+        os.makedirs(cache_folder_path, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_folder_path, key + ".json"), os.path.join(self.cache_folder_path, key + ".body")
+
+    def _entry(self, url):
+        entry_path, _ = self._paths(url)
+        try:
+            with open(entry_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def conditional_headers(self, url):
+        """
+        The validator headers for a request to url, empty if nothing is cached.
+        """
+        entry = self._entry(url)
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, response):
+        """
+        Store a 200 response that has validators. The body is written before the entry, each through
+        a temporary file, so a crash never leaves an entry without its body.
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        entry_path, body_path = self._paths(url)
+        with open(body_path + ".tmp", 'wb') as f:
+            f.write(response.content)
+        os.replace(body_path + ".tmp", body_path)
+        entry = {'url': url, 'etag': etag, 'last_modified': last_modified, 'headers': dict(response.headers)}
+        with open(entry_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(entry_path + ".tmp", entry_path)
+
+    def cached_response(self, url):
+        """
+        Rebuild the stored response for url, as a 200 requests.Response, or None if it is not cached.
+        """
+        entry = self._entry(url)
+        if entry is None:
+            return None
+        _, body_path = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = content
+        response.headers.update(entry['headers'])
+        response.from_cache = True
+        return response
+
+class _HostRateLimiter:
+    """
+    Spaces the requests to one host at least 1 / requests_per_second apart, across all threads.
+    """
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        """
+        Hold back all requests to the host for seconds, e.g. after a Retry-After header.
+        """
+        with self._lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+class ConcurrentFetcher:
+    """
+    Fetch many URLs concurrently from a thread pool, with keep-alive sessions that are reused by each thread.
+
+    At most max_per_host requests run against one host at once, and requests to a host are spaced
+    to stay under requests_per_second. Connection errors, timeouts, 429 and 5xx responses are retried
+    with exponential backoff, or after the server's Retry-After delay if it sends one. With an
+    HTTPCache, requests are conditional and unchanged resources are read from the cache.
+    """
+    def __init__(self, max_workers=16, max_per_host=8, requests_per_second=10.0, max_retries=5, initial_retry_delay=1.0, max_retry_delay=60, timeout=30, headers=None, cache=None):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.initial_retry_delay = initial_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.cache = cache
+        self.stats = {'requests': 0, 'retries': 0, 'failed': 0, 'not_modified': 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._host_limiters = {}
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_per_host)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+                self._host_limiters[host] = _HostRateLimiter(self.requests_per_second)
+            return self._host_slots[host], self._host_limiters[host]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, url, headers=None):
+        """
+        GET a URL, retrying transient failures.
+
+        Returns:
+            requests.Response: The last response, which may still be an error status, or None if the
+            host could not be reached.
+        """
+        slots, limiter = self._host(url)
+        request_headers = headers
+        if self.cache is not None:
+            request_headers = {**self.cache.conditional_headers(url), **(headers or {})}
+        retry_delay = self.initial_retry_delay
+        attempt = 0
+        while True:
+            limiter.wait()
+            self._count('requests')
+            try:
+                with slots:
+                    response = self._session().get(url, headers=request_headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt == self.max_retries - 1:
+                    print(error)
+                    self._count('failed')
+                    return None
+                delay = None
+            else:
+                if self.cache is not None and response.status_code == 304:
+                    cached = self.cache.cached_response(url)
+                    if cached is not None:
+                        self._count('not_modified')
+                        return cached
+                    if request_headers is not headers:
+                        # The cached body is gone, so ask again without validators, which does not use up an attempt
+                        request_headers = headers
+                        continue
+                    # A 304 to a request without validators cannot be resolved, so it is returned as is
+                    return response
+                if self.cache is not None and response.status_code == 200:
+                    self.cache.store(url, response)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries - 1:
+                    if response.status_code in RETRYABLE_STATUS_CODES:
+                        self._count('failed')
+                    return response
+                delay = retry_after_seconds(requests.HTTPError(response=response))
+                if delay is not None:
+                    limiter.pause(delay)
+            self._count('retries')
+            time.sleep(delay if delay is not None else retry_delay)
+            retry_delay = min(retry_delay * 2, self.max_retry_delay)
+            attempt += 1
+
+    def map(self, urls, headers=None):
+        """
+        GET all URLs concurrently.
+
+        Yields:
+            Tuple[str, requests.Response]: Each URL with its response (see get), in order of completion.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.get, url, headers): url for url in urls}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
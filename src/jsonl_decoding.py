@@ -0,0 +1,132 @@
+import json
+from typing import Any, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class MalformedLineError(ValueError):
+    """
+    Raised when a JSONL line cannot be decoded into a text and its metadata.
+    """
+
+def default_backend():
+    """
+    Return the fastest installed JSON backend: 'msgspec', 'orjson' or the stdlib 'json'.
+    """
+    if msgspec is not None:
+        return "msgspec"
+    if orjson is not None:
+        return "orjson"
+    return "json"
+
+class JsonlDecoder:
+    """
+    Decode RedPajama-style JSONL lines, keeping only the text and the requested metadata keys.
+
+    Lines are decoded from bytes. With msgspec only the requested fields are materialized,
+    the other backends parse the full line and then pick the fields.
+    """
+    def __init__(self, metadata_keys, backend=None):
+        if backend is None:
+            backend = default_backend()
+        if backend not in ("json", "orjson", "msgspec"):
+            raise ValueError(f"Unknown JSON backend: {backend}. Use 'json', 'orjson' or 'msgspec'.")
+        if backend == "orjson" and orjson is None:
+            raise ImportError("The 'orjson' backend requires the orjson package.")
+        if backend == "msgspec" and msgspec is None:
+            raise ImportError("The 'msgspec' backend requires the msgspec package.")
+        self.metadata_keys = list(metadata_keys)
+        self.backend = backend
+
+        if backend == "msgspec":
+            # Metadata keys need not be valid identifiers, so the struct fields are renamed
+            meta_fields = [(f"field_{index}", Any, msgspec.field(default=None, name=key)) for index, key in enumerate(self.metadata_keys)]
+            meta_type = msgspec.defstruct("Meta", meta_fields)
+            entry_type = msgspec.defstruct("Entry", [("text", Optional[str]), ("meta", Optional[meta_type], None)])
+            self._meta_attributes = [name for name, _, _ in meta_fields]
+            self._decoder = msgspec.json.Decoder(entry_type)
+
+    def decode(self, line):
+        """
+        Decode one line into (text, metadata), where metadata holds exactly the requested keys.
+
+        A line the fast backends reject is decoded again with json.loads, so the same lines count as
+        malformed whichever packages are installed. msgspec and orjson reject lone surrogate escapes
+        such as "\\ud800", which json.loads accepts.
+
+        Parameters:
+            line (bytes): The raw JSONL line.
+
+        Returns:
+            Tuple[str, dict]: The text and the requested metadata, missing keys set to None.
+
+        Raises:
+            MalformedLineError: If the line is not valid JSON or has no 'text' field.
+        """
+        if self.backend == "msgspec":
+            try:
+                entry = self._decoder.decode(line)
+            except msgspec.MsgspecError:
+                return self._decode_entry(line, json.loads)
+            if entry.meta is None:
+                return entry.text, {key: None for key in self.metadata_keys}
+            return entry.text, {key: getattr(entry.meta, attribute) for key, attribute in zip(self.metadata_keys, self._meta_attributes)}
+        if self.backend == "orjson":
+            try:
+                return self._decode_entry(line, orjson.loads)
+            except MalformedLineError:
+                return self._decode_entry(line, json.loads)
+        return self._decode_entry(line, json.loads)
+
+    def _decode_entry(self, line, loads):
+        try:
+            entry = loads(line)
+        except ValueError as e:
+            # Covers JSON syntax errors as well as invalid UTF-8
+            raise MalformedLineError(str(e)) from e
+        if not isinstance(entry, dict) or 'text' not in entry:
+            raise MalformedLineError("Line is not a JSON object with a 'text' field.")
+        meta_data = entry.get('meta') or {}
+        if not isinstance(meta_data, dict):
+            raise MalformedLineError("The 'meta' field is not a JSON object.")
+        return entry['text'], {key: meta_data.get(key, None) for key in self.metadata_keys}
+
+class DecodeErrorLog:
+    """
+    Count malformed lines and keep a few truncated samples instead of printing every bad line.
+
+    At close a one-line summary with the samples is appended to error_log_path, or printed
+    if no path is given.
+    """
+    def __init__(self, file_path, error_log_path=None, max_samples=5, max_sample_chars=200):
+        self.file_path = file_path
+        self.error_log_path = error_log_path
+        self.max_samples = max_samples
+        self.max_sample_chars = max_sample_chars
+        self.count = 0
+        self.samples = []
+
+    def record(self, location, line, error):
+        self.count += 1
+        if len(self.samples) < self.max_samples:
+            sample = line[:self.max_sample_chars]
+            if isinstance(sample, bytes):
+                sample = sample.decode('utf-8', errors='replace')
+            self.samples.append(f"{location}: {error} | {sample!r}")
+
+    def close(self):
+        if self.count == 0:
+            return
+        summary = f"{self.count} malformed lines in {self.file_path}, first {len(self.samples)}:\n" + ''.join(f"    {sample}\n" for sample in self.samples)
+        if self.error_log_path is None:
+            print(summary, end='')
+        else:
+            with open(self.error_log_path, 'a', encoding='utf-8') as f:
+                f.write(summary)
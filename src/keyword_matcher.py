@@ -0,0 +1,186 @@
+import re
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Characters that re.IGNORECASE treats as equal to an ASCII letter but whose str.lower() differs
+_CASE_FIXES = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's'})
+
+def create_keyword_pattern(keywords):
+    """
+    Create a regex pattern for keyword matching.
+    """
+    pattern = r'(?:(?<=\W)|(?<=^))(' + '|'.join(map(re.escape, keywords)) + r')(?=\W|$)'
+    return re.compile(pattern, re.IGNORECASE)
+
+def fold_case(text):
+    """
+    Lowercase a text the way re.IGNORECASE compares it, keeping every character at the same offset.
+    """
+    if not text.isascii():
+        text = text.translate(_CASE_FIXES)
+    return text.lower()
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+class RegexKeywordMatcher:
+    """
+    Reference engine: one create_keyword_pattern regex per keyword set, each searched separately.
+    """
+    def __init__(self, keyword_sets):
+        self.names = list(keyword_sets)
+        self.patterns = {name: create_keyword_pattern(keywords) for name, keywords in keyword_sets.items()}
+
+    def match(self, text):
+        """
+        Return the set of keyword set names with at least one match in the text.
+        """
+        return {name for name, pattern in self.patterns.items() if pattern.search(text) is not None}
+
+class AhoCorasickKeywordMatcher:
+    """
+    Find every keyword set in a single linear pass over the case-folded text.
+
+    A match counts only if it is preceded by a non-word character or the start of the text and
+    followed by a non-word character or the end of the text, like create_keyword_pattern.
+    Uses the pyahocorasick C extension when it is installed and a pure Python automaton otherwise.
+    """
+    def __init__(self, keyword_sets, backend=None):
+        if backend is None:
+            backend = "pyahocorasick" if ahocorasick is not None else "python"
+        if backend not in ("pyahocorasick", "python"):
+            raise ValueError(f"Unknown Aho-Corasick backend: {backend}. Use 'pyahocorasick' or 'python'.")
+        self.names = list(keyword_sets)
+        self.backend = backend
+
+        # Group the set names by folded keyword, so a keyword shared by several sets is stored once
+        keyword_to_names = {}
+        for name, keywords in keyword_sets.items():
+            for keyword in keywords:
+                if not keyword:
+                    raise ValueError(f"Empty keyword in keyword set '{name}'.")
+                keyword_to_names.setdefault(fold_case(keyword), set()).add(name)
+        self._keywords = {keyword: frozenset(names) for keyword, names in keyword_to_names.items()}
+
+        if backend == "pyahocorasick":
+            self._automaton = ahocorasick.Automaton()
+            for keyword, names in self._keywords.items():
+                self._automaton.add_word(keyword, (len(keyword), names))
+            self._automaton.make_automaton()
+        else:
+            self._build_python_automaton()
+
+    def _build_python_automaton(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword, names in self._keywords.items():
+            node = 0
+            for ch in keyword:
+                next_node = self._goto[node].get(ch)
+                if next_node is None:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    next_node = len(self._goto) - 1
+                    self._goto[node][ch] = next_node
+                node = next_node
+            self._output[node].append((len(keyword), names))
+
+        # Breadth-first pass to set the failure links and merge the outputs of suffixes
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_child = self._goto[fail].get(ch, 0)
+                self._fail[child] = fail_child if fail_child != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _iter_hits(self, folded):
+        if self.backend == "pyahocorasick":
+            yield from self._automaton.iter(folded)
+            return
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for end, ch in enumerate(folded):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for hit in output[node]:
+                yield end, hit
+
+    def iter_matches(self, text):
+        """
+        Yield (start, end, keyword set names) for every keyword occurrence with word boundaries on both sides.
+        Overlapping occurrences are all reported.
+        """
+        folded = fold_case(text)
+        text_length = len(text)
+        for last, (length, names) in self._iter_hits(folded):
+            start = last - length + 1
+            end = last + 1
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < text_length and _is_word_char(text[end]):
+                continue
+            yield start, end, names
+
+    def match(self, text):
+        """
+        Return the set of keyword set names with at least one match in the text.
+        """
+        matched = set()
+        for _, _, names in self.iter_matches(text):
+            matched |= names
+            if len(matched) == len(self.names):
+                break
+        return matched
+
+def create_keyword_matcher(keyword_sets, engine="regex", backend=None):
+    """
+    Create a matcher that reports which of several named keyword sets occur in a text.
+
+    Parameters:
+        keyword_sets (Dict[str, List[str]]): Keyword lists by set name, e.g. {'auroc': [...], 'auprc': [...]}.
+        engine (str): 'regex' for the reference create_keyword_pattern regexes, or 'aho_corasick'.
+        backend (str): Aho-Corasick backend, 'pyahocorasick' or 'python'. Defaults to the fastest available.
+
+    Returns:
+        A matcher whose match(text) method returns the set of matching set names.
+    """
+    if engine == "regex":
+        return RegexKeywordMatcher(keyword_sets)
+    if engine == "aho_corasick":
+        return AhoCorasickKeywordMatcher(keyword_sets, backend=backend)
+    raise ValueError(f"Unknown matching engine: {engine}. Use 'regex' or 'aho_corasick'.")
+
+def differential_check(keyword_sets, texts, engine="aho_corasick", backend=None):
+    """
+    Compare a matching engine against the reference regexes on a sample corpus.
+
+    Parameters:
+        keyword_sets (Dict[str, List[str]]): Keyword lists by set name.
+        texts (Iterable[str]): The sample texts.
+        engine (str): The engine to compare against the regex reference.
+        backend (str): Aho-Corasick backend, passed on to create_keyword_matcher.
+
+    Returns:
+        List[Tuple[int, Set[str], Set[str]]]: (text index, regex result, engine result) for every disagreement.
+    """
+    reference = RegexKeywordMatcher(keyword_sets)
+    candidate = create_keyword_matcher(keyword_sets, engine=engine, backend=backend)
+    mismatches = []
+    for index, text in enumerate(texts):
+        expected = reference.match(text)
+        found = candidate.match(text)
+        if expected != found:
+            mismatches.append((index, expected, found))
+    return mismatches
@@ -0,0 +1,68 @@
+import re
+
+# Escaped and literal newlines, carriage returns and tabs become spaces, like the first substitution
+# of the reference cleaner. None of these replacements can overlap, so plain str.replace is enough.
+_WHITESPACE = ('\\n', '\\r', '\\t', '\n', '\r', '\t')
+# A LaTeX command: a backslash and the whole run of letters after it
+_COMMAND = r'\\[a-zA-Z]+(?![a-zA-Z])'
+# A backslash not followed by a letter removes itself and the next character that survives the
+# removal of commands
+_ESCAPE = r'\\(?![a-zA-Z])(?:' + _COMMAND + r')*(?:\\(?![a-zA-Z])|[^\\])'
+# Everything the remaining substitutions of the reference cleaner remove, in one alternation
+_LATEX_TOKEN = re.compile(
+    _COMMAND + '|' + _ESCAPE
+    + r'|\$[^$\\]*(?:(?:' + _COMMAND + '|' + _ESCAPE + r')[^$\\]*)*\$'
+)
+
+def normalize_whitespace(s):
+    """
+    Replace escaped and literal newlines, carriage returns and tabs with spaces, the first step of
+    both LaTeX cleaners. A keyword split across two lines only matches after this step.
+
+    Parameters:
+        s (str): The input string.
+
+    Returns:
+        str: The string with whitespace normalized.
+    """
+    for whitespace in _WHITESPACE:
+        s = s.replace(whitespace, ' ')
+    return s
+
+def remove_latex_commands_fused(s):
+    """
+    Remove LaTeX commands from a string with a single regex pass.
+
+    Produces the same output as remove_latex_commands in arxiv_search.py, which applies nine
+    regex substitutions one after another. Apart from the whitespace replacements, every token
+    those substitutions act on is matched by one alternation here, and the math alternative is
+    written so it cannot backtrack into itself.
+
+    Parameters:
+        s (str): The input string.
+
+    Returns:
+        str: The string with LaTeX commands removed.
+    """
+    if s is None:
+        return ''
+    s = normalize_whitespace(s)
+    s = _LATEX_TOKEN.sub('', s)
+    # Only an unpaired backslash at the very end can survive, and the reference cleaner drops it
+    # when the character before it is not a word character
+    if len(s) > 1 and s[-1] == '\\' and not (s[-2].isalnum() or s[-2] == '_'):
+        s = s[:-1]
+    return s.strip()
+
+def compare_latex_cleaners(texts, reference_cleaner):
+    """
+    Check the fused cleaner against a reference cleaner on a golden corpus.
+
+    Parameters:
+        texts (Iterable[str]): The golden corpus.
+        reference_cleaner (Callable[[str], str]): The reference, e.g. arxiv_search.remove_latex_commands.
+
+    Returns:
+        List[int]: The indices of texts where the two cleaners disagree.
+    """
+    return [index for index, text in enumerate(texts) if remove_latex_commands_fused(text) != reference_cleaner(text)]
@@ -0,0 +1,136 @@
+import json
+import os
+import pandas as pd
+from llm_cache import content_hash
+
+# The OpenAI Batch API accepts at most 50,000 requests and 200 MB per input file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+def window_custom_id(context_window):
+    """
+    The stable custom_id of a context window in batch request files, derived from its text.
+    """
+    return "window-" + content_hash(context_window)[:32]
+
+def write_batch_requests(context_windows, model, system_prompt, output_folder_path, file_prefix="batch_requests", max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES, **body_settings):
+    """
+    Write chat completion requests for context windows as OpenAI Batch API JSONL files.
+
+    Identical windows get the same custom_id and are written once. A new file is started whenever
+    the next request would exceed max_requests or max_bytes.
+
+    Parameters:
+        context_windows (Iterable[str]): The context windows.
+        model (str): The model name.
+        system_prompt (str): The system prompt.
+        output_folder_path (str): The folder to write the request files to.
+        file_prefix (str): The file name prefix, files are named <prefix>_<number>.jsonl.
+        max_requests (int): The maximum number of requests per file.
+        max_bytes (int): The maximum size of a file in bytes.
+        **body_settings: Further request body fields, e.g. temperature=0 or max_tokens=256.
+
+    Returns:
+        List[str]: The paths of the request files.
+    """
+    os.makedirs(output_folder_path, exist_ok=True)
+    file_paths = []
+    file = None
+    file_requests = 0
+    file_bytes = 0
+    written = set()
+    try:
+        for context_window in context_windows:
+            custom_id = window_custom_id(context_window)
+            if custom_id in written:
+                continue
+            written.add(custom_id)
+            request = {
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {
+                    'model': model,
+                    'messages': [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": context_window}
+                    ],
+                    **body_settings,
+                },
+            }
+            line = (json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8')
+            if len(line) > max_bytes:
+                raise ValueError(f"The request for {custom_id} alone is larger than max_bytes={max_bytes}.")
+            if file is None or file_requests >= max_requests or file_bytes + len(line) > max_bytes:
+                if file is not None:
+                    file.close()
+                file_paths.append(os.path.join(output_folder_path, f"{file_prefix}_{len(file_paths):04d}.jsonl"))
+                file = open(file_paths[-1], 'wb')
+                file_requests = 0
+                file_bytes = 0
+            file.write(line)
+            file_requests += 1
+            file_bytes += len(line)
+    finally:
+        if file is not None:
+            file.close()
+    return file_paths
+
+def _result_response(result):
+    """
+    Turn one line of a batch output or error file into the response text, or an "Error: ..." string.
+    """
+    if result.get('error'):
+        return f"Error: {result['error'].get('message', result['error'])}"
+    response = result.get('response') or {}
+    body = response.get('body') or {}
+    if response.get('status_code') != 200:
+        error = body.get('error') or {}
+        return f"Error: {response.get('status_code')} {error.get('message', '')}".rstrip()
+    try:
+        return body['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        return "Error: Malformed batch response."
+
+def read_batch_results(result_paths):
+    """
+    Read OpenAI Batch API output and error files into a table of responses.
+
+    Parameters:
+        result_paths (List[str]): The downloaded output and error JSONL files.
+
+    Returns:
+        pd.DataFrame: custom_id and gpt_response, one row per request. If a request appears more
+        than once, a successful response wins over an error.
+    """
+    custom_ids = []
+    responses = []
+    for result_path in result_paths:
+        with open(result_path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                custom_ids.append(result['custom_id'])
+                responses.append(_result_response(result))
+    results = pd.DataFrame({'custom_id': custom_ids, 'gpt_response': responses}, dtype=object)
+    results['is_error'] = results['gpt_response'].str.startswith("Error:")
+    results = results.sort_values('is_error', kind='stable').drop_duplicates('custom_id')
+    return results.drop(columns=['is_error']).reset_index(drop=True)
+
+def ingest_batch_results(new_df, result_paths):
+    """
+    Merge batch results back into a window table in one vectorized step.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        result_paths (List[str]): The downloaded output and error JSONL files.
+
+    Returns:
+        pd.DataFrame: new_df with a custom_id column and the responses in a gpt_response column.
+        Windows without a result get "Error: No batch result".
+    """
+    results = read_batch_results(result_paths).set_index('custom_id')['gpt_response']
+    new_df['custom_id'] = new_df['context_window'].map(window_custom_id)
+    new_df['gpt_response'] = new_df['custom_id'].map(results).fillna("Error: No batch result")
+    return new_df
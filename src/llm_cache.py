@@ -0,0 +1,99 @@
+import hashlib
+import sqlite3
+import time
+
+# Larger IN (...) lists are split so they stay below SQLite's variable limit
+_LOOKUP_BATCH_SIZE = 500
+
+def content_hash(text):
+    """
+    Hash a system prompt or context window for use as a cache key.
+    """
+    return hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+class ResponseCache:
+    """
+    A disk-backed cache of model responses in SQLite, keyed by model, system prompt hash and window hash.
+
+    Error responses ("Error: ...") are never stored, so failed windows are retried on the next run.
+    """
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._connection = sqlite3.connect(cache_path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "model TEXT NOT NULL, prompt_hash TEXT NOT NULL, window_hash TEXT NOT NULL, "
+            "response TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (model, prompt_hash, window_hash))"
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_many(self, model, prompt_hash, window_hashes):
+        """
+        Look up cached responses, returning a dict from window hash to response for the hits.
+        """
+        window_hashes = list(window_hashes)
+        found = {}
+        for start in range(0, len(window_hashes), _LOOKUP_BATCH_SIZE):
+            batch = window_hashes[start:start + _LOOKUP_BATCH_SIZE]
+            rows = self._connection.execute(
+                f"SELECT window_hash, response FROM responses WHERE model = ? AND prompt_hash = ? AND window_hash IN ({','.join('?' * len(batch))})",
+                [model, prompt_hash] + batch,
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, model, prompt_hash, responses):
+        """
+        Store responses given as a dict from window hash to response, skipping error responses.
+        """
+        now = time.time()
+        rows = [(model, prompt_hash, window_hash, response, now) for window_hash, response in responses.items() if isinstance(response, str) and not response.startswith("Error:")]
+        self._connection.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", rows)
+        self._connection.commit()
+        return len(rows)
+
+    def close(self):
+        self._connection.close()
+
+def cached_responses(context_windows, model, system_prompt, send, cache_path, chunk_size=500):
+    """
+    Get responses for context windows through the response cache, sending each distinct uncached
+    window only once.
+
+    Parameters:
+        context_windows (List[str]): The context windows, duplicates allowed.
+        model (str): The model name, part of the cache key.
+        system_prompt (str): The system prompt, part of the cache key.
+        send (Callable[[List[str]], List[str]]): Gets the responses for a list of distinct windows, in order.
+        cache_path (str): The SQLite cache file, created if it does not exist.
+        chunk_size (int): The number of windows sent at a time. Responses are stored after every
+            chunk, so a crashed run only loses the chunk in progress.
+
+    Returns:
+        Tuple[List[str], dict]: The responses in input order, and counts of windows, distinct windows,
+        cache hits, cache misses and newly stored responses.
+    """
+    window_hashes = [content_hash(window) for window in context_windows]
+    # Distinct windows in first-seen order
+    distinct = dict(zip(window_hashes, context_windows))
+    prompt_hash = content_hash(system_prompt)
+
+    with ResponseCache(cache_path) as cache:
+        responses = cache.get_many(model, prompt_hash, distinct)
+        misses = [window_hash for window_hash in distinct if window_hash not in responses]
+        stats = {'windows': len(context_windows), 'distinct': len(distinct), 'hits': len(responses), 'misses': len(misses), 'stored': 0}
+        for start in range(0, len(misses), chunk_size):
+            chunk = misses[start:start + chunk_size]
+            new_responses = dict(zip(chunk, send([distinct[window_hash] for window_hash in chunk])))
+            stats['stored'] += cache.put_many(model, prompt_hash, new_responses)
+            responses.update(new_responses)
+
+    print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['windows'] - stats['distinct']} duplicate windows")
+    return [responses[window_hash] for window_hash in window_hashes], stats
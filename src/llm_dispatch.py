@@ -0,0 +1,208 @@
+import asyncio
+import time
+from retry_after import retry_after_seconds
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# HTTP statuses worth retrying, the same ones the openai client retries by default
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+def estimate_tokens(text, model=None):
+    """
+    Estimate the number of tokens in a text, with tiktoken if it is installed and about 4 characters
+    per token otherwise.
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except (KeyError, TypeError):
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def is_retryable(error):
+    """
+    Check whether a failed request should be retried: rate limits, timeouts, connection and server errors.
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+class TokenBucket:
+    """
+    An asyncio token bucket that refills continuously at per_minute tokens per minute.
+
+    Callers wait in arrival order until enough tokens are available. Tokens can be returned with
+    refund, e.g. when a request used fewer tokens than were reserved for it, and a negative refund
+    puts the bucket in debt when it used more.
+    """
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # A single request larger than the bucket would wait forever, it waits for a full bucket instead
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def refund(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class LLMDispatcher:
+    """
+    Send context windows to a chat completions model from asyncio with one shared client.
+
+    At most max_in_flight requests run at once, and two token buckets keep the request rate under
+    requests_per_minute and the estimated token usage under tokens_per_minute. A rate-limited
+    request waits for the server's Retry-After delay, and all other requests pause until then as well,
+    otherwise it backs off exponentially. Failed windows get an "Error: ..." response, like
+    process_with_gpt_with_retries in claim_search_v3.py.
+
+    Pass base_url to use an OpenAI-compatible server, e.g. mock_llm_server.MockChatCompletionsServer,
+    or client to use an existing openai.AsyncOpenAI client.
+    """
+    def __init__(self, model, system_prompt, openai_api_key=None, base_url=None, client=None, max_in_flight=16, requests_per_minute=500, tokens_per_minute=150000, completion_tokens=256, max_retries=5, initial_retry_delay=0.5, max_retry_delay=32, timeout=120):
+        if client is None:
+            if openai is None:
+                raise ImportError("The LLM dispatcher requires the openai package.")
+            # Retries are handled here, so Retry-After delays are shared by all requests
+            client = openai.AsyncOpenAI(api_key=openai_api_key, base_url=base_url, max_retries=0, timeout=timeout)
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.completion_tokens = completion_tokens
+        self.max_retries = max_retries
+        self.initial_retry_delay = initial_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.system_prompt_tokens = estimate_tokens(system_prompt, model)
+        self.stats = {'requests': 0, 'rate_limited': 0, 'retries': 0, 'failed': 0}
+
+    async def _wait_for_pause(self):
+        while True:
+            remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def complete(self, context_window):
+        """
+        Get the model's response for one context window, retrying rate limits and transient errors.
+        """
+        reserved_tokens = self.system_prompt_tokens + estimate_tokens(context_window, self.model) + self.completion_tokens
+        retry_delay = self.initial_retry_delay
+        for attempt in range(self.max_retries):
+            await self._wait_for_pause()
+            await self._request_bucket.acquire(1)
+            await self._token_bucket.acquire(reserved_tokens)
+            self.stats['requests'] += 1
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": context_window}
+                    ]
+                )
+            except Exception as e:
+                # A failed request did not use its reserved tokens
+                self._token_bucket.refund(reserved_tokens)
+                if not is_retryable(e) or attempt == self.max_retries - 1:
+                    self.stats['failed'] += 1
+                    return f"Error: {str(e)}"
+                self.stats['retries'] += 1
+                delay = retry_after_seconds(e)
+                if getattr(e, 'status_code', None) == 429:
+                    self.stats['rate_limited'] += 1
+                    if delay is not None:
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                await asyncio.sleep(delay if delay is not None else retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+            if usage is not None and getattr(usage, 'total_tokens', None) is not None:
+                self._token_bucket.refund(reserved_tokens - usage.total_tokens)
+            return response.choices[0].message.content
+        self.stats['failed'] += 1
+        return "Error: Max retries exceeded."
+
+    async def run(self, context_windows, progress_every=1000):
+        """
+        Get the responses for all context windows, in the same order.
+
+        Parameters:
+            context_windows (Iterable[str]): The context windows.
+            progress_every (int): Print progress after this many responses, or None for no output.
+
+        Returns:
+            List[str]: The responses.
+        """
+        context_windows = list(context_windows)
+        # Buckets and locks are created here so they belong to the running event loop
+        self._request_bucket = TokenBucket(self.requests_per_minute)
+        self._token_bucket = TokenBucket(self.tokens_per_minute)
+        self._paused_until = 0.0
+        responses = [None] * len(context_windows)
+        next_index = 0
+        done = 0
+
+        async def worker():
+            nonlocal next_index, done
+            while next_index < len(context_windows):
+                index = next_index
+                next_index += 1
+                responses[index] = await self.complete(context_windows[index])
+                done += 1
+                if progress_every and done % progress_every == 0:
+                    print(f"Processed {done}/{len(context_windows)} context windows")
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_in_flight, len(context_windows)))))
+        return responses
+
+def dispatch_context_windows(context_windows, model, system_prompt, openai_api_key=None, progress_every=1000, **kwargs):
+    """
+    Run an LLMDispatcher over a list of context windows from synchronous code.
+    Inside a running event loop, e.g. in a notebook, await LLMDispatcher.run instead.
+
+    Parameters:
+        context_windows (Iterable[str]): The context windows.
+        model (str): The model name.
+        system_prompt (str): The system prompt.
+        openai_api_key (str): The API key.
+        progress_every (int): Print progress after this many responses, or None for no output.
+        **kwargs: Further LLMDispatcher settings, e.g. max_in_flight, requests_per_minute, tokens_per_minute or base_url.
+
+    Returns:
+        Tuple[List[str], dict]: The responses in input order and the dispatcher's request statistics.
+    """
+    dispatcher = LLMDispatcher(model, system_prompt, openai_api_key=openai_api_key, **kwargs)
+    responses = asyncio.run(dispatcher.run(context_windows, progress_every))
+    return responses, dispatcher.stats
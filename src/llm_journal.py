@@ -0,0 +1,105 @@
+import json
+import os
+import pandas as pd
+from llm_cache import content_hash
+
+def _is_error(response):
+    return not isinstance(response, str) or response.startswith("Error:")
+
+class ResponseJournal:
+    """
+    An append-only JSONL journal of the responses of a job, one line per finished context window.
+
+    Every line is flushed as soon as it is written, so a crash or Ctrl-C loses at most the windows in
+    flight. Windows are identified by the hash of their text, so a restarted job recognises them
+    whatever the row order. Like the response cache, entries are keyed by model and system prompt
+    hash as well, so a job rerun with another model or prompt does not reuse the old responses.
+    A window counts as done once it has a response that is not an error, so failed windows are sent
+    again on the next run.
+    """
+    def __init__(self, journal_path, model, system_prompt, fsync=False):
+        self.journal_path = journal_path
+        self.model = model
+        self.prompt_hash = content_hash(system_prompt)
+        self.fsync = fsync
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def load(self, include_errors=False):
+        """
+        Read the recorded responses of this model and system prompt, returning a dict from window hash
+        to the latest non-error response. With include_errors, windows that only failed are included
+        with their last error. A line cut off by a crash is ignored.
+        """
+        responses = {}
+        if not os.path.exists(self.journal_path):
+            return responses
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get('model') != self.model or entry.get('prompt_hash') != self.prompt_hash:
+                    continue
+                previous = responses.get(entry['window_hash'])
+                if previous is None or _is_error(previous):
+                    responses[entry['window_hash']] = entry.get('response')
+        if include_errors:
+            return responses
+        return {window_hash: response for window_hash, response in responses.items() if not _is_error(response)}
+
+    def append(self, window_hash, response, index=None):
+        """
+        Record the response of one window. Errors are recorded too, but do not count as done.
+        """
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            # End a line cut off by a crash, so it does not swallow the first entry of this run
+            if self._file.tell() > 0:
+                with open(self.journal_path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        self._file.write('\n')
+        entry = {'model': self.model, 'prompt_hash': self.prompt_hash, 'window_hash': window_hash, 'response': response}
+        if index is not None:
+            # numpy scalars from a DataFrame index become plain Python values
+            index = index.item() if hasattr(index, 'item') else index
+            entry['index'] = index if isinstance(index, (int, str)) else str(index)
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def pending_windows(new_df, journal_path, model, system_prompt):
+    """
+    Find the windows of a window table that a job still has to send to model with system_prompt,
+    each distinct window once.
+
+    Returns:
+        Tuple[pd.Series, pd.DataFrame, List[str]]: The window hashes of new_df, the rows of new_df
+        without a finished response, and their window hashes.
+    """
+    window_hashes = new_df['context_window'].map(content_hash)
+    done = ResponseJournal(journal_path, model, system_prompt).load()
+    pending = (~window_hashes.isin(done.keys()) & ~window_hashes.duplicated()).values
+    return window_hashes, new_df[pending], window_hashes[pending].tolist()
+
+def merge_journal(new_df, window_hashes, journal_path, model, system_prompt):
+    """
+    Set the gpt_response column of new_df from the journal in one vectorized step. Windows without a
+    finished response keep their last error, or get "Error: Not processed" if they were never sent.
+    """
+    responses = pd.Series(ResponseJournal(journal_path, model, system_prompt).load(include_errors=True), dtype=object)
+    new_df['gpt_response'] = window_hashes.map(responses).fillna("Error: Not processed")
+    return new_df
@@ -0,0 +1,188 @@
+import json
+import math
+import re
+import pandas as pd
+
+_WORD = re.compile(r'\S+')
+
+PACKED_PROMPT_SUFFIX = (
+    "\n\nThe user message contains several numbered excerpts, each starting with a line like [1]. "
+    "Apply the instructions above to every excerpt separately. Respond only with a JSON object that maps "
+    "each excerpt number, as a string, to your response for that excerpt, e.g. {\"1\": \"...\", \"2\": \"...\"}."
+)
+
+def approximate_token_count(text):
+    """
+    Estimate the number of tokens in a text offline, at about 4 characters per token.
+    """
+    return len(text) // 4 + 1
+
+def packed_system_prompt(system_prompt):
+    """
+    The system prompt for packed requests: the original prompt plus the instructions for numbered excerpts.
+    """
+    return system_prompt + PACKED_PROMPT_SUFFIX
+
+def split_context_window(context_window, max_tokens, token_counter=approximate_token_count):
+    """
+    Split a context window at word boundaries into consecutive parts of at most max_tokens tokens.
+    A single word longer than max_tokens becomes a part of its own.
+
+    Returns:
+        List[str]: The parts, just the window itself if it fits.
+    """
+    if token_counter(context_window) <= max_tokens:
+        return [context_window]
+    words = [match.span() for match in _WORD.finditer(context_window)]
+    if not words:
+        return [context_window]
+    num_parts = math.ceil(token_counter(context_window) / max_tokens)
+    while True:
+        # Equal shares of the characters, cut at the nearest word start
+        size = len(context_window) / num_parts
+        cuts = [0]
+        for start, _ in words[1:]:
+            if start >= size * len(cuts):
+                cuts.append(start)
+        cuts.append(len(context_window))
+        parts = [context_window[start:end].strip() for start, end in zip(cuts, cuts[1:])]
+        if num_parts >= len(words) or all(token_counter(part) <= max_tokens for part in parts):
+            return parts
+        num_parts += 1
+
+def _format_request(items):
+    return "\n\n".join(f"[{number}]\n{item}" for number, item in enumerate(items, start=1))
+
+def pack_context_windows(new_df, max_request_tokens=3000, max_windows_per_request=20, group_column='text_id', token_counter=approximate_token_count):
+    """
+    Pack the context windows of each paper into as few requests as possible, and split windows that
+    do not fit into a request on their own.
+
+    Windows are only packed together with windows of the same paper (same group_column value), in
+    their order in new_df. Every request is a numbered list of excerpts, to be sent with
+    packed_system_prompt(system_prompt), and unpack_responses maps the answers back to the windows.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows, in a context_window column.
+        max_request_tokens (int): The maximum number of tokens in the user message of a request.
+        max_windows_per_request (int): The maximum number of excerpts in a request.
+        group_column (str): The column identifying the paper of a window, or None to pack across papers.
+        token_counter (Callable[[str], int]): Counts the tokens of a text, e.g.
+            functools.partial(llm_dispatch.estimate_tokens, model=model) to count with tiktoken.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The requests, with request_id and context_window columns, and
+        the excerpts, one row per window part with the window's index in new_df, part, request_id and
+        item (its number in the request).
+    """
+    # Room for the "[n]" line and the blank line before it
+    marker_tokens = token_counter("\n\n[00]\n")
+    max_item_tokens = max(1, max_request_tokens - marker_tokens)
+    groups = new_df[group_column] if group_column is not None else pd.Series(0, index=new_df.index)
+
+    requests = []
+    excerpts = {'window_index': [], 'part': [], 'request_id': [], 'item': []}
+    current_items = []
+    current_tokens = 0
+    current_group = None
+
+    def flush():
+        nonlocal current_items, current_tokens
+        if current_items:
+            requests.append(_format_request(current_items))
+        current_items = []
+        current_tokens = 0
+
+    for window_index, group, context_window in zip(new_df.index, groups, new_df['context_window']):
+        if group != current_group:
+            flush()
+            current_group = group
+        for part_number, part in enumerate(split_context_window(context_window, max_item_tokens, token_counter)):
+            part_tokens = token_counter(part) + marker_tokens
+            if current_items and (current_tokens + part_tokens > max_request_tokens or len(current_items) >= max_windows_per_request):
+                flush()
+            current_items.append(part)
+            current_tokens += part_tokens
+            excerpts['window_index'].append(window_index)
+            excerpts['part'].append(part_number)
+            excerpts['request_id'].append(len(requests))
+            excerpts['item'].append(len(current_items))
+    flush()
+
+    return pd.DataFrame({'request_id': range(len(requests)), 'context_window': requests}), pd.DataFrame(excerpts)
+
+def parse_packed_response(response):
+    """
+    Read the JSON object of a packed response into a dict from excerpt number to response text,
+    or None if the response is an error or has no such object.
+    """
+    if not isinstance(response, str) or response.startswith("Error:"):
+        return None
+    start = response.find('{')
+    end = response.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        answers = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(answers, dict):
+        return None
+    return {str(number).strip('[] '): answer if isinstance(answer, str) else json.dumps(answer) for number, answer in answers.items()}
+
+def _join_parts(answers):
+    """
+    Combine the answers for the parts of a split window: the distinct answers, one per line.
+    """
+    return "\n".join(dict.fromkeys(answers))
+
+def unpack_responses(new_df, excerpts, responses, combine=_join_parts):
+    """
+    Map the responses of packed requests back to the context windows.
+
+    Parameters:
+        new_df (pd.DataFrame): The context windows the requests were packed from.
+        excerpts (pd.DataFrame): The excerpts returned by pack_context_windows.
+        responses (List[str]): The responses, one per request in request_id order.
+        combine (Callable[[List[str]], str]): Combines the answers for the parts of a split window.
+
+    Returns:
+        pd.DataFrame: new_df with the responses in a gpt_response column. An excerpt the model did not
+        answer gets "Error: ...", the failed request's error if the whole request failed.
+    """
+    parsed = [parse_packed_response(response) for response in responses]
+    answers = []
+    for request_id, item in zip(excerpts['request_id'], excerpts['item']):
+        if parsed[request_id] is not None:
+            answers.append(parsed[request_id].get(str(item), f"Error: No answer for excerpt {item}"))
+        elif isinstance(responses[request_id], str) and responses[request_id].startswith("Error:"):
+            answers.append(responses[request_id])
+        else:
+            answers.append("Error: Unreadable packed response")
+    answered = excerpts.assign(answer=answers).sort_values(['window_index', 'part'], kind='stable')
+    combined = answered.groupby('window_index', sort=False)['answer'].agg(lambda parts: parts.iloc[0] if len(parts) == 1 else combine(list(parts)))
+    new_df['gpt_response'] = new_df.index.map(combined)
+    return new_df
+
+def packing_report(new_df, requests, system_prompt, token_counter=approximate_token_count):
+    """
+    Compare the number of requests and prompt tokens of packed requests with one request per window.
+
+    Returns:
+        dict: Requests and estimated prompt tokens (system prompt included), unpacked and packed.
+    """
+    system_tokens = token_counter(system_prompt)
+    packed_system_tokens = token_counter(packed_system_prompt(system_prompt))
+    window_tokens = sum(token_counter(window) for window in new_df['context_window'])
+    request_tokens = sum(token_counter(request) for request in requests['context_window'])
+    report = {
+        'windows': len(new_df),
+        'requests': len(requests),
+        'window_tokens': window_tokens + system_tokens * len(new_df),
+        'packed_tokens': request_tokens + packed_system_tokens * len(requests),
+    }
+    print(f"Packing: {report['windows']} windows in {report['requests']} requests "
+          f"({1 - report['requests'] / max(report['windows'], 1):.1%} fewer), "
+          f"{report['window_tokens']} -> {report['packed_tokens']} prompt tokens "
+          f"({1 - report['packed_tokens'] / max(report['window_tokens'], 1):.1%} fewer)")
+    return report
@@ -0,0 +1,147 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockChatCompletionsServer:
+    """
+    A local OpenAI-compatible chat completions server for dry runs of the LLM dispatch code.
+
+    Every request waits latency seconds. A rate_limit_probability share of the requests, and every
+    request beyond requests_per_second in the current second, is answered with 429 and a Retry-After
+    header of retry_after seconds. Other requests get a canned completion that echoes the start of
+    the user message, with token usage of about 4 characters per token.
+
+    Use it as a context manager and point the client at url:
+
+        with MockChatCompletionsServer(rate_limit_probability=0.2) as server:
+            responses, stats = dispatch_context_windows(windows, "gpt-4o-mini", prompt, "test", base_url=server.url)
+    """
+    def __init__(self, latency=0.05, rate_limit_probability=0.0, requests_per_second=None, retry_after=1, seed=0):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.requests_per_second = requests_per_second
+        self.retry_after = retry_after
+        self.stats = {'requests': 0, 'rate_limited': 0, 'completed': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._second = None
+        self._requests_this_second = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _rate_limited(self):
+        with self._lock:
+            self.stats['requests'] += 1
+            second = int(time.monotonic())
+            if second != self._second:
+                self._second = second
+                self._requests_this_second = 0
+            self._requests_this_second += 1
+            limited = self._random.random() < self.rate_limit_probability
+            if self.requests_per_second is not None and self._requests_this_second > self.requests_per_second:
+                limited = True
+            if limited:
+                self.stats['rate_limited'] += 1
+            else:
+                self.stats['completed'] += 1
+            return limited
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=()):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                    return
+                time.sleep(server.latency)
+                if server._rate_limited():
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}}, [('Retry-After', str(server.retry_after))])
+                    return
+
+                messages = request.get('messages', [])
+                prompt_characters = sum(len(message.get('content', '')) for message in messages)
+                user_message = messages[-1].get('content', '') if messages else ''
+                content = f"Mock response: {user_message[:40]}"
+                usage = {'prompt_tokens': prompt_characters // 4 + 1, 'completion_tokens': len(content) // 4 + 1}
+                usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+                self._send_json(200, {
+                    'id': f"chatcmpl-mock-{server.stats['requests']}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model', 'mock'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': usage,
+                })
+
+        return Handler
+
+def write_mock_batch_results(request_paths, output_path, error_path=None, error_probability=0.0, seed=0):
+    """
+    Write synthetic OpenAI Batch API result files for request files from llm_batch.write_batch_requests,
+    for dry runs of the batch write and ingest round trip without uploading anything.
+
+    Every request gets the same canned completion as MockChatCompletionsServer, except an
+    error_probability share that fails with a 500 response, written to error_path if it is given
+    and to output_path otherwise.
+
+    Returns:
+        dict: The number of completed and failed requests.
+    """
+    rng = random.Random(seed)
+    stats = {'completed': 0, 'failed': 0}
+    output = open(output_path, 'w', encoding='utf-8')
+    errors = open(error_path, 'w', encoding='utf-8') if error_path is not None else output
+    try:
+        for request_path in request_paths:
+            with open(request_path, encoding='utf-8') as f:
+                for line in f:
+                    request = json.loads(line)
+                    result = {'id': f"batch_req_mock_{stats['completed'] + stats['failed']}", 'custom_id': request['custom_id'], 'error': None}
+                    if rng.random() < error_probability:
+                        stats['failed'] += 1
+                        result['response'] = {'status_code': 500, 'request_id': None, 'body': {'error': {'message': "Mock server error", 'type': 'server_error'}}}
+                        errors.write(json.dumps(result) + '\n')
+                        continue
+                    stats['completed'] += 1
+                    user_message = request['body']['messages'][-1]['content']
+                    result['response'] = {'status_code': 200, 'request_id': None, 'body': {
+                        'object': 'chat.completion',
+                        'model': request['body']['model'],
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': f"Mock response: {user_message[:40]}"}, 'finish_reason': 'stop'}],
+                    }}
+                    output.write(json.dumps(result) + '\n')
+    finally:
+        output.close()
+        if errors is not output:
+            errors.close()
+    return stats
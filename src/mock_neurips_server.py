@@ -0,0 +1,128 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockNeurIPSServer:
+    """
+    A local stand-in for papers.nips.cc for dry runs of the NeurIPS scraper.
+
+    It serves a year index page at /paper/<year> that lists papers_per_year papers, and a metadata
+    file per paper at /paper/<year>/file/<hash>-Metadata.json. Every request waits latency seconds,
+    and an error_probability share of the requests fails with 503. Responses carry an ETag, and a
+    request with a matching If-None-Match gets an empty 304. stats counts the requests, the errors,
+    the 304 responses and the highest number of requests handled at once.
+
+    Use it as a context manager and pass url as the base URL of the scraper:
+
+        with MockNeurIPSServer({2020: 50, 2021: 80}, error_probability=0.1) as server:
+            ...get_all_hashes(server.url + "2020", fetcher)...
+    """
+    def __init__(self, papers_per_year, latency=0.01, error_probability=0.0, seed=0):
+        self.papers_per_year = papers_per_year
+        self.latency = latency
+        self.error_probability = error_probability
+        self.stats = {'requests': 0, 'errors': 0, 'not_modified': 0, 'in_flight': 0, 'max_in_flight': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/paper/"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def paper_hashes(self, year):
+        return [hashlib.md5(f"{year}-{i}".encode()).hexdigest() for i in range(self.papers_per_year.get(year, 0))]
+
+    def metadata(self, year, paper_hash):
+        number = self.paper_hashes(year).index(paper_hash)
+        return {
+            'sourceid': f"{year}-{number}",
+            'title': f"Paper {number} of {year}",
+            'abstract': f"The abstract of paper {number} of {year}.",
+            'full_text': f"The full text of paper {number} of {year}. " * 20,
+            'authors': [
+                {'given_name': f"Author{k}", 'family_name': f"Paper{number}", 'institution': "Mock University"}
+                for k in range(1 + number % 3)
+            ],
+        }
+
+    def _start_request(self):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            failed = self._random.random() < self.error_probability
+            if failed:
+                self.stats['errors'] += 1
+            return failed
+
+    def _end_request(self):
+        with self._lock:
+            self.stats['in_flight'] -= 1
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real site
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                payload = body.encode('utf-8')
+                etag = '"' + hashlib.md5(payload).hexdigest() + '"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    with server._lock:
+                        server.stats['not_modified'] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                if status == 200:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                failed = server._start_request()
+                try:
+                    time.sleep(server.latency)
+                    if failed:
+                        self._send(503, "Service Unavailable", 'text/plain')
+                        return
+                    parts = self.path.strip('/').split('/')
+                    if len(parts) == 2 and parts[0] == 'paper' and parts[1].isdigit() and int(parts[1]) in server.papers_per_year:
+                        year = int(parts[1])
+                        items = "".join(f'<li><a href="/paper/{year}/hash/{paper_hash}-Abstract.html">Paper</a></li>' for paper_hash in server.paper_hashes(year))
+                        self._send(200, f'<html><body><div class="container-fluid"><ul>{items}</ul></div></body></html>', 'text/html')
+                        return
+                    if len(parts) == 4 and parts[0] == 'paper' and parts[2] == 'file' and parts[3].endswith('-Metadata.json'):
+                        year = int(parts[1])
+                        paper_hash = parts[3][:-len('-Metadata.json')]
+                        if year in server.papers_per_year and paper_hash in server.paper_hashes(year):
+                            self._send(200, json.dumps(server.metadata(year, paper_hash)), 'application/json')
+                            return
+                    self._send(404, "Not Found", 'text/plain')
+                finally:
+                    server._end_request()
+
+        return Handler
@@ -0,0 +1,175 @@
+import re
+import zlib
+from functools import partial
+from multiprocessing import Pool, cpu_count
+import numpy as np
+
+_TOKEN = re.compile(r'\w+')
+_MAX_HASH = np.uint64(2**32 - 1)
+_SHINGLE_BLOCK = 4096
+
+def _permutations(num_perm, seed):
+    """
+    The odd multipliers and offsets of num_perm multiply-shift hash functions.
+    """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    offsets = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return multipliers, offsets
+
+def _shingle_hashes(text, shingle_size):
+    """
+    The distinct 32-bit hashes of the lowercased word shingles of a text.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.array([zlib.crc32(token.encode('utf-8')) for token in tokens], dtype=np.uint64)
+    size = min(shingle_size, len(hashes))
+    shingles = hashes[:len(hashes) - size + 1].copy()
+    for k in range(1, size):
+        shingles = shingles * np.uint64(1000003) ^ hashes[k:len(hashes) - size + 1 + k]
+    return np.unique(shingles & _MAX_HASH)
+
+def _signature_chunk(texts, num_perm, shingle_size, seed):
+    multipliers, offsets = _permutations(num_perm, seed)
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint64)
+    for i, text in enumerate(texts):
+        shingles = _shingle_hashes(text, shingle_size)
+        # Blocks of shingles keep the hash matrix small for long papers
+        for start in range(0, len(shingles), _SHINGLE_BLOCK):
+            block = shingles[start:start + _SHINGLE_BLOCK, None]
+            # Multiply-shift hashing: the top 32 bits of a * x + b modulo 2**64
+            signatures[i] = np.minimum(signatures[i], ((block * multipliers + offsets) >> np.uint64(32)).min(axis=0))
+    return signatures
+
+def minhash_signatures(texts, num_perm=128, shingle_size=5, seed=0, num_processes=None, chunk_size=1000):
+    """
+    Compute MinHash signatures of the word shingles of texts, in parallel.
+
+    Parameters:
+        texts (List[str]): The texts.
+        num_perm (int): The number of hash functions, i.e. the signature length.
+        shingle_size (int): The number of words per shingle. Texts with fewer words are one shingle.
+        seed (int): The seed of the hash functions. Signatures are only comparable with the same seed.
+        num_processes (int): The number of worker processes, defaults to the number of cores.
+        chunk_size (int): The number of texts per task.
+
+    Returns:
+        np.ndarray: A (len(texts), num_perm) array. Texts without words get a signature of all 2**32 - 1.
+    """
+    texts = list(texts)
+    if num_processes is None:
+        num_processes = cpu_count()
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    chunk_partial = partial(_signature_chunk, num_perm=num_perm, shingle_size=shingle_size, seed=seed)
+    if num_processes == 1 or len(chunks) <= 1:
+        results = [chunk_partial(chunk) for chunk in chunks]
+    else:
+        with Pool(num_processes) as p:
+            results = p.map(chunk_partial, chunks)
+    if not results:
+        return np.empty((0, num_perm), dtype=np.uint64)
+    return np.concatenate(results)
+
+def lsh_parameters(threshold, num_perm, false_positive_weight=0.5):
+    """
+    Choose the number of bands and rows per band for a Jaccard threshold, minimizing the weighted
+    probability of false positives below the threshold and false negatives above it.
+
+    Returns:
+        Tuple[int, int]: The bands and rows per band.
+    """
+    if not 0 < threshold < 1:
+        raise ValueError("threshold must be between 0 and 1.")
+    best = None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        below = np.linspace(0, threshold, 200)
+        above = np.linspace(threshold, 1, 200)
+        false_positives = (1 - (1 - below ** rows) ** bands).mean() * threshold
+        false_negatives = ((1 - above ** rows) ** bands).mean() * (1 - threshold)
+        error = false_positive_weight * false_positives + (1 - false_positive_weight) * false_negatives
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def near_duplicate_clusters(signatures, threshold=0.8, bands=None, rows=None):
+    """
+    Group near-duplicate texts by their MinHash signatures with locality-sensitive hashing.
+
+    Texts that share a band become candidates, and a candidate joins the cluster of the first text in
+    its bucket if their estimated Jaccard similarity (the share of equal signature values) is at least
+    threshold. Texts without words are never clustered.
+
+    Parameters:
+        signatures (np.ndarray): The signatures from minhash_signatures.
+        threshold (float): The Jaccard similarity from which texts count as near duplicates.
+        bands (int): The number of LSH bands, chosen from threshold by default.
+        rows (int): The number of signature values per band.
+
+    Returns:
+        np.ndarray: A cluster id per text, numbered in order of first appearance.
+    """
+    num_texts, num_perm = signatures.shape
+    if bands is None or rows is None:
+        bands, rows = lsh_parameters(threshold, num_perm)
+    parents = np.arange(num_texts)
+    has_words = ~(signatures == _MAX_HASH).all(axis=1)
+    candidates = np.flatnonzero(has_words)
+    for band in range(bands):
+        band_values = signatures[candidates, band * rows:(band + 1) * rows]
+        # One 64-bit key per band, equal band values give equal keys
+        keys = np.zeros(len(candidates), dtype=np.uint64)
+        for column in range(rows):
+            keys = keys * np.uint64(1000003) ^ band_values[:, column]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = candidates[order[start:end]]
+            first = members[0]
+            similarity = (signatures[members[1:]] == signatures[first]).mean(axis=1)
+            for member in members[1:][similarity >= threshold]:
+                root_first, root_member = _find(parents, first), _find(parents, member)
+                if root_first != root_member:
+                    parents[max(root_first, root_member)] = min(root_first, root_member)
+    roots = np.array([_find(parents, i) for i in range(num_texts)], dtype=np.int64)
+    return np.unique(roots, return_inverse=True)[1] if num_texts else roots
+
+def add_near_duplicate_clusters(df, text_column='text', cluster_column='cluster_id', threshold=0.8, num_perm=128, shingle_size=5, seed=0, num_processes=None):
+    """
+    Add a column of near-duplicate cluster ids to a DataFrame of papers or context windows, and a
+    boolean is_representative column that marks the first row of each cluster.
+
+    For papers, e.g. arXiv versions or cross-posted copies, using the cluster id as text_id makes
+    build_context_window_table window only the representative of each cluster.
+
+    Parameters:
+        df (pd.DataFrame): The papers or windows.
+        text_column (str): The column with the texts.
+        cluster_column (str): The name of the new cluster id column.
+        threshold (float): The Jaccard similarity from which texts count as near duplicates.
+        num_perm (int): The MinHash signature length.
+        shingle_size (int): The number of words per shingle.
+        seed (int): The seed of the hash functions.
+        num_processes (int): The number of worker processes for the signatures.
+
+    Returns:
+        pd.DataFrame: df with the two new columns.
+    """
+    signatures = minhash_signatures(df[text_column].tolist(), num_perm, shingle_size, seed, num_processes)
+    clusters = near_duplicate_clusters(signatures, threshold)
+    df[cluster_column] = clusters
+    df['is_representative'] = ~df[cluster_column].duplicated().values
+    print(f"Near duplicates: {len(df)} texts in {df[cluster_column].nunique()} clusters")
+    return df
@@ -2,13 +2,13 @@
 ### I adjusted the script to fit my specific needs for output
 ### Notice that papers after 2019 cannot be scraped atm
 
-import requests
 import argparse
 import json
 from tqdm import tqdm
-from requests.exceptions import ConnectionError
 from bs4 import BeautifulSoup
 import os
+from http_fetch import ConcurrentFetcher, HTTPCache
+from output_sink import OutputSink
 
 # Initializing argparse
 parser = argparse.ArgumentParser(description='Script to scrape NeurIPS Papers')
@@ -17,17 +17,11 @@ parser.add_argument('-start', action="store", default=1987, dest="start_year", t
 parser.add_argument('-end', action="store", default=2023, dest="end_year", type=int, help='The end year to scrape the papers')
 parser.add_argument('-folder', action="store", default="data", dest="folder_path", type=str, help='Folder to save the scraped data')
 parser.add_argument('-filename', action="store", default="neurIPS_papers.jsonl", dest="filename", type=str, help='Filename for the output JSONL file')
-arguments = parser.parse_args()
-
-# Argparse conditions
-if arguments.start_year < 1987 or arguments.start_year > 2023:
-    raise ValueError("Please enter a valid start year. Possible values are [1987, 2023].")
-
-if arguments.end_year < 1987 or arguments.end_year > 2023:
-    raise ValueError("Please enter a valid end year. Possible values are [1987, 2023].")
-
-if arguments.start_year > arguments.end_year:
-    raise ValueError("Start year shouldn't be greater than end year.")
+parser.add_argument('-workers', action="store", default=16, dest="max_workers", type=int, help='Number of concurrent downloads')
+parser.add_argument('-per-host', action="store", default=8, dest="max_per_host", type=int, help='Maximum number of concurrent requests to the host')
+parser.add_argument('-rate', action="store", default=10.0, dest="requests_per_second", type=float, help='Maximum number of requests per second to the host')
+parser.add_argument('-no-cache', action="store_false", dest="use_cache", help='Do not keep an on-disk HTTP cache of the downloaded pages')
+parser.add_argument('-base-url', action="store", default=None, dest="base_url", type=str, help='Base URL of the paper pages instead of papers.nips.cc, e.g. a local test server')
 
 # Constants
 BASE_URL = "https://papers.nips.cc/paper/"
@@ -35,31 +29,29 @@ PARSER = 'lxml'
 HEADERS = {
     "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.183 Safari/537.36",
 }
-start_year = arguments.start_year
-end_year = arguments.end_year
-papers = []
-paper_authors = []
+PAPER_COLUMNS = ["text", "meta"]
+AUTHOR_COLUMNS = ["source_id", "first_name", "last_name", "institution"]
 
 
-def get_conference_url(start_year, end_year):
+def get_conference_url(start_year, end_year, base_url=BASE_URL):
     """Return all the URLs of conferences between start_year and end_year"""
 
     conferences = []
     print("Preparing data...")
     for year in tqdm(range(start_year, end_year+1)):
-        year_url = BASE_URL + str(year)
+        year_url = base_url + str(year)
         conferences.append({"URL": year_url})
     return conferences
 
 
-def get_all_hashes(url):
+def get_all_hashes(url, fetcher):
     """
         Context: The NeurIPS website follow a structured pattern by maintaining a hash for each paper.
 
         Return all the hashes for a particular year.
     """
-    try:
-        response = requests.get(url, headers=HEADERS)
+    response = fetcher.get(url)
+    if response is not None:
         if response.status_code == 200:
             soup = BeautifulSoup(response.text, PARSER)
 
@@ -72,88 +64,153 @@ def get_all_hashes(url):
         else:
             print("Couldn't complete the request.")
             return False
-    except ConnectionError as error:
-        print(error)
-
-
-def scrap_paper_and_authors(year_url, hashes):
-    """Scrap papers and authors using extracted hashes"""
-
-    for paper_hash in tqdm(hashes):
-        paper_url = year_url + "/file/" + paper_hash + "-Metadata.json"
-        try:
-            response = requests.get(paper_url, headers=HEADERS)
-            if response.status_code == 200:
-                try:
-                    doc = response.json()
-                except json.JSONDecodeError:
-                    print(f"Invalid JSON response for URL: {paper_url}")
-                    continue
-
-                # Extracting paper
-                paper = {
-                    'source_id': doc.get('sourceid'),
-                    'year': year_url.split("/")[-1],
-                    'title': doc.get('title'),
-                    'abstract': doc.get('abstract'),
-                    'full_text': doc.get('full_text')
+
+
+class ScrapeOutput:
+    """
+    Streams the scraped papers and their authors to one JSONL file per year as they are fetched, and
+    logs every finished paper hash, so an interrupted scrape resumes where it stopped.
+
+    For a filename of neurIPS_papers.jsonl the files are neurIPS_papers_<year>.jsonl,
+    neurIPS_papers_authors_<year>.jsonl and neurIPS_papers_completed.log. Papers and authors go
+    through appending OutputSinks and are written batch_size papers at a time. The hashes of a batch
+    are logged after the sinks are flushed, so a crash can at worst write a paper a second time, never lose one.
+    """
+
+    def __init__(self, folder_path, filename, batch_size=100):
+        os.makedirs(folder_path, exist_ok=True)
+        self.folder_path = folder_path
+        self.stem = os.path.splitext(filename)[0]
+        self.batch_size = batch_size
+        self.completed_path = os.path.join(folder_path, self.stem + "_completed.log")
+        self.counts = {'papers': 0, 'authors': 0}
+        self._sinks = {}
+        self._pending = []
+        self._completed_file = open(self.completed_path, 'a', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def completed_hashes(self, year):
+        """Return the hashes of the papers of a year that are already written"""
+        completed = set()
+        with open(self.completed_path, encoding='utf-8') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) == 2 and parts[0] == str(year):
+                    completed.add(parts[1])
+        return completed
+
+    def _sink(self, name, columns):
+        if name not in self._sinks:
+            # The sinks are flushed together with the log, never on their own
+            self._sinks[name] = OutputSink(os.path.join(self.folder_path, name), columns=columns, sink_format="jsonl", batch_size=float('inf'), append=True)
+        return self._sinks[name]
+
+    def write(self, year, paper_hash, record, authors):
+        """Buffer a paper and its authors, and write the batch once batch_size papers are buffered"""
+        self._sink(f"{self.stem}_{year}.jsonl", PAPER_COLUMNS).write(record)
+        if authors:
+            authors_sink = self._sink(f"{self.stem}_authors_{year}.jsonl", AUTHOR_COLUMNS)
+            for author in authors:
+                authors_sink.write(author)
+        self._pending.append(f"{year} {paper_hash}\n")
+        self.counts['papers'] += 1
+        self.counts['authors'] += len(authors)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered papers and authors, then log their hashes as completed"""
+        for sink in self._sinks.values():
+            sink.flush()
+        self._completed_file.write("".join(self._pending))
+        self._completed_file.flush()
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        for sink in self._sinks.values():
+            sink.close()
+        self._sinks = {}
+        self._completed_file.close()
+
+
+def scrap_paper_and_authors(year_url, hashes, fetcher, output):
+    """Scrap papers and authors using extracted hashes, downloading the metadata files concurrently and skipping papers already in the output"""
+
+    year = year_url.split("/")[-1]
+    completed = output.completed_hashes(year)
+    hashes = [paper_hash for paper_hash in hashes if paper_hash not in completed]
+    if completed:
+        print(f"{year}: {len(completed)} papers already scraped, {len(hashes)} left")
+    url_hashes = {year_url + "/file/" + paper_hash + "-Metadata.json": paper_hash for paper_hash in hashes}
+    for paper_url, response in tqdm(fetcher.map(url_hashes), total=len(url_hashes)):
+        if response is None:
+            continue
+        if response.status_code == 200:
+            try:
+                doc = response.json()
+            except json.JSONDecodeError:
+                print(f"Invalid JSON response for URL: {paper_url}")
+                continue
+
+            # Extracting paper, in the JSONL format of the arXiv data
+            record = {
+                "text": doc.get('full_text'),
+                "meta": {
+                    "source_id": doc.get('sourceid'),
+                    "year": year,
+                    "title": doc.get('title'),
+                    "abstract": doc.get('abstract')
                 }
-                papers.append(paper)
-
-                # Extracting authors from a paper
-                for author in doc.get('authors', []):
-                    author_details = {
-                        'source_id': doc.get('sourceid'),
-                        'first_name': author.get('given_name'),
-                        'last_name': author.get('family_name'),
-                        'institution': author.get('institution')
-                    }
-                    paper_authors.append(author_details)
-            else:
-                print(f"Failed to get response for URL: {paper_url}")
-        except ConnectionError as error:
-            print(error)
-
-
-
-def save_jsonl(file_name, data, folder_path):
-    """Save data in JSONL format in the specified folder."""
-    # Check if the folder exists, create it if not
-    if not os.path.exists(folder_path):
-        os.makedirs(folder_path)
-
-    file_path = os.path.join(folder_path, file_name)
-    with open(file_path, 'w') as file:
-        for item in data:
-            json_record = json.dumps(item, ensure_ascii=False)
-            file.write(json_record + '\n')
-    print(f"Successfully saved {file_name} in '{folder_path}' folder")
-
-
-# Main execution logic
-conferences = get_conference_url(start_year, end_year)
-
-papers = []
-for year in conferences:
-    hashes = get_all_hashes(year["URL"])
-    if hashes:
-        scrap_paper_and_authors(year["URL"], hashes)
-
-if papers:
-    # Transforming to the required JSONL format
-    jsonl_data = []
-    for paper in papers:
-        jsonl_record = {
-            "text": paper["full_text"],
-            "meta": {
-                "source_id": paper["source_id"],
-                "year": paper["year"],
-                "title": paper["title"],
-                "abstract": paper["abstract"]
             }
-        }
-        jsonl_data.append(jsonl_record)
 
-    save_jsonl(arguments.filename, jsonl_data, arguments.folder_path)
-else:
-    print("No data to save!")
+            # Extracting authors from a paper
+            authors = []
+            for author in doc.get('authors', []):
+                author_details = {
+                    'source_id': doc.get('sourceid'),
+                    'first_name': author.get('given_name'),
+                    'last_name': author.get('family_name'),
+                    'institution': author.get('institution')
+                }
+                authors.append(author_details)
+            output.write(year, url_hashes[paper_url], record, authors)
+        else:
+            print(f"Failed to get response for URL: {paper_url}")
+
+
+def main(arguments):
+    # Argparse conditions
+    if arguments.start_year < 1987 or arguments.start_year > 2023:
+        raise ValueError("Please enter a valid start year. Possible values are [1987, 2023].")
+
+    if arguments.end_year < 1987 or arguments.end_year > 2023:
+        raise ValueError("Please enter a valid end year. Possible values are [1987, 2023].")
+
+    if arguments.start_year > arguments.end_year:
+        raise ValueError("Start year shouldn't be greater than end year.")
+
+    # One fetcher for all years, so connections are reused and the rate limit holds across years
+    cache = HTTPCache(os.path.join(arguments.folder_path, ".http_cache")) if arguments.use_cache else None
+    fetcher = ConcurrentFetcher(max_workers=arguments.max_workers, max_per_host=arguments.max_per_host, requests_per_second=arguments.requests_per_second, headers=HEADERS, cache=cache)
+    conferences = get_conference_url(arguments.start_year, arguments.end_year, arguments.base_url or BASE_URL)
+
+    with ScrapeOutput(arguments.folder_path, arguments.filename) as output:
+        for year in conferences:
+            hashes = get_all_hashes(year["URL"], fetcher)
+            if hashes:
+                scrap_paper_and_authors(year["URL"], hashes, fetcher, output)
+
+    if output.counts['papers']:
+        print(f"Successfully saved {output.counts['papers']} papers and {output.counts['authors']} authors in '{arguments.folder_path}' folder")
+    else:
+        print("No new data to save!")
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,220 @@
+import csv
+import os
+import pandas as pd
+from shard_writer import write_json_lines
+
+SINK_FORMATS = ("csv", "jsonl", "parquet")
+
+_EXTENSION_FORMATS = {'.csv': "csv", '.jsonl': "jsonl", '.parquet': "parquet"}
+
+def sink_format_for(path):
+    """
+    Pick the sink format from a file extension: .csv, .jsonl or .parquet.
+
+    .json is rejected, since the sink writes JSON lines, which pd.read_json only reads with lines=True.
+    Call it before a long scan, so a bad file name fails before any work is done.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        raise ValueError(f"{path}: JSON output is written as JSON lines, use a .jsonl file name instead.")
+    if extension not in _EXTENSION_FORMATS:
+        raise ValueError(f"Cannot tell the output format of {path}. Use a .csv, .jsonl or .parquet file, or pass sink_format.")
+    return _EXTENSION_FORMATS[extension]
+
+def _read_csv_header(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), None)
+
+class OutputSink:
+    """
+    A buffered table writer with CSV, JSONL and Parquet backends, shared by the scrapers and filters.
+
+    The columns are fixed once: from columns, from the header of the file being appended to, or from
+    the first row. Rows are buffered and written batch_size at a time. A row with a column outside the
+    schema raises a ValueError, and missing columns are written as empty values.
+
+    A new file is written to <path>.tmp and renamed into place on close, so readers never see a
+    partial file, and a failed run leaves the previous file untouched. With append=True, CSV and JSONL
+    rows are appended to the existing file in whole batches instead, and the CSV header is only
+    written if the file is new or empty.
+    """
+    def __init__(self, path, columns=None, sink_format=None, batch_size=1000, append=False):
+        self.path = path
+        self.sink_format = sink_format or sink_format_for(path)
+        if self.sink_format not in SINK_FORMATS:
+            raise ValueError(f"Unknown sink format: {self.sink_format}. Use 'csv', 'jsonl' or 'parquet'.")
+        if append and self.sink_format == "parquet":
+            raise ValueError("Parquet files cannot be appended to, write a new file instead.")
+        self.batch_size = batch_size
+        self.append = append
+        self.rows_written = 0
+        self.columns = list(columns) if columns is not None else None
+        self._buffer = []
+        self._file = None
+        self._csv_writer = None
+        self._parquet_writer = None
+        self._parquet_schema = None
+
+        folder_path = os.path.dirname(path)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok=True)
+        existing = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if existing and self.sink_format == "csv":
+            header = _read_csv_header(path)
+            if self.columns is not None and header != self.columns:
+                raise ValueError(f"The columns {self.columns} do not match the header {header} of {path}.")
+            self.columns = header
+        self._write_path = path if append else path + ".tmp"
+        self._needs_header = self.sink_format == "csv" and not existing
+        if self.sink_format != "parquet":
+            # CSV has no escapes, so a lone surrogate, which UTF-8 cannot encode, is written as the text \ud800
+            errors = 'backslashreplace' if self.sink_format == "csv" else 'strict'
+            self._file = open(self._write_path, 'a' if append else 'w', newline='' if self.sink_format == "csv" else None, encoding='utf-8', errors=errors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _check_columns(self, keys):
+        if self.columns is None:
+            self.columns = list(keys)
+            return
+        unknown = [key for key in keys if key not in self.columns]
+        if unknown:
+            raise ValueError(f"Columns {unknown} are not in the schema {self.columns} of {self.path}.")
+
+    def write(self, row):
+        """
+        Buffer one row, given as a dict from column to value.
+        """
+        self._check_columns(row.keys())
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def write_frame(self, df):
+        """
+        Write a whole DataFrame at once, with the backend's vectorized writer.
+        """
+        self._check_columns(df.columns)
+        self.flush()
+        df = df.reindex(columns=self.columns)
+        if self.sink_format == "csv":
+            self._write_csv_header()
+            df.to_csv(self._file, header=False, index=False)
+        elif self.sink_format == "jsonl":
+            if len(df):
+                try:
+                    lines = df.to_json(orient='records', lines=True, force_ascii=False)
+                except UnicodeEncodeError:
+                    # pandas cannot write lone surrogates at all, so these frames go through json.dumps
+                    write_json_lines(self._file, df.astype(object).where(df.notna(), None).to_dict('records'))
+                else:
+                    self._file.write(lines.rstrip('\n') + '\n')
+        else:
+            import pyarrow as pa
+            self._write_parquet_table(pa.Table.from_pandas(df, preserve_index=False))
+        self._file_flush()
+        self.rows_written += len(df)
+
+    def _write_csv_header(self):
+        if self._needs_header:
+            csv.writer(self._file).writerow(self.columns)
+            self._needs_header = False
+
+    def _write_parquet_table(self, table):
+        import pyarrow.parquet as pq
+        if self._parquet_writer is None:
+            self._parquet_schema = table.schema
+            self._parquet_writer = pq.ParquetWriter(self._write_path, self._parquet_schema)
+        else:
+            table = table.cast(self._parquet_schema)
+        self._parquet_writer.write_table(table)
+
+    def _file_flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows.
+        """
+        if not self._buffer:
+            return
+        if self.sink_format == "csv":
+            self._write_csv_header()
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self._file, fieldnames=self.columns)
+            self._csv_writer.writerows(self._buffer)
+        elif self.sink_format == "jsonl":
+            write_json_lines(self._file, [{column: row.get(column) for column in self.columns} for row in self._buffer])
+        else:
+            import pyarrow as pa
+            rows = [{column: row.get(column) for column in self.columns} for row in self._buffer]
+            if self._parquet_schema is None:
+                table = pa.Table.from_pylist(rows)
+            else:
+                table = pa.Table.from_pylist(rows, schema=self._parquet_schema)
+            self._write_parquet_table(table)
+        self._file_flush()
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        """
+        Write the remaining rows and move the file into place.
+        """
+        self.flush()
+        if self.sink_format == "csv" and self.columns is not None:
+            self._write_csv_header()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.sink_format == "parquet":
+            if self._parquet_writer is None:
+                # No rows were written, still leave a readable file behind
+                import pyarrow as pa
+                self._write_parquet_table(pa.Table.from_pylist([], schema=pa.schema([(column, pa.null()) for column in self.columns or []])))
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if not self.append:
+            os.replace(self._write_path, self.path)
+
+    def abort(self):
+        """
+        Stop without moving the file into place, e.g. after an error. Appended batches stay written.
+        """
+        self._buffer = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if not self.append and os.path.exists(self._write_path):
+            os.remove(self._write_path)
+
+def write_table(df, path, sink_format=None):
+    """
+    Write a DataFrame to a CSV, JSONL or Parquet file through an OutputSink, replacing the file atomically.
+    """
+    with OutputSink(path, columns=list(df.columns), sink_format=sink_format) as sink:
+        sink.write_frame(df)
+
+def read_table(path, sink_format=None):
+    """
+    Load a file written by an OutputSink into a DataFrame.
+    """
+    sink_format = sink_format or sink_format_for(path)
+    if sink_format == "csv":
+        return pd.read_csv(path)
+    if sink_format == "jsonl":
+        if os.path.getsize(path) == 0:
+            return pd.DataFrame()
+        return pd.read_json(path, lines=True, dtype=False)
+    return pd.read_parquet(path)
@@ -0,0 +1,143 @@
+import re
+from keyword_matcher import create_keyword_pattern, create_keyword_matcher
+
+# The columns that hold the match spans of a kept document when a scan captures them
+SPAN_COLUMNS = ['match_starts', 'match_ends', 'match_pattern_ids']
+
+def compile_pattern_set(patterns):
+    """
+    Turn one pattern set into a list of compiled regexes.
+
+    Parameters:
+        patterns: A compiled regex, a list of compiled regexes (e.g. AUROC_REGEXES compiled with re.IGNORECASE),
+            or a list of keywords as in keyword_lists/, which become one create_keyword_pattern regex.
+
+    Returns:
+        List[re.Pattern]: The compiled regexes of the set.
+    """
+    if isinstance(patterns, re.Pattern):
+        return [patterns]
+    patterns = list(patterns)
+    if all(isinstance(pattern, str) for pattern in patterns):
+        return [create_keyword_pattern(patterns)]
+    if not all(isinstance(pattern, re.Pattern) for pattern in patterns):
+        raise ValueError("A pattern set must be a list of keywords or a list of compiled regexes, not a mix of both.")
+    return patterns
+
+def find_match_spans(text, pattern_groups):
+    """
+    Find every match of several groups of regexes, for storing next to a kept document.
+
+    Parameters:
+        text (str): The text to search.
+        pattern_groups (List[List[re.Pattern]]): The regexes, grouped by pattern id.
+
+    Returns:
+        Tuple[List[int], List[int], List[int]]: The start offsets, end offsets and pattern ids of the
+        matches, sorted by start offset. Matches with the same start keep the order of pattern_groups,
+        the same order get_context_windows in claim_search_v3.py sees them in.
+    """
+    spans = [(match.start(), match.end(), pattern_id) for pattern_id, patterns in enumerate(pattern_groups) for pattern in patterns for match in pattern.finditer(text)]
+    spans.sort(key=lambda span: span[0])
+    return [span[0] for span in spans], [span[1] for span in spans], [span[2] for span in spans]
+
+def is_keyword_set(patterns):
+    return not isinstance(patterns, re.Pattern) and all(isinstance(pattern, str) for pattern in patterns)
+
+class PatternSets:
+    """
+    Several named pattern sets checked against each document in one pass.
+
+    For every set the number of regex matches in the text is counted. A document is kept if the
+    sets that matched satisfy the keep rule: 'any' set, 'all' sets, or any of a list of set names.
+    A single set name, e.g. keep='auroc', is the same as a list with that name.
+
+    With matching_engine='aho_corasick' the keyword sets are first checked together in a single
+    Aho-Corasick pass, and matches are only counted with the regexes for the sets found there.
+    """
+    def __init__(self, pattern_sets, keep="any", matching_engine="regex"):
+        if not pattern_sets:
+            raise ValueError("At least one pattern set is needed.")
+        self.names = list(pattern_sets)
+        if keep not in ("any", "all"):
+            # list('auroc') would be the letters of the name
+            keep = [keep] if isinstance(keep, str) else list(keep)
+            if not keep:
+                raise ValueError("keep needs at least one pattern set name.")
+            unknown = [name for name in keep if name not in pattern_sets]
+            if unknown:
+                raise ValueError(f"Unknown pattern sets in keep: {unknown}.")
+        self.keep = keep
+        self.patterns = {name: compile_pattern_set(patterns) for name, patterns in pattern_sets.items()}
+
+        self.matcher = None
+        self._regex_names = self.names
+        if matching_engine != "regex":
+            keyword_sets = {name: list(patterns) for name, patterns in pattern_sets.items() if is_keyword_set(patterns)}
+            if keyword_sets:
+                self.matcher = create_keyword_matcher(keyword_sets, engine=matching_engine)
+            self._regex_names = [name for name in self.names if name not in keyword_sets]
+
+    @property
+    def pattern_groups(self):
+        """
+        The compiled regexes of every set in set order, so the pattern id of a match span is the index of its set.
+        """
+        return [self.patterns[name] for name in self.names]
+
+    @property
+    def columns(self):
+        """
+        The output columns, a contains_<name> flag and a <name>_hits count per set.
+        """
+        return [f"contains_{name}" for name in self.names] + [f"{name}_hits" for name in self.names]
+
+    def count_hits(self, text):
+        """
+        Count the matches of every set in a text.
+
+        Returns:
+            Dict[str, int]: The number of non-overlapping regex matches by set name.
+        """
+        if self.matcher is None:
+            return {name: sum(1 for pattern in patterns for _ in pattern.finditer(text)) for name, patterns in self.patterns.items()}
+        matched = self.matcher.match(text)
+        return {
+            name: sum(1 for pattern in patterns for _ in pattern.finditer(text)) if name in matched or name in self._regex_names else 0
+            for name, patterns in self.patterns.items()
+        }
+
+    def any_match(self, text):
+        """
+        Check whether any set matches a text, without counting.
+        """
+        if self.matcher is not None and self.matcher.match(text):
+            return True
+        return any(pattern.search(text) is not None for name in self._regex_names for pattern in self.patterns[name])
+
+    def keeps(self, hits):
+        """
+        Apply the keep rule to the hit counts of a document.
+        """
+        if self.keep == "any":
+            return any(hits.values())
+        if self.keep == "all":
+            return all(hits.values())
+        return any(hits[name] for name in self.keep)
+
+    def row_columns(self, hits):
+        """
+        The per-set output columns of a document, see columns.
+        """
+        row = {f"contains_{name}": hits[name] > 0 for name in self.names}
+        row.update({f"{name}_hits": hits[name] for name in self.names})
+        return row
+
+    def settings(self):
+        """
+        A JSON-serializable description of the sets and the keep rule, e.g. for shard_writer.pattern_set_hash.
+        """
+        return {
+            'pattern_sets': {name: [(pattern.pattern, pattern.flags) for pattern in patterns] for name, patterns in self.patterns.items()},
+            'keep': self.keep,
+        }
@@ -0,0 +1,170 @@
+import re
+import time
+import zlib
+import numpy as np
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+def response_labels(responses, negative_response="NONE"):
+    """
+    Turn stored model responses into labels: 0 for responses starting with negative_response,
+    NaN for errors and missing responses, and 1 for everything else (a claim was found).
+    """
+    labels = np.full(len(responses), np.nan)
+    for i, response in enumerate(responses):
+        if not isinstance(response, str) or response.startswith("Error:"):
+            continue
+        labels[i] = 0.0 if response.strip().strip("'\"").upper().startswith(negative_response) else 1.0
+    return labels
+
+def hashed_ngram_features(texts, n_features=2**18, ngram_range=(1, 2)):
+    """
+    Turn texts into L2-normalized, log-scaled counts of hashed word n-grams, as a sparse matrix in
+    CSR form. Hashes are crc32 based, so features are the same in every process and run.
+
+    Parameters:
+        texts (Iterable[str]): The texts.
+        n_features (int): The number of hash buckets, a power of two.
+        ngram_range (Tuple[int, int]): The smallest and largest n-gram length.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The feature indices, values and row offsets.
+    """
+    if n_features & (n_features - 1):
+        raise ValueError("n_features must be a power of two.")
+    mask = np.uint64(n_features - 1)
+    token_hashes = {}
+    indices = []
+    values = []
+    offsets = [0]
+    for text in texts:
+        tokens = _TOKEN.findall(text.lower())
+        hashes = np.array([token_hashes.get(token) or token_hashes.setdefault(token, zlib.crc32(token.encode()) + 1) for token in tokens], dtype=np.uint64)
+        grams = []
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            if len(hashes) < n:
+                break
+            # Combine the token hashes of each n-gram arithmetically instead of hashing the joined string
+            gram = hashes[:len(hashes) - n + 1].copy()
+            for k in range(1, n):
+                gram = gram * np.uint64(1000003) ^ hashes[k:len(hashes) - n + 1 + k]
+            grams.append(gram + np.uint64(n))
+        if grams:
+            row_indices, counts = np.unique(np.concatenate(grams) & mask, return_counts=True)
+            row_values = np.log1p(counts)
+            row_values /= np.sqrt(np.dot(row_values, row_values))
+        else:
+            row_indices, row_values = np.empty(0, dtype=np.uint64), np.empty(0)
+        indices.append(row_indices.astype(np.int64))
+        values.append(row_values)
+        offsets.append(offsets[-1] + len(row_indices))
+    if not indices:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.array(offsets, dtype=np.int64)
+    return np.concatenate(indices), np.concatenate(values), np.array(offsets, dtype=np.int64)
+
+class PreScreenClassifier:
+    """
+    A logistic regression on hashed word n-grams that runs on the CPU with numpy alone, used to drop
+    windows that are obviously negative before they are sent to a paid model.
+
+    It is trained on windows that were already labelled by a model, see response_labels. Positives
+    are rare, so the classes are weighted to balance them.
+    """
+    def __init__(self, n_features=2**18, ngram_range=(1, 2), iterations=100, learning_rate=0.1, l2=1e-4):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights = None
+        self.bias = 0.0
+
+    def _features(self, texts):
+        return hashed_ngram_features(texts, self.n_features, self.ngram_range)
+
+    def fit(self, texts, labels):
+        """
+        Train on texts with labels 0 or 1. Rows with a NaN label, e.g. failed requests, are skipped.
+        """
+        labels = np.asarray(labels, dtype=float)
+        keep = ~np.isnan(labels)
+        texts = [text for text, kept in zip(texts, keep) if kept]
+        labels = labels[keep]
+        if len(np.unique(labels)) < 2:
+            raise ValueError("The pre-screen classifier needs both positive and negative examples.")
+        indices, values, offsets = self._features(texts)
+        rows = np.repeat(np.arange(len(texts)), np.diff(offsets))
+        sample_weights = np.where(labels == 1, 0.5 / labels.mean(), 0.5 / (1 - labels.mean())) / len(labels)
+
+        # Full-batch Adam, every step is a few vectorized passes over the non-zero features
+        self.weights = np.zeros(self.n_features)
+        self.bias = 0.0
+        moments = [np.zeros(self.n_features), np.zeros(self.n_features), 0.0, 0.0]
+        for step in range(1, self.iterations + 1):
+            scores = np.bincount(rows, weights=self.weights[indices] * values, minlength=len(texts)) + self.bias
+            errors = (1 / (1 + np.exp(-scores)) - labels) * sample_weights
+            gradient = np.bincount(indices, weights=errors[rows] * values, minlength=self.n_features) + self.l2 * self.weights
+            bias_gradient = errors.sum()
+            moments[0] = 0.9 * moments[0] + 0.1 * gradient
+            moments[1] = 0.999 * moments[1] + 0.001 * gradient ** 2
+            moments[2] = 0.9 * moments[2] + 0.1 * bias_gradient
+            moments[3] = 0.999 * moments[3] + 0.001 * bias_gradient ** 2
+            correction = np.sqrt(1 - 0.999 ** step) / (1 - 0.9 ** step)
+            self.weights -= self.learning_rate * correction * moments[0] / (np.sqrt(moments[1]) + 1e-8)
+            self.bias -= self.learning_rate * correction * moments[2] / (np.sqrt(moments[3]) + 1e-8)
+        return self
+
+    def predict_proba(self, texts):
+        """
+        The probability that each text is positive.
+        """
+        if self.weights is None:
+            raise ValueError("The pre-screen classifier has not been trained.")
+        texts = list(texts)
+        indices, values, offsets = self._features(texts)
+        rows = np.repeat(np.arange(len(texts)), np.diff(offsets))
+        scores = np.bincount(rows, weights=self.weights[indices] * values, minlength=len(texts)) + self.bias
+        return 1 / (1 + np.exp(-scores))
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, n_features=self.n_features, ngram_range=np.array(self.ngram_range))
+
+    @classmethod
+    def load(cls, path):
+        stored = np.load(path)
+        classifier = cls(n_features=int(stored['n_features']), ngram_range=tuple(int(n) for n in stored['ngram_range']))
+        classifier.weights = stored['weights']
+        classifier.bias = float(stored['bias'])
+        return classifier
+
+def threshold_for_recall(scores, labels, recall=0.99):
+    """
+    The highest score threshold that keeps at least the given share of the positives.
+    """
+    positive_scores = np.sort(np.asarray(scores)[np.asarray(labels) == 1])
+    if len(positive_scores) == 0:
+        raise ValueError("There are no positive labels to compute a recall threshold on.")
+    return float(positive_scores[int(np.floor((1 - recall) * len(positive_scores)))])
+
+def evaluate_prescreen(classifier, texts, labels, threshold):
+    """
+    Measure a trained pre-screen on labelled windows that were not used for training.
+
+    Returns:
+        dict: Windows per second, the share of API calls saved (windows below the threshold) and the
+        recall of the windows the model labelled positive.
+    """
+    labels = np.asarray(labels, dtype=float)
+    start = time.perf_counter()
+    scores = classifier.predict_proba(texts)
+    elapsed = time.perf_counter() - start
+    kept = scores >= threshold
+    positives = labels == 1
+    report = {
+        'windows': len(scores),
+        'windows_per_second': len(scores) / elapsed if elapsed > 0 else float('inf'),
+        'calls_saved': float(1 - kept.mean()) if len(scores) else 0.0,
+        'recall': float(kept[positives].mean()) if positives.any() else float('nan'),
+    }
+    print(f"Pre-screen: {report['windows_per_second']:.0f} windows/s, {report['calls_saved']:.1%} of API calls saved, recall {report['recall']:.1%}")
+    return report
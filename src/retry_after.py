@@ -0,0 +1,28 @@
+import time
+from email.utils import parsedate_to_datetime
+
+def retry_after_seconds(error):
+    """
+    Read the Retry-After delay in seconds from the response of a failed request, or None if the
+    server did not send one. Supports retry-after-ms, and Retry-After as seconds or as an HTTP date.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get('retry-after')
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
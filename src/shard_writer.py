@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from multiprocessing import Pool
+
+MANIFEST_FILENAME = "manifest.json"
+
+def text_hash(text):
+    """
+    Create a stable content hash for a text, used as its text_id.
+
+    Parameters:
+        text (str): The text to hash.
+
+    Returns:
+        str: The first 16 hex characters of the SHA-1 digest of the text.
+    """
+    return hashlib.sha1(text.encode('utf-8', errors='surrogatepass')).hexdigest()[:16]
+
+def write_json_lines(file, rows):
+    """
+    Write rows as JSON lines to a UTF-8 text file. Non-ASCII text is written as is, unless a row holds
+    a lone surrogate such as "\\ud800", which UTF-8 cannot encode; then the batch is written with
+    \\u escapes instead, which json.loads reads back unchanged.
+    """
+    try:
+        file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+    except UnicodeEncodeError:
+        # The text layer encodes the whole string before writing, so nothing of the batch was written yet
+        file.write(''.join(json.dumps(row) + '\n' for row in rows))
+
+class ShardWriter:
+    """
+    Append matched rows to an on-disk shard in bounded batches.
+
+    Rows are buffered in memory until batch_size rows are collected and then flushed,
+    so a worker never holds more than one batch of full texts at a time.
+    """
+    def __init__(self, shard_path, batch_size=1000, shard_format="jsonl"):
+        if shard_format not in ("jsonl", "parquet"):
+            raise ValueError(f"Unknown shard format: {shard_format}. Use 'jsonl' or 'parquet'.")
+        self.shard_path = shard_path
+        self.batch_size = batch_size
+        self.shard_format = shard_format
+        self.rows_written = 0
+        self._buffer = []
+        self._parquet_writer = None
+        self._file = None
+        if shard_format == "jsonl":
+            self._file = open(shard_path, 'w', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self.shard_format == "jsonl":
+            write_json_lines(self._file, self._buffer)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pylist(self._buffer)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.shard_path, table.schema)
+            self._parquet_writer.write_table(table)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+def shard_path_for(shard_folder_path, file_path, shard_format="jsonl", start=0):
+    """
+    Build the shard path that holds the matches found in the byte range of an input file starting at start.
+    The full file name is kept, so foo.jsonl and foo.jsonl.gz in one folder get separate shards.
+    """
+    return os.path.join(shard_folder_path, f"{os.path.basename(file_path)}.{start}.matches.{shard_format}")
+
+def write_manifest(output_folder_path, entries):
+    """
+    Write the manifest describing every shard of a streaming run.
+
+    The manifest is written to a temporary file and renamed, so a run killed while writing it
+    leaves the previous manifest intact.
+
+    Parameters:
+        output_folder_path (str): The folder the shards were written to.
+        entries (List[dict]): One entry per shard with its path, row count and number of scanned texts.
+
+    Returns:
+        pd.DataFrame: The manifest as a DataFrame.
+    """
+    manifest_path = os.path.join(output_folder_path, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return pd.DataFrame(entries)
+
+def load_manifest(output_folder_path):
+    """
+    Read the manifest entries of a streaming run, or an empty list if there is no manifest yet.
+    """
+    manifest_path = os.path.join(output_folder_path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return []
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def manifest_total_texts(output_folder_path):
+    """
+    Rebuild the total number of scanned texts from the manifest of a streaming run.
+    """
+    return sum(entry['total_texts'] for entry in load_manifest(output_folder_path))
+
+def pattern_set_hash(**settings):
+    """
+    Hash everything that decides which rows a scan produces, e.g. the keyword lists and metadata keys.
+
+    Parameters:
+        **settings: JSON-serializable settings. Compiled regexes should be passed as (pattern, flags).
+
+    Returns:
+        str: The first 16 hex characters of the SHA-1 digest of the settings.
+    """
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def file_fingerprint(file_path):
+    """
+    Return the size and modification time used to detect new or changed input files.
+    """
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def scan_to_shards(process_partial, file_ranges, output_folder_path, pattern_hash, num_processes, resume=True):
+    """
+    Run process_partial over all file ranges, writing one shard per range and keeping the manifest
+    up to date after every finished range.
+
+    With resume=True a range is skipped if the manifest already has an entry for it with the same
+    pattern hash, and its input file still has the recorded size and modification time. So a killed
+    run continues where it stopped, and after adding shards only the new or changed files are scanned.
+
+    Parameters:
+        process_partial (Callable): Takes a (file_path, start, end) range and returns (range, ([entry], total_texts)).
+        file_ranges (List[Tuple[str, int, int]]): All ranges of the current input folder, in order.
+        output_folder_path (str): The folder with the shards and the manifest.
+        pattern_hash (str): The pattern_set_hash of the scan settings.
+        num_processes (int): The number of worker processes.
+        resume (bool): Whether to reuse the shards of earlier runs.
+
+    Returns:
+        pd.DataFrame: The manifest, one entry per range in file_ranges order.
+    """
+    fingerprints = {file_path: file_fingerprint(file_path) for file_path in dict.fromkeys(file_path for file_path, _, _ in file_ranges)}
+
+    entries_by_range = {}
+    if resume:
+        for entry in load_manifest(output_folder_path):
+            file_range = (entry['source'], entry['start'], entry['end'])
+            fingerprint = fingerprints.get(entry['source'])
+            if (fingerprint is not None and entry.get('pattern_hash') == pattern_hash
+                    and entry.get('size') == fingerprint['size'] and entry.get('mtime') == fingerprint['mtime']
+                    and os.path.exists(os.path.join(output_folder_path, entry['shard']))):
+                entries_by_range[file_range] = entry
+    # Ranges from a different chunk size or from removed files are dropped with the old manifest
+    entries_by_range = {file_range: entries_by_range[file_range] for file_range in file_ranges if file_range in entries_by_range}
+    pending_ranges = [file_range for file_range in file_ranges if file_range not in entries_by_range]
+
+    def ordered_entries():
+        return [entries_by_range[file_range] for file_range in file_ranges if file_range in entries_by_range]
+
+    write_manifest(output_folder_path, ordered_entries())
+    if pending_ranges:
+        with Pool(num_processes) as p:
+            for file_range, (entries, _) in p.imap_unordered(process_partial, pending_ranges):
+                entry = entries[0]
+                entry.update(fingerprints[file_range[0]], pattern_hash=pattern_hash)
+                entries_by_range[file_range] = entry
+                write_manifest(output_folder_path, ordered_entries())
+    return pd.DataFrame(ordered_entries())
+
+def load_shards(output_folder_path, columns=None):
+    """
+    Load all shards listed in the manifest of a streaming run into one DataFrame.
+
+    Parameters:
+        output_folder_path (str): The folder containing the manifest.
+        columns (List[str]): Optional subset of columns to keep, e.g. without 'text'.
+
+    Returns:
+        pd.DataFrame: The concatenated matches.
+    """
+    frames = []
+    for entry in load_manifest(output_folder_path):
+        if entry['rows'] == 0:
+            continue
+        shard_path = os.path.join(output_folder_path, entry['shard'])
+        if shard_path.endswith(".parquet"):
+            frame = pd.read_parquet(shard_path, columns=columns)
+        else:
+            frame = pd.read_json(shard_path, lines=True, dtype=False)
+            if columns is not None:
+                frame = frame[columns]
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
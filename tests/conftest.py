@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+import pytest
+
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# The modules in src/ import each other by name, and the keyword lists live at the top level
+sys.path.insert(0, os.path.join(REPO_PATH, 'src'))
+sys.path.insert(0, REPO_PATH)
+
+# Texts covering the cases the fast paths have to agree on: keywords split across lines, inside
+# LaTeX, inside longer words, next to punctuation and JSON escapes, and texts with no match at all
+SAMPLE_TEXTS = [
+    "We report the AUROC of the classifier and its AUPRC.",
+    "The area under the receiver operating characteristic was 0.91.",
+    "Results use average\nprecision-recall curves on the test set.",
+    "The area under the\treceiver operating characteristic is shown in \\textbf{Table 2}.",
+    "An AUC-ROC of $0.8$ and a PR-AUC (AUC-PRC) of 0.4.",
+    "The \\emph{ROC} curve and \"precision recall\" curve.",
+    "Sensitivity versus 1 - specificity, i.e. true positive rate vs false positive rate.",
+    "Nothing relevant in this text about restaurants or auctions.",
+    "Accuracy and F1 only, \\begin{table}AUC\\end{table} in a table.",
+    "Mean average precision (mAP) and AP over all classes.",
+    "Über die ROC-Kurve und die Fläche darunter (AUC).",
+    "The PRC and APR numbers.",
+]
+
+
+@pytest.fixture
+def corpus_folder(tmp_path):
+    """A small RedPajama-style folder of JSONL shards built from SAMPLE_TEXTS, with one malformed line."""
+    folder = tmp_path / "corpus"
+    folder.mkdir()
+    texts = SAMPLE_TEXTS * 5
+    for shard in range(3):
+        with open(folder / f"shard_{shard}.jsonl", 'w', encoding='utf-8') as f:
+            for index, text in enumerate(texts[shard::3]):
+                meta = {'source_id': f"{shard}-{index}", 'year': 2020 + shard}
+                f.write(json.dumps({'text': text, 'meta': meta}) + '\n')
+            if shard == 1:
+                f.write('not json\n')
+    return str(folder)
@@ -0,0 +1,23 @@
+import random
+
+from benchmarks import _synthetic_jsonl_lines, benchmark_compressed_throughput, benchmark_context_windows
+
+
+def test_compressed_shards_read_and_scan_every_line():
+    results = benchmark_compressed_throughput(num_docs=50, words_per_doc=50)
+    assert {'jsonl', 'jsonl.gz'} <= set(results)
+    assert all(result['scan_seconds'] > 0 and result['matches'] > 0 for result in results.values())
+
+
+def test_synthetic_data_leaves_the_global_random_state_alone():
+    random.seed(123)
+    expected = random.random()
+    random.seed(123)
+    lines = list(_synthetic_jsonl_lines(5, 20, seed=7))
+    assert random.random() == expected
+    assert list(_synthetic_jsonl_lines(5, 20, seed=7)) == lines
+
+
+def test_context_windows_match_the_original_implementation():
+    results = benchmark_context_windows(num_docs=5, words_per_doc=2000, matches_per_doc=40, window_sizes=(1, 5, 50))
+    assert all(result['mismatches'] == 0 for result in results.values())
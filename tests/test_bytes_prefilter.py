@@ -0,0 +1,66 @@
+import re
+
+import arxiv_search
+import arxiv_search_regex
+from bytes_prefilter import create_bytes_prefilter, iter_candidate_lines, prefilter_differential_check
+from file_ranges import split_file_ranges
+
+AUROC_TERMS = ['AUROC', 'AUC-ROC', 'AUC', 'area under the receiver operating characteristic', 'ROC', 'receiver operating characteristic']
+AUPRC_TERMS = ['AUPRC', 'AUC-PRC', 'PR-AUC', 'average precision', 'precision recall', 'precision-recall']
+
+# The AUROC_REGEXES and AUPRC_REGEXES of search_v4.ipynb
+AUROC_REGEX = re.compile(r"(?i)(" + '|'.join([
+    r"\bAUC?\-?\(?ROC\)?\b",
+    r"\bAUC\b",
+    r"\barea under the curve\b",
+    r"\bROC\b",
+    r"\breceiver operating characteristic\b",
+    r"sensitivity \s*(vs\.?|v\.?|versus|against|compared with) \s*(1\s?-\s?specificity|specificity)",
+    r"(true positive rate|TPR) \s*(vs\.?|v\.?|versus|against|compared with) \s*(false positive rate|FPR)",
+]) + r")")
+AUPRC_REGEX = re.compile(r"(?i)(" + '|'.join([
+    r"\bAUC?\-?\(?PRC\)?\b",
+    r"\bprecision[\s-]?recall\b",
+    r"\bAPR\b",
+    r"\baverage[\s-]?precision\b",
+    r"\bPRC\b",
+]) + r")")
+REGEX_PREFILTER_TERMS = ['auc', 'roc', 'prc', 'apr', 'area', 'receiver', 'sensitivity', 'positive', 'tpr', 'precision']
+
+
+def test_keyword_scan_prefilter_matches_full_scan(corpus_folder):
+    missing, extra = prefilter_differential_check(arxiv_search.jsonl_folder_filtering, corpus_folder, AUROC_TERMS, AUPRC_TERMS, metadata_keys=['source_id'], num_processes=2)
+    assert missing == [] and extra == []
+
+
+def test_regex_scan_prefilter_matches_full_scan(corpus_folder):
+    missing, extra = prefilter_differential_check(arxiv_search_regex.jsonl_folder_filtering, corpus_folder, AUROC_REGEX, AUPRC_REGEX, metadata_keys=['source_id'], num_processes=2, prefilter_terms=REGEX_PREFILTER_TERMS, prefilter_word_boundaries=False)
+    assert missing == [] and extra == []
+
+
+def test_incomplete_prefilter_terms_are_reported(corpus_folder):
+    missing, extra = prefilter_differential_check(arxiv_search_regex.jsonl_folder_filtering, corpus_folder, AUROC_REGEX, AUPRC_REGEX, num_processes=2, prefilter_terms=['auc', 'roc', 'precision', 'sensitivity', 'tpr'])
+    assert missing and extra == []
+
+
+def test_candidate_lines_stay_inside_their_range(corpus_folder, tmp_path):
+    file_path = f"{corpus_folder}/shard_0.jsonl"
+    prefilter = create_bytes_prefilter(['roc'], word_boundaries=False)
+    ranges = split_file_ranges(file_path, 200)
+    assert len(ranges) > 1
+    with open(file_path, 'rb') as f:
+        expected = [line for line in f if prefilter.search(line)]
+    found = [line for _, start, end in ranges for line in iter_candidate_lines(file_path, prefilter, start, end)]
+    assert found == expected
+
+
+def test_keywords_spliced_by_latex_removal_are_a_known_gap(tmp_path):
+    # 'AU$x$C' is cleaned to 'AUC', but its raw bytes hold no anchor, so only a full scan finds it
+    folder = tmp_path / "corpus"
+    folder.mkdir()
+    with open(folder / "shard.jsonl", 'w') as f:
+        f.write('{"text": "A plain AUC value"}\n{"text": "A spliced AU$x$C value"}\n')
+    missing, extra = prefilter_differential_check(arxiv_search.jsonl_folder_filtering, str(folder), AUROC_TERMS, AUPRC_TERMS, num_processes=1)
+    assert [row[0] for row in missing] == ["A spliced AUC value"] and extra == []
+    missing, extra = prefilter_differential_check(arxiv_search.jsonl_folder_filtering, str(folder), AUROC_TERMS, AUPRC_TERMS, num_processes=1, remove_latex=False)
+    assert missing == [] and extra == []
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import arxiv_search
+from claim_search_v3 import build_context_window_table, extract_context_windows_df, load_context_window_table, materialize_context_windows
+from keyword_matcher import create_keyword_pattern
+from output_sink import read_table, write_table
+
+AUROC_TERMS = ['AUROC', 'AUC', 'receiver operating characteristic', 'ROC']
+AUPRC_TERMS = ['AUPRC', 'average precision', 'PRC']
+REGEXES = [create_keyword_pattern(AUROC_TERMS), create_keyword_pattern(AUPRC_TERMS)]
+
+
+@pytest.fixture
+def filtered(corpus_folder):
+    return arxiv_search.jsonl_folder_filtering(corpus_folder, AUROC_TERMS, AUPRC_TERMS, metadata_keys=['source_id'], save_file=False, num_processes=2, capture_spans=True)
+
+
+@pytest.mark.parametrize("window_size", [1, 3, 50])
+@pytest.mark.parametrize("merge_by_words", [False, True])
+def test_span_windows_match_the_regex_windows(filtered, tmp_path, window_size, merge_by_words):
+    assert len(filtered) > 0
+    expected = extract_context_windows_df(filtered, 'text', REGEXES, window_size, merge_by_words)
+    pd.testing.assert_frame_equal(extract_context_windows_df(filtered, 'text', None, window_size, merge_by_words), expected)
+    # After a CSV round trip the span columns hold JSON text
+    write_table(filtered, str(tmp_path / "filtered.csv"))
+    from_csv = read_table(str(tmp_path / "filtered.csv"))
+    windows = extract_context_windows_df(from_csv, 'text', None, window_size, merge_by_words)
+    assert windows['text'].tolist() == expected['text'].tolist()
+    assert windows['source_id'].tolist() == expected['source_id'].tolist()
+
+
+@pytest.mark.parametrize("shard_format", ["jsonl", "parquet"])
+@pytest.mark.parametrize("use_spans", [False, True])
+def test_window_table_matches_the_serial_windows(filtered, tmp_path, shard_format, use_spans):
+    if shard_format == "parquet":
+        pytest.importorskip("pyarrow")
+    # The corpus repeats every text, and a repeated paper is windowed once
+    papers = pd.concat([filtered, filtered.iloc[:2]], ignore_index=True)
+    table_path = str(tmp_path / f"windows.{shard_format}")
+    regexes = None if use_spans else REGEXES
+    num_windows = build_context_window_table(papers, table_path, compiled_regexes=regexes, window_size=3, num_processes=2, chunk_size=2, batch_size=3, shard_format=shard_format)
+    table = load_context_window_table(table_path)
+    assert len(table) == num_windows
+    windows = materialize_context_windows(table, papers)
+
+    expected = extract_context_windows_df(filtered.drop_duplicates('text_id'), 'text', REGEXES, 3)
+    assert len(expected) < len(extract_context_windows_df(papers, 'text', REGEXES, 3))
+    assert windows['context_window'].tolist() == expected['text'].tolist()
+    assert windows['text_id'].tolist() == expected['text_id'].tolist()
+    assert (windows.groupby('text_id')['window_id'].apply(list) == windows.groupby('text_id')['window_id'].apply(lambda ids: list(range(len(ids))))).all()
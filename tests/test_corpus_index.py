@@ -0,0 +1,72 @@
+import json
+import os
+import re
+
+import pytest
+
+import arxiv_search_regex
+from corpus_index import build_corpus_index, query_corpus_index
+
+AUROC_REGEX = re.compile(r"\bAU-?ROC\b|\breceiver operating characteristic\b", re.IGNORECASE)
+AUPRC_REGEX = re.compile(r"\bAUPRC\b|\baverage[\s-]?precision\b", re.IGNORECASE)
+
+
+def test_query_matches_full_scan(corpus_folder, tmp_path):
+    index_folder = str(tmp_path / "index")
+    build_corpus_index(corpus_folder, index_folder, num_processes=2)
+    result = query_corpus_index(index_folder, AUROC_REGEX, AUPRC_REGEX, metadata_keys=['source_id'], save_file=False)
+    expected = arxiv_search_regex.jsonl_folder_filtering(corpus_folder, AUROC_REGEX, AUPRC_REGEX, metadata_keys=['source_id'], save_file=False, num_processes=2)
+    assert len(result) > 0
+    assert rows(result) == rows(expected)
+
+
+def rows(df):
+    # text_id follows the row order, which differs between the index and the parallel scan
+    return sorted(df.drop(columns=['text_id']).astype(str).itertuples(index=False, name=None))
+
+
+def test_tokens_are_case_folded_like_the_regex(tmp_path):
+    corpus_folder = tmp_path / "corpus"
+    corpus_folder.mkdir()
+    texts = ["The PRİORİTY of the AUROC.", "A ſingle AUPRC.", "Nothing here."]
+    with open(corpus_folder / "shard.jsonl", 'w', encoding='utf-8') as f:
+        for i, text in enumerate(texts):
+            f.write(json.dumps({'text': text, 'meta': {'source_id': i}}) + '\n')
+    priority_regex = re.compile(r"\bpriority\b", re.IGNORECASE)
+    single_regex = re.compile(r"\bSINGLE\b", re.IGNORECASE)
+    index_folder = str(tmp_path / "index")
+    build_corpus_index(str(corpus_folder), index_folder, num_processes=1)
+    result = query_corpus_index(index_folder, priority_regex, single_regex, metadata_keys=['source_id'], save_file=False)
+    expected = arxiv_search_regex.jsonl_folder_filtering(str(corpus_folder), priority_regex, single_regex, metadata_keys=['source_id'], save_file=False, num_processes=1)
+    assert sorted(result['source_id']) == [0, 1]
+    assert rows(result) == rows(expected)
+    # A literal in the query is folded the same way
+    dotted_regex = re.compile(r"\bPRİORİTY\b", re.IGNORECASE)
+    result = query_corpus_index(index_folder, dotted_regex, dotted_regex, metadata_keys=['source_id'], save_file=False)
+    assert result['source_id'].tolist() == [0]
+
+
+def test_changed_shard_makes_the_index_stale(corpus_folder, tmp_path):
+    index_folder = str(tmp_path / "index")
+    build_corpus_index(corpus_folder, index_folder, num_processes=2)
+    with open(os.path.join(corpus_folder, "shard_0.jsonl"), 'a') as f:
+        f.write('{"text": "AUROC"}\n')
+    with pytest.raises(ValueError, match="changed since the index was built"):
+        query_corpus_index(index_folder, AUROC_REGEX, AUPRC_REGEX, save_file=False)
+
+
+def test_malformed_candidate_is_logged_not_raised(corpus_folder, tmp_path):
+    index_folder = str(tmp_path / "index")
+    build_corpus_index(corpus_folder, index_folder, num_processes=2)
+    expected = query_corpus_index(index_folder, AUROC_REGEX, AUPRC_REGEX, metadata_keys=['source_id'], save_file=False)
+    # Break the first line of a shard in place, keeping its size and modification time
+    shard_path = os.path.join(corpus_folder, "shard_0.jsonl")
+    stat = os.stat(shard_path)
+    with open(shard_path, 'r+b') as f:
+        f.write(b'X')
+    os.utime(shard_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    error_log_path = str(tmp_path / "errors.log")
+    result = query_corpus_index(index_folder, AUROC_REGEX, AUPRC_REGEX, metadata_keys=['source_id'], save_file=False, error_log_path=error_log_path)
+    assert len(result) == len(expected) - 1
+    with open(error_log_path) as f:
+        assert "1 malformed lines" in f.read()
@@ -0,0 +1,70 @@
+import gzip
+import json
+import os
+import re
+
+import pytest
+
+import arxiv_search
+import arxiv_search_regex
+from conftest import SAMPLE_TEXTS
+from file_ranges import iter_range_lines, split_file_ranges
+from shard_writer import load_shards
+
+
+@pytest.fixture
+def ragged_folder(tmp_path):
+    """Shards with blank and garbage lines, one without a trailing newline, an empty one and a gzip one."""
+    folder = tmp_path / "ragged"
+    folder.mkdir()
+    lines = [json.dumps({'text': text, 'meta': {'source_id': f"a-{i}"}}) for i, text in enumerate(SAMPLE_TEXTS * 3)]
+    lines[4:4] = ['', 'not json', '   ', '{"meta": {}}']
+    with open(folder / "a.jsonl", 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    with open(folder / "b.jsonl", 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines[::-1]) + '\n\n')
+    open(folder / "empty.jsonl", 'w').close()
+    with gzip.open(folder / "c.jsonl.gz", 'wt', encoding='utf-8') as f:
+        f.write('\n'.join(lines[:7]))
+    return str(folder)
+
+
+def rows(df):
+    return sorted(df.drop(columns=['text_id']).astype(str).itertuples(index=False, name=None))
+
+
+def scan(module, folder, output_folder, chunk_bytes, **kwargs):
+    if module is arxiv_search:
+        keywords = (['AUROC', 'ROC'], ['AUPRC', 'average precision'])
+    else:
+        keywords = (re.compile(r"\bAU-?ROC\b|\bROC\b", re.IGNORECASE), re.compile(r"\bAUPRC\b|\baverage precision\b", re.IGNORECASE))
+        if kwargs.get('prefilter'):
+            kwargs['prefilter_terms'] = ['auroc', 'au-roc', 'roc', 'auprc', 'average']
+    os.makedirs(output_folder, exist_ok=True)
+    df = module.jsonl_folder_filtering(folder, *keywords, metadata_keys=['source_id'], output_folder_path=output_folder, chunk_bytes=chunk_bytes, num_processes=2, error_log_path=os.path.join(output_folder, "errors.log"), **kwargs)
+    if kwargs.get('streaming'):
+        df = load_shards(output_folder)
+    with open(os.path.join(output_folder, "total_texts.txt")) as f:
+        return df, int(f.read())
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 17, 200])
+def test_ranges_cover_every_line_once(ragged_folder, chunk_bytes):
+    for name in ["a.jsonl", "b.jsonl", "empty.jsonl"]:
+        path = os.path.join(ragged_folder, name)
+        with open(path, 'rb') as f:
+            expected = f.readlines()
+        ranges = split_file_ranges(path, chunk_bytes)
+        assert [line for _, start, end in ranges for line in iter_range_lines(path, start, end, binary=True)] == expected
+        assert split_file_ranges(path, None) == [(path, 0, os.path.getsize(path))]
+
+
+@pytest.mark.parametrize("module", [arxiv_search, arxiv_search_regex])
+@pytest.mark.parametrize("kwargs", [{}, {'prefilter': True}, {'streaming': True}])
+def test_range_counts_add_up_to_the_whole_file_scan(ragged_folder, tmp_path, module, kwargs):
+    whole, whole_total = scan(module, ragged_folder, str(tmp_path / "whole"), None, **kwargs)
+    assert len(whole) > 0
+    for chunk_bytes in [1, 17, 200]:
+        split, split_total = scan(module, ragged_folder, str(tmp_path / f"chunks_{chunk_bytes}"), chunk_bytes, **kwargs)
+        assert split_total == whole_total
+        assert rows(split) == rows(whole)
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from http_fetch import ConcurrentFetcher, HTTPCache
+from mock_neurips_server import MockNeurIPSServer
+
+
+def test_missing_cache_body_is_fetched_again_on_the_last_attempt(tmp_path):
+    cache_folder = str(tmp_path / "cache")
+    with MockNeurIPSServer({2020: 3}, latency=0) as server:
+        url = server.url + "2020"
+        first = ConcurrentFetcher(max_retries=1, requests_per_second=None, cache=HTTPCache(cache_folder)).get(url)
+        for name in os.listdir(cache_folder):
+            if name.endswith(".body"):
+                os.remove(os.path.join(cache_folder, name))
+        fetcher = ConcurrentFetcher(max_retries=1, requests_per_second=None, cache=HTTPCache(cache_folder))
+        response = fetcher.get(url)
+    assert response is not None and response.status_code == 200
+    assert response.text == first.text
+    assert fetcher.stats['requests'] == 2 and server.stats['not_modified'] == 1
+
+
+def test_unchanged_page_is_read_from_the_cache(tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache"))
+    with MockNeurIPSServer({2020: 3}, latency=0) as server:
+        ConcurrentFetcher(requests_per_second=None, cache=cache).get(server.url + "2020")
+        response = ConcurrentFetcher(requests_per_second=None, cache=cache).get(server.url + "2020")
+    assert response.from_cache and response.status_code == 200
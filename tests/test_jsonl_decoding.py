@@ -0,0 +1,30 @@
+import pytest
+
+import jsonl_decoding
+from jsonl_decoding import JsonlDecoder, MalformedLineError
+
+BACKENDS = ['json'] + [backend for backend in ('orjson', 'msgspec') if getattr(jsonl_decoding, backend) is not None]
+
+LINES = [
+    b'{"text": "AUROC", "meta": {"source_id": "a", "year": 2020}}',
+    b'{"text": "no meta"}',
+    b'{"text": "lone surrogate \\ud800 in the text", "meta": {"source_id": "b"}}',
+    b'{"text": 5, "meta": {"source_id": "c"}}',
+]
+MALFORMED_LINES = [b'not json', b'{"meta": {}}', b'{"text": "x", "meta": 3}', b'\xff\xfe bad']
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_agree_with_json(backend):
+    reference = JsonlDecoder(['source_id', 'year'], backend='json')
+    decoder = JsonlDecoder(['source_id', 'year'], backend=backend)
+    for line in LINES:
+        assert decoder.decode(line) == reference.decode(line)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_reject_the_same_lines(backend):
+    decoder = JsonlDecoder(['source_id'], backend=backend)
+    for line in MALFORMED_LINES:
+        with pytest.raises(MalformedLineError):
+            decoder.decode(line)
@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+import keyword_matcher
+from conftest import SAMPLE_TEXTS
+from keyword_lists.keywords_auprc import auprc_search_terms
+from keyword_lists.keywords_auroc import auroc_search_terms
+from keyword_matcher import create_keyword_matcher, differential_check
+
+KEYWORD_SETS = {'auroc': auroc_search_terms, 'auprc': auprc_search_terms}
+BACKENDS = ['python'] + (['pyahocorasick'] if keyword_matcher.ahocorasick is not None else [])
+
+
+def sample_corpus(num_texts=300, seed=0):
+    # Keywords in every casing, glued to word characters, punctuation and non-ASCII letters
+    rng = random.Random(seed)
+    keywords = auroc_search_terms + auprc_search_terms
+    pieces = keywords + [keyword.upper() for keyword in keywords] + ["x" + keywords[0], keywords[1] + "_", "(AUC)", "roc-curve", "İstanbul", "ǅ", "precision recall curvex", "the", "model"]
+    texts = list(SAMPLE_TEXTS)
+    for _ in range(num_texts):
+        words = [rng.choice(pieces) if rng.random() < 0.1 else rng.choice(["we", "train", "a", "net"]) for _ in range(rng.randint(0, 40))]
+        texts.append(''.join(word + rng.choice([' ', '\n', '-', '.', '', ' ']) for word in words))
+    return texts
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_aho_corasick_agrees_with_the_regexes(backend):
+    assert differential_check(KEYWORD_SETS, sample_corpus(), engine='aho_corasick', backend=backend) == []
+
+
+def test_matcher_reports_every_matching_set():
+    matcher = create_keyword_matcher(KEYWORD_SETS, engine='aho_corasick')
+    assert matcher.match("The AUROC and the AUPRC.") == {'auroc', 'auprc'}
+    assert matcher.match("A restaurant in auckland.") == set()
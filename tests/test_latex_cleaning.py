@@ -0,0 +1,39 @@
+import random
+
+from arxiv_search import remove_latex_commands
+from conftest import SAMPLE_TEXTS
+from latex_cleaning import compare_latex_cleaners, normalize_whitespace
+
+GOLDEN_TEXTS = SAMPLE_TEXTS + [
+    "",
+    "\\section{Results} The AUROC is $0.9$ and \\textbf{AUPRC} is 0.4.",
+    "Inline $a + b$ math, display \\[x^2\\] and \\(y\\) math.",
+    "\\begin{table}AUC 0.8\\end{table} after the table.",
+    "Escapes \\% and \\$ and \\\\ and a trailing backslash \\",
+    "Unclosed $ dollar and \\begin{figure} without end",
+    "Literal \\n and \\t escapes\nand real\tones\r\n",
+    "Nested \\frac{\\alpha}{\\beta} and $\\sqrt{2}$ here.",
+    "AU$x$C spliced and word\\",
+    "\\\\textbf double backslash",
+]
+
+PIECES = ["AUC", "ROC", " ", "\n", "\t", "\\n", "$", "x", "\\", "\\textbf", "{", "}", "\\begin{a}", "\\end{a}", "\\[", "\\]", "\\(", "\\)", "é", ".", "_", "1"]
+
+
+def fuzz_texts(num_texts=2000, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(PIECES) for _ in range(rng.randint(0, 30))) for _ in range(num_texts)]
+
+
+def test_fused_cleaner_matches_the_reference_on_the_golden_corpus():
+    assert compare_latex_cleaners(GOLDEN_TEXTS, remove_latex_commands) == []
+
+
+def test_fused_cleaner_matches_the_reference_on_random_latex():
+    texts = fuzz_texts()
+    mismatches = compare_latex_cleaners(texts, remove_latex_commands)
+    assert [texts[index] for index in mismatches] == []
+
+
+def test_normalize_whitespace_is_the_first_cleaning_step():
+    assert normalize_whitespace("average\nprecision\\tand\rrecall") == "average precision and recall"
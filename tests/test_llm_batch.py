@@ -0,0 +1,29 @@
+import json
+
+import pandas as pd
+
+from llm_batch import ingest_batch_results, window_custom_id, write_batch_requests
+from mock_llm_server import write_mock_batch_results
+
+
+def test_batch_round_trip_maps_answers_and_lists_failed_windows(tmp_path):
+    windows = [f"Window {i:02d}: the classifier reaches an AUROC of 0.{i:02d}." for i in range(25)]
+    # A repeated window is requested once and answered in both rows
+    new_df = pd.DataFrame({'context_window': windows + [windows[3]]})
+    request_paths = write_batch_requests(new_df['context_window'], "gpt-4o-mini", "Extract the AUROC.", str(tmp_path / "requests"), max_requests=10)
+    assert len(request_paths) == 3
+    output_path = str(tmp_path / "output.jsonl")
+    error_path = str(tmp_path / "errors.jsonl")
+    stats = write_mock_batch_results(request_paths, output_path, error_path, error_probability=0.2, seed=3)
+    assert stats['failed'] > 0 and stats['completed'] > 0
+    with open(error_path, encoding='utf-8') as f:
+        failed_ids = {json.loads(line)['custom_id'] for line in f}
+
+    result = ingest_batch_results(new_df, [output_path, error_path])
+
+    failed = result['custom_id'].isin(failed_ids)
+    assert (result.loc[~failed, 'gpt_response'] == "Mock response: " + result.loc[~failed, 'context_window'].str[:40]).all()
+    assert result.loc[failed, 'gpt_response'].str.startswith("Error: 500").all()
+    resubmit = result.loc[result['gpt_response'].str.startswith("Error:"), 'context_window'].drop_duplicates()
+    assert sorted(resubmit) == [window for window in windows if window_custom_id(window) in failed_ids]
+    assert len(resubmit) == stats['failed']
@@ -0,0 +1,52 @@
+from llm_cache import ResponseCache, cached_responses, content_hash
+
+WINDOWS = ["The AUROC was 0.91.", "An AUC of 0.8.", "The AUROC was 0.91.", "No metric here."]
+
+
+def recording_send(sent, fail=()):
+    def send(context_windows):
+        sent.append(list(context_windows))
+        return ["Error: 500" if window in fail else f"Answer: {window}" for window in context_windows]
+    return send
+
+
+def test_cache_hits_and_misses(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite")
+    sent = []
+    responses, stats = cached_responses(WINDOWS, "gpt-4o-mini", "Extract the AUROC.", recording_send(sent), cache_path)
+    assert responses == [f"Answer: {window}" for window in WINDOWS]
+    # The repeated window is sent once
+    assert sent == [["The AUROC was 0.91.", "An AUC of 0.8.", "No metric here."]]
+    assert stats == {'windows': 4, 'distinct': 3, 'hits': 0, 'misses': 3, 'stored': 3}
+
+    sent.clear()
+    responses, stats = cached_responses(WINDOWS[::-1], "gpt-4o-mini", "Extract the AUROC.", recording_send(sent), cache_path)
+    assert responses == [f"Answer: {window}" for window in WINDOWS[::-1]]
+    assert sent == []
+    assert stats['hits'] == 3 and stats['misses'] == 0
+
+
+def test_changed_model_or_prompt_misses_the_cache(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite")
+    cached_responses(WINDOWS, "gpt-4o-mini", "Extract the AUROC.", recording_send([]), cache_path)
+    for model, system_prompt in [("gpt-4o", "Extract the AUROC."), ("gpt-4o-mini", "Extract the AUPRC.")]:
+        sent = []
+        _, stats = cached_responses(WINDOWS, model, system_prompt, recording_send(sent), cache_path)
+        assert sent == [["The AUROC was 0.91.", "An AUC of 0.8.", "No metric here."]]
+        assert stats['hits'] == 0 and stats['misses'] == 3
+    # Every model and prompt keeps its own responses
+    with ResponseCache(cache_path) as cache:
+        window_hashes = [content_hash(window) for window in WINDOWS]
+        assert len(cache.get_many("gpt-4o-mini", content_hash("Extract the AUROC."), window_hashes)) == 3
+        assert len(cache.get_many("gpt-4o", content_hash("Extract the AUROC."), window_hashes)) == 3
+
+
+def test_errors_are_not_cached(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite")
+    responses, stats = cached_responses(WINDOWS, "gpt-4o-mini", "Extract the AUROC.", recording_send([], fail={"An AUC of 0.8."}), cache_path)
+    assert responses[1] == "Error: 500" and stats['stored'] == 2
+    sent = []
+    responses, stats = cached_responses(WINDOWS, "gpt-4o-mini", "Extract the AUROC.", recording_send(sent), cache_path)
+    assert sent == [["An AUC of 0.8."]]
+    assert responses[1] == "Answer: An AUC of 0.8."
+    assert stats['hits'] == 2 and stats['misses'] == 1
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("openai")
+
+from llm_dispatch import dispatch_context_windows
+from mock_llm_server import MockChatCompletionsServer
+
+
+def test_every_window_gets_its_own_response_in_input_order():
+    windows = [f"Window {i:03d}: the model reaches an AUROC of 0.{i:03d}." for i in range(60)]
+    with MockChatCompletionsServer(latency=0.01, rate_limit_probability=0.3, retry_after=0.05, seed=1) as server:
+        responses, stats = dispatch_context_windows(
+            windows, "gpt-4o-mini", "Extract the AUROC.", "test", base_url=server.url,
+            progress_every=None, max_in_flight=8, max_retries=20, requests_per_minute=100000,
+        )
+        server_stats = dict(server.stats)
+    assert responses == [f"Mock response: {window[:40]}" for window in windows]
+    assert server_stats['rate_limited'] > 0
+    assert stats['rate_limited'] == server_stats['rate_limited']
+    assert stats['failed'] == 0
+    assert stats['requests'] == server_stats['requests'] == len(windows) + stats['retries']
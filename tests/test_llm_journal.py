@@ -0,0 +1,45 @@
+import pandas as pd
+
+from llm_journal import ResponseJournal, merge_journal, pending_windows
+
+WINDOWS = ["The AUROC was 0.91.", "An AUC of 0.8.", "The AUROC was 0.91.", "No metric here."]
+
+
+def answer(journal, window_hashes, pending_df, response):
+    with journal:
+        for idx, window_hash, context_window in zip(pending_df.index, window_hashes, pending_df['context_window']):
+            journal.append(window_hash, response(context_window), idx)
+
+
+def test_resumed_job_only_sends_unfinished_windows(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    new_df = pd.DataFrame({'context_window': WINDOWS})
+    window_hashes, pending_df, pending_hashes = pending_windows(new_df, journal_path, "gpt-4o-mini", "Extract the AUROC.")
+    assert pending_df['context_window'].tolist() == ["The AUROC was 0.91.", "An AUC of 0.8.", "No metric here."]
+    # The first run fails one window and is killed halfway through its last line
+    answer(ResponseJournal(journal_path, "gpt-4o-mini", "Extract the AUROC."), pending_hashes[:2], pending_df[:2],
+           lambda window: "Error: 500" if window.startswith("An") else f"Answer: {window}")
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"model": "gpt-4o-mini", "window_ha')
+
+    _, pending_df, pending_hashes = pending_windows(new_df, journal_path, "gpt-4o-mini", "Extract the AUROC.")
+    assert pending_df['context_window'].tolist() == ["An AUC of 0.8.", "No metric here."]
+    answer(ResponseJournal(journal_path, "gpt-4o-mini", "Extract the AUROC."), pending_hashes, pending_df, lambda window: f"Answer: {window}")
+
+    _, pending_df, _ = pending_windows(new_df, journal_path, "gpt-4o-mini", "Extract the AUROC.")
+    assert pending_df.empty
+    merged = merge_journal(new_df, window_hashes, journal_path, "gpt-4o-mini", "Extract the AUROC.")
+    assert merged['gpt_response'].tolist() == [f"Answer: {window}" for window in WINDOWS]
+
+
+def test_journal_responses_are_not_reused_for_another_model_or_prompt(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    new_df = pd.DataFrame({'context_window': WINDOWS})
+    window_hashes, pending_df, pending_hashes = pending_windows(new_df, journal_path, "gpt-4o-mini", "Extract the AUROC.")
+    answer(ResponseJournal(journal_path, "gpt-4o-mini", "Extract the AUROC."), pending_hashes, pending_df, lambda window: f"Answer: {window}")
+
+    for model, system_prompt in [("gpt-4o", "Extract the AUROC."), ("gpt-4o-mini", "Extract the AUPRC.")]:
+        _, pending_df, _ = pending_windows(new_df, journal_path, model, system_prompt)
+        assert len(pending_df) == 3
+        merged = merge_journal(new_df.copy(), window_hashes, journal_path, model, system_prompt)
+        assert (merged['gpt_response'] == "Error: Not processed").all()
@@ -0,0 +1,60 @@
+import json
+import re
+
+import pandas as pd
+
+from llm_packing import approximate_token_count, pack_context_windows, split_context_window, unpack_responses
+
+_EXCERPT = re.compile(r'\[(\d+)\]\n(.*?)(?=\n\n\[\d+\]\n|\Z)', re.DOTALL)
+
+
+def fake_model(request):
+    # Answers every numbered excerpt with its first word, the way a packed request is meant to be answered
+    return json.dumps({number: f"first word: {excerpt.split()[0]}" for number, excerpt in _EXCERPT.findall(request)})
+
+
+def window_table():
+    long_window = " ".join(f"word{i}" for i in range(400))
+    windows = [("a", "AUROC of 0.9 in paper a."), ("a", "Also an AUPRC of 0.4."), ("a", long_window),
+               ("b", "Paper b reports an AUC."), ("c", "Paper c only has a ROC curve.")] + [("d", f"Window {i} of paper d.") for i in range(7)]
+    # A non-default index, which the excerpts refer to
+    return pd.DataFrame({'text_id': [text_id for text_id, _ in windows], 'context_window': [window for _, window in windows]}, index=range(100, 100 + len(windows)))
+
+
+def test_pack_and_unpack_round_trip():
+    new_df = window_table()
+    requests, excerpts = pack_context_windows(new_df, max_request_tokens=200, max_windows_per_request=3)
+    assert len(requests) < len(new_df)
+    assert all(approximate_token_count(request) <= 200 for request in requests['context_window'])
+    # Windows of different papers never share a request, and no request has more than 3 excerpts
+    groups = excerpts.assign(text_id=new_df.loc[excerpts['window_index'], 'text_id'].values).groupby('request_id')
+    assert (groups['text_id'].nunique() == 1).all()
+    assert (groups.size() <= 3).all()
+
+    result = unpack_responses(new_df.copy(), excerpts, [fake_model(request) for request in requests['context_window']])
+    long_index = 102
+    for index, window in new_df['context_window'].items():
+        if index == long_index:
+            parts = split_context_window(window, 200 - approximate_token_count("\n\n[00]\n"))
+            assert len(parts) > 1
+            assert result.loc[index, 'gpt_response'] == "\n".join(f"first word: {part.split()[0]}" for part in parts)
+        else:
+            assert result.loc[index, 'gpt_response'] == f"first word: {window.split()[0]}"
+
+
+def test_failed_and_partial_requests_are_errors_per_window():
+    new_df = window_table()
+    requests, excerpts = pack_context_windows(new_df, max_request_tokens=200, max_windows_per_request=3)
+    responses = [fake_model(request) for request in requests['context_window']]
+    failed_request = excerpts.loc[excerpts['window_index'] == 103, 'request_id'].iloc[0]
+    responses[failed_request] = "Error: 500 Server error"
+    partial_request = excerpts.loc[excerpts['window_index'] == 110, 'request_id'].iloc[0]
+    answers = json.loads(responses[partial_request])
+    missing_item = excerpts.loc[excerpts['window_index'] == 110, 'item'].iloc[0]
+    del answers[str(missing_item)]
+    responses[partial_request] = json.dumps(answers)
+
+    result = unpack_responses(new_df.copy(), excerpts, responses)
+    assert result.loc[103, 'gpt_response'] == "Error: 500 Server error"
+    assert result.loc[110, 'gpt_response'] == f"Error: No answer for excerpt {missing_item}"
+    assert result.loc[100, 'gpt_response'] == "first word: AUROC"
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from claim_search_v3 import run_model_cascade
+
+
+def fake_send(calls):
+    def send(windows_df, model):
+        calls.append((model, windows_df['context_window'].tolist()))
+        return ["AUROC: 0.9" if "auroc" in window else "NONE" for window in windows_df['context_window']]
+    return send
+
+
+def windows():
+    return pd.DataFrame({'context_window': ["auroc a", "nothing b", "auroc c", "auroc d"]})
+
+
+def test_positive_windows_escalate_by_default():
+    calls = []
+    result = run_model_cascade(windows(), ['small', 'large'], "prompt", "key", send=fake_send(calls))
+    assert calls == [('small', ["auroc a", "nothing b", "auroc c", "auroc d"]), ('large', ["auroc a", "auroc c", "auroc d"])]
+    assert result['cascade_stage'].tolist() == ['large', 'small', 'large', 'large']
+
+
+def test_escalation_predicate_per_step():
+    calls = []
+    only_c = lambda windows_df, responses: [window.endswith("c") for window in windows_df['context_window']]
+    result = run_model_cascade(windows(), ['small', 'medium', 'large'], "prompt", "key", send=fake_send(calls), escalate=[None, only_c])
+    assert [model for model, _ in calls] == ['small', 'medium', 'large']
+    assert calls[2] == ('large', ["auroc c"])
+    assert result['large_response'].notna().sum() == 1
+
+
+def test_escalation_settings_must_match_the_models():
+    with pytest.raises(ValueError):
+        run_model_cascade(windows(), ['small', 'large'], "prompt", "key", send=fake_send([]), escalate=[None, None])
+    with pytest.raises(ValueError):
+        run_model_cascade(windows(), ['small', 'large'], "prompt", "key", send=fake_send([]), escalation_thresholds=[0.5])
@@ -0,0 +1,54 @@
+import random
+
+import pandas as pd
+
+from claim_search_v3 import process_near_duplicate_windows
+from near_duplicates import add_near_duplicate_clusters
+
+VOCABULARY = [f"w{i}" for i in range(2000)]
+
+
+def paper(rng, num_words=300):
+    return [rng.choice(VOCABULARY) for _ in range(num_words)]
+
+
+def edited(words, rng, num_edits):
+    words = list(words)
+    for position in rng.sample(range(len(words)), num_edits):
+        words[position] = rng.choice(VOCABULARY)
+    return words
+
+
+def test_known_near_duplicate_pairs_share_a_cluster():
+    rng = random.Random(0)
+    originals = [paper(rng) for _ in range(6)]
+    texts = [" ".join(words) for words in originals]
+    # An arXiv version with two words changed, and a cross-posted copy with a different header
+    pairs = [(0, " ".join(edited(originals[0], rng, 2))), (3, "Cross-posted copy. " + texts[3]), (5, " ".join(originals[5]) + " Appendix.")]
+    texts += [text for _, text in pairs]
+    texts += ["", "   "]
+    df = add_near_duplicate_clusters(pd.DataFrame({'text': texts}), num_processes=1)
+    clusters = df['cluster_id'].tolist()
+
+    for offset, (original, _) in enumerate(pairs):
+        assert clusters[6 + offset] == clusters[original]
+    # The originals are unrelated, and texts without words are never clustered
+    assert len(set(clusters[:6])) == 6
+    assert clusters[-2] != clusters[-1] and clusters[-2] not in clusters[:-2]
+    assert df['is_representative'].tolist() == [True] * 6 + [False] * 3 + [True, True]
+
+
+def test_near_duplicate_windows_share_the_representative_response():
+    rng = random.Random(1)
+    base = paper(rng, 120)
+    windows = [" ".join(base), " ".join(paper(rng, 120)), " ".join(edited(base, rng, 1))]
+    sent = []
+
+    def process(df):
+        sent.extend(df['context_window'])
+        df['gpt_response'] = [f"Answer {i}" for i in range(len(df))]
+        return df
+
+    result = process_near_duplicate_windows(pd.DataFrame({'context_window': windows}), process, num_processes=1)
+    assert sent == windows[:2]
+    assert result['gpt_response'].tolist() == ["Answer 0", "Answer 1", "Answer 0"]
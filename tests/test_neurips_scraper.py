@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("bs4")
+pytest.importorskip("lxml")
+pytest.importorskip("tqdm")
+
+from http_fetch import ConcurrentFetcher
+from mock_neurips_server import MockNeurIPSServer
+from neurIPS_scraper import ScrapeOutput, get_all_hashes, main, scrap_paper_and_authors
+
+PAPERS_PER_YEAR = {2020: 8, 2021: 5}
+
+
+def run(server, folder_path):
+    main(argparse.Namespace(start_year=2020, end_year=2021, folder_path=folder_path, filename="papers.jsonl", max_workers=4, max_per_host=4, requests_per_second=None, use_cache=True, base_url=server.url))
+
+
+def source_ids(folder_path, year):
+    with open(os.path.join(folder_path, f"papers_{year}.jsonl"), encoding='utf-8') as f:
+        return sorted(json.loads(line)['meta']['source_id'] for line in f)
+
+
+def test_rerun_reads_unchanged_pages_from_the_cache(tmp_path):
+    folder_path = str(tmp_path / "data")
+    with MockNeurIPSServer(PAPERS_PER_YEAR, latency=0) as server:
+        run(server, folder_path)
+        first = dict(server.stats)
+        run(server, folder_path)
+        second = dict(server.stats)
+    assert first['requests'] == len(PAPERS_PER_YEAR) + sum(PAPERS_PER_YEAR.values())
+    # Only the year pages are requested again, and both come back unchanged
+    assert second['requests'] - first['requests'] == len(PAPERS_PER_YEAR)
+    assert second['not_modified'] - first['not_modified'] == len(PAPERS_PER_YEAR)
+    for year, num_papers in PAPERS_PER_YEAR.items():
+        assert source_ids(folder_path, year) == sorted(f"{year}-{number}" for number in range(num_papers))
+
+
+def test_interrupted_scrape_only_fetches_the_missing_papers(tmp_path):
+    folder_path = str(tmp_path / "data")
+    with MockNeurIPSServer(PAPERS_PER_YEAR, latency=0) as server:
+        # A first run that stopped after three papers of 2020
+        fetcher = ConcurrentFetcher(requests_per_second=None)
+        with ScrapeOutput(folder_path, "papers.jsonl") as output:
+            hashes = get_all_hashes(server.url + "2020", fetcher)
+            scrap_paper_and_authors(server.url + "2020", hashes[:3], fetcher, output)
+        before = server.stats['requests']
+        run(server, folder_path)
+        metadata_requests = server.stats['requests'] - before - len(PAPERS_PER_YEAR)
+    assert metadata_requests == sum(PAPERS_PER_YEAR.values()) - 3
+    for year, num_papers in PAPERS_PER_YEAR.items():
+        assert source_ids(folder_path, year) == sorted(f"{year}-{number}" for number in range(num_papers))
@@ -0,0 +1,42 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'openreview_papers'))
+from filters import abstract_filter, compile_filters, keywords_filter, title_filter
+
+KEYWORDS = ['AUROC', 'average precision', 'ROC']
+
+
+def paper(title='', abstract='', keywords=()):
+    # API v1 content holds plain values, API v2 content holds {'value': ...}
+    return SimpleNamespace(content={'title': title, 'abstract': {'value': abstract}, 'keywords': list(keywords)})
+
+
+def venue_word(paper_, keywords, word):
+    return word if word in paper_.content['title'] else None
+
+
+def test_compiled_filters_match_the_filter_functions():
+    papers = [paper(title='An AUROC study'), paper(abstract='Average precision of ROC curves'), paper(keywords=['roc']), paper(title='net training'), paper(title='Nothing')]
+    filters = [(title_filter, (), {}), (abstract_filter, (), {}), (keywords_filter, (), {}), (venue_word, ('net',), {})]
+    expected = []
+    for paper_ in papers:
+        for filter_, args, kwargs in filters:
+            keyword = filter_(paper_, KEYWORDS, *args, **kwargs)
+            if keyword is not None:
+                expected.append((keyword, filter_.__name__, True))
+                break
+        else:
+            expected.append((None, None, False))
+    for engine in ('regex', 'aho_corasick'):
+        assert compile_filters(KEYWORDS, filters, engine).match_papers(papers) == expected
+    assert expected[0] == ('AUROC', 'title_filter', True)
+    assert expected[3] == ('net', 'venue_word', True)
+
+
+def test_built_in_filters_reject_extra_arguments():
+    with pytest.raises(TypeError):
+        compile_filters(KEYWORDS, [(title_filter, (), {'threshold': 85})])
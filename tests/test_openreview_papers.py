@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+
+import pytest
+
+openreview = pytest.importorskip("openreview")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'openreview_papers'))
+from paper import get_papers, get_venue_papers
+
+GROUPED_VENUES = {
+    'ICLR': ['ICLR.cc/2023/Conference', 'ICLR.cc/2024/Conference'],
+    'NeurIPS': ['NeurIPS.cc/2023/Conference'],
+}
+
+
+def make_note(venue, number, details):
+    return openreview.Note(invitation=f'{venue}/-/Submission', readers=['everyone'], writers=[venue], signatures=[venue],
+                           content={'title': f'{venue} paper {number}', 'venueid': venue}, id=f'{venue}-{number}', number=number, details=details)
+
+
+class FakeClient:
+    # every venue blocks until all venues are being fetched, so a serial fetch fails the barrier
+    def __init__(self, venues, barrier=True):
+        self.calls = []
+        self._lock = threading.Lock()
+        self._barrier = threading.Barrier(len(venues), timeout=5) if barrier else None
+
+    def get_all_notes(self, content=None, invitation=None, details=None):
+        venue = content['venueid'] if content is not None else invitation.split('/-/')[0]
+        with self._lock:
+            self.calls.append((venue, details))
+        if self._barrier is not None:
+            self._barrier.wait()
+        replies = {'directReplies': [{'id': f'{venue}-review', 'content': {'rating': '8'}}]} if details == 'directReplies' else None
+        return [make_note(venue, number, replies) for number in range(1, 4)]
+
+
+class OfflineClient:
+    def get_all_notes(self, **kwargs):
+        raise AssertionError("The client was called although the notes are cached.")
+
+
+def titles(papers):
+    return {group: {venue: [note.content['title'] for note in notes] for venue, notes in venues.items()} for group, venues in papers.items()}
+
+
+def test_venues_are_fetched_concurrently_and_reruns_read_the_note_cache(tmp_path):
+    cache_folder = str(tmp_path / "notes")
+    venues = [venue for grouped_venue in GROUPED_VENUES.values() for venue in grouped_venue]
+    client = FakeClient(venues)
+    papers = get_papers(client, GROUPED_VENUES, only_accepted=True, max_workers=len(venues), cache_folder=cache_folder)
+    assert sorted(client.calls) == sorted((venue, 'directReplies') for venue in venues)
+    assert titles(papers) == {group: {venue: [f'{venue} paper {number}' for number in range(1, 4)] for venue in grouped_venue} for group, grouped_venue in GROUPED_VENUES.items()}
+
+    rerun = get_papers(OfflineClient(), GROUPED_VENUES, only_accepted=True, max_workers=len(venues), cache_folder=cache_folder)
+    assert titles(rerun) == titles(papers)
+    note = rerun['ICLR']['ICLR.cc/2023/Conference'][0]
+    assert note.details['directReplies'][0]['content'] == {'rating': '8'}
+    # notes fetched with replies also serve a request without them
+    without_replies = get_venue_papers(OfflineClient(), 'ICLR.cc/2024/Conference', True, details=None, cache_folder=cache_folder)
+    assert [note.id for note in without_replies] == [f'ICLR.cc/2024/Conference-{number}' for number in range(1, 4)]
+
+
+def test_notes_without_replies_are_cached_with_empty_details(tmp_path):
+    cache_folder = str(tmp_path / "notes")
+    venue = 'ICLR.cc/2023/Conference'
+    client = FakeClient([venue], barrier=False)
+    submissions = get_venue_papers(client, venue, False, details=None, cache_folder=cache_folder)
+    # the submissions and the blind submissions of the venue
+    assert client.calls == [(venue, None), (venue, None)]
+    assert len(submissions) == 6 and all(note.details is None for note in submissions)
+
+    cached = get_venue_papers(OfflineClient(), venue, False, details=None, cache_folder=cache_folder)
+    assert [note.to_json() for note in cached] == [note.to_json() for note in submissions]
+    assert all(note.details is None for note in cached)
+    # a request with replies is not served by notes fetched without them
+    get_venue_papers(client, venue, False, details='directReplies', cache_folder=cache_folder)
+    assert client.calls[2:] == [(venue, 'directReplies'), (venue, 'directReplies')]
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import arxiv_search
+from output_sink import OutputSink, read_table, sink_format_for, write_table
+
+
+def test_csv_and_jsonl_round_trip(tmp_path):
+    df = pd.DataFrame({'text': ['a, "b"\nc', 'ü'], 'text_id': [0, 1], 'contains_auroc': [True, False]})
+    for name in ['out.csv', 'out.jsonl']:
+        write_table(df, str(tmp_path / name))
+        assert read_table(str(tmp_path / name)).equals(df)
+        assert not (tmp_path / (name + '.tmp')).exists()
+
+
+def test_append_writes_one_header(tmp_path):
+    path = str(tmp_path / 'papers.csv')
+    for run in range(3):
+        with OutputSink(path, columns=['id', 'title'], append=True, batch_size=2) as sink:
+            for index in range(3):
+                sink.write({'id': run * 3 + index, 'title': f"t{index}"})
+    assert read_table(path)['id'].tolist() == list(range(9))
+    with pytest.raises(ValueError):
+        OutputSink(path, columns=['other'], append=True)
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    write_table(pd.DataFrame({'a': [1]}), path)
+    with pytest.raises(ValueError):
+        with OutputSink(path) as sink:
+            sink.write({'a': 2})
+            sink.write({'b': 3})
+    assert read_table(path)['a'].tolist() == [1]
+    assert not (tmp_path / 'out.csv.tmp').exists()
+
+
+@pytest.mark.parametrize('name', ['out.json', 'out.xlsx', 'out'])
+def test_unsupported_extensions_are_rejected(name):
+    with pytest.raises(ValueError):
+        sink_format_for(name)
+
+
+def test_bad_filename_fails_before_the_scan(monkeypatch, corpus_folder, tmp_path):
+    monkeypatch.setattr(arxiv_search, 'split_file_ranges', lambda *args: pytest.fail("the scan started"))
+    with pytest.raises(ValueError):
+        arxiv_search.jsonl_folder_filtering(corpus_folder, ['AUROC'], ['AUPRC'], output_folder_path=str(tmp_path), filename="out.xlsx")
@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+import arxiv_search
+from pattern_sets import PatternSets
+
+PATTERN_SETS = {
+    'auroc': ['AUROC', 'ROC'],
+    'auprc': ['AUPRC', 'average precision'],
+    'calibration': [re.compile(r"\bECE\b|\bcalibration error\b", re.IGNORECASE)],
+}
+TEXTS = {
+    'auroc only': "The AUROC of the model.",
+    'auroc and auprc': "The AUROC and the AUPRC.",
+    'all three': "An ROC curve, average precision and the calibration error.",
+    'calibration only': "The ECE is low.",
+    'none': "Nothing relevant.",
+}
+
+
+def kept(keep):
+    sets = PatternSets(PATTERN_SETS, keep=keep)
+    return {name for name, text in TEXTS.items() if sets.keeps(sets.count_hits(text))}
+
+
+@pytest.mark.parametrize("keep, expected", [
+    ("any", {'auroc only', 'auroc and auprc', 'all three', 'calibration only'}),
+    ("all", {'all three'}),
+    (['auprc', 'calibration'], {'auroc and auprc', 'all three', 'calibration only'}),
+    (('auprc',), {'auroc and auprc', 'all three'}),
+    ("auroc", {'auroc only', 'auroc and auprc', 'all three'}),
+])
+def test_keep_rules(keep, expected):
+    assert kept(keep) == expected
+
+
+def test_a_set_name_is_not_split_into_letters():
+    assert PatternSets(PATTERN_SETS, keep="auroc").keep == ['auroc']
+    assert PatternSets(PATTERN_SETS, keep="auroc").settings()['keep'] == PatternSets(PATTERN_SETS, keep=['auroc']).settings()['keep']
+
+
+@pytest.mark.parametrize("keep", ["roc", ['auroc', 'f1'], []])
+def test_unknown_or_empty_keep_is_rejected(keep):
+    with pytest.raises(ValueError):
+        PatternSets(PATTERN_SETS, keep=keep)
+
+
+def test_folder_scan_applies_the_keep_rule(corpus_folder):
+    df = arxiv_search.jsonl_folder_filtering(corpus_folder, None, None, save_file=False, num_processes=1, pattern_sets=PATTERN_SETS, keep="auprc")
+    assert len(df) > 0
+    assert df['contains_auprc'].all()
+    assert (df['auprc_hits'] > 0).all()
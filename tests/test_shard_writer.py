@@ -0,0 +1,92 @@
+import gzip
+import json
+import os
+
+import pandas as pd
+
+import arxiv_search
+from output_sink import read_table, write_table
+from shard_writer import load_manifest, load_shards, write_manifest
+
+
+def write_lines(folder, name, texts):
+    with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+        for index, text in enumerate(texts):
+            f.write(json.dumps({'text': text, 'meta': {'source_id': f"{name}-{index}"}}) + '\n')
+
+
+def test_streaming_scan_keeps_lone_surrogates(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_lines(str(corpus), "shard.jsonl", ["The AUROC of \ud800 this model", "No match", "AUPRC é"])
+    output_folder = str(tmp_path / "out")
+    arxiv_search.jsonl_folder_filtering(str(corpus), ['AUROC'], ['AUPRC'], metadata_keys=['source_id'], output_folder_path=output_folder, save_file=False, streaming=True, num_processes=1)
+    rows = []
+    for name in os.listdir(os.path.join(output_folder, "shards")):
+        with open(os.path.join(output_folder, "shards", name), encoding='utf-8') as f:
+            rows.extend(json.loads(line) for line in f)
+    assert sorted(row['text'] for row in rows) == ["AUPRC é", "The AUROC of \ud800 this model"]
+
+
+def test_output_sink_writes_lone_surrogates(tmp_path):
+    # Arrow-backed strings cannot hold a lone surrogate, so the column is kept as Python objects
+    df = pd.DataFrame({'text': pd.Series(["a \ud800 b", "é"], dtype=object), 'text_id': [0, 1]})
+    write_table(df, str(tmp_path / "out.jsonl"))
+    with open(tmp_path / "out.jsonl", encoding='utf-8') as f:
+        assert [json.loads(line)['text'] for line in f] == ["a \ud800 b", "é"]
+    write_table(df, str(tmp_path / "out.csv"))
+    assert read_table(str(tmp_path / "out.csv"))['text'].tolist() == ["a \\ud800 b", "é"]
+
+
+def test_plain_and_compressed_shards_of_one_name_do_not_collide(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_lines(str(corpus), "part.jsonl", ["AUROC in the plain file"])
+    with gzip.open(corpus / "part.jsonl.gz", 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'text': "AUROC in the gzip file", 'meta': {}}) + '\n')
+    output_folder = str(tmp_path / "out")
+    arxiv_search.jsonl_folder_filtering(str(corpus), ['AUROC'], ['AUPRC'], output_folder_path=output_folder, save_file=False, streaming=True, num_processes=2)
+    assert len(os.listdir(os.path.join(output_folder, "shards"))) == 2
+    assert sorted(load_shards(output_folder)['text']) == ["AUROC in the gzip file", "AUROC in the plain file"]
+
+
+def resumed_scan(corpus, output_folder, **kwargs):
+    return arxiv_search.jsonl_folder_filtering(corpus, ['AUC', 'AUROC'], ['AUPRC'], metadata_keys=['source_id'], output_folder_path=output_folder, save_file=False, resume=True, num_processes=2, chunk_bytes=64, **kwargs)
+
+
+def shard_mtimes(output_folder):
+    return {entry['shard']: os.stat(os.path.join(output_folder, entry['shard'])).st_mtime_ns for entry in load_manifest(output_folder)}
+
+
+def test_resumed_scan_only_scans_unfinished_ranges(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_lines(str(corpus), "shard.jsonl", ["The AUROC is high", "No match here", "The AUPRC is low", "AUC of 0.9"] * 3)
+    output_folder = str(tmp_path / "out")
+    expected = resumed_scan(str(corpus), output_folder)
+    entries = load_manifest(output_folder)
+    assert len(entries) > 2
+    # A run killed before its last range finished
+    write_manifest(output_folder, entries[:-1])
+    os.remove(os.path.join(output_folder, entries[-1]['shard']))
+    finished = shard_mtimes(output_folder)
+
+    result = resumed_scan(str(corpus), output_folder)
+    rerun = shard_mtimes(output_folder)
+    assert {shard: rerun[shard] for shard in finished} == finished
+    assert entries[-1]['shard'] in rerun
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_changed_prefilter_or_match_first_invalidates_finished_ranges(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    # The prefilter and match_first miss a keyword that LaTeX removal splices together
+    write_lines(str(corpus), "shard.jsonl", ["The AUROC is high", "An AU$x$C of 0.9", "The AUPRC is low"])
+    output_folder = str(tmp_path / "out")
+    full = resumed_scan(str(corpus), output_folder)
+    assert "An AUC of 0.9" in full['text'].tolist()
+    for settings in [{'prefilter': True}, {'match_first': True}]:
+        result = resumed_scan(str(corpus), output_folder, **settings)
+        assert "An AUC of 0.9" not in result['text'].tolist()
+        pd.testing.assert_frame_equal(resumed_scan(str(corpus), output_folder), full)